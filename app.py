@@ -1,62 +1,72 @@
 #!/usr/bin/env python3
 
-import re
+import os
+import sys
+import time
 
-import aws_cdk as cdk
+from aws_cdk_serverless_pipeline.context import (
+    get_manifest_stack_options,
+    get_stack_options,
+    load_manifest,
+    read_context,
+)
+
+
+# Validate the context before importing aws_cdk, so an invalid context fails
+# without waiting for the jsii runtime to start.
+context = read_context(sys.argv[1:])
+
+# The path of a JSON or YAML manifest listing the pipelines to synthesize in one run. (Optional)
+# Each pipeline has the same keys as the context values, plus optional "stackName" and "parameters".
+manifest_path = context.get("manifest")
 
-from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack
+if manifest_path:
+    stack_options_list = get_manifest_stack_options(load_manifest(manifest_path))
+else:
+    stack_options = get_stack_options(context.get)
+    stack_options["stack_name"] = f"{stack_options['application_name']}Stack"
+    stack_options_list = [stack_options]
 
+import aws_cdk as cdk  # noqa: E402
 
-ALLOWED_ENVIRONMENTS = ["dev", "stg", "prd"]
-ALLOWED_SOURCE_TYPES = ["github", "codecommit"]
-PASCAL_CASE_PATTERN = r'^[A-Z][a-zA-Z0-9]*$'
+from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack  # noqa: E402
+from aws_cdk_serverless_pipeline.synth_report import SYNTH_REPORT_ENV, assembly_report, write_report  # noqa: E402
 
 app = cdk.App()
 
-# Application name for use as the name of cloudformation stack ,codebuild, and codepipeline
-# Enter in Pascal case.
-application_name = app.node.try_get_context("applicationName")
-# The environment name. Specify one of dev, stg, or prd.
-# Used as the ENV environment variable in CodeBuild and for handling environment-specific logic in buildspec.yml
-environment = app.node.try_get_context("environment")
-# The type of source repository. Specify either github or codecommit.
-source_type = app.node.try_get_context("sourceType")
-
-# Validation context
-missing_contexts: list[str] = []
-
-if not application_name:
-    missing_contexts.append("stackName")
-if not environment:
-    missing_contexts.append("environment")
-if not source_type:
-    missing_contexts.append("sourceType")
-
-if missing_contexts:
-    raise ValueError(
-        f"The following context values are required but missing: {', '.join(missing_contexts)}. "
-        "Please provide them using the '-c <key>=<value>' option."
-    )
-
-# check Application name is pascal case
-if not re.match(PASCAL_CASE_PATTERN, application_name):
-    raise ValueError(
-        f"The application name '{application_name}' is invalid. It must be in PascalCase format."
-    )
-
-# check Source type is `github` or `codecommit`
-if source_type not in ALLOWED_SOURCE_TYPES:
-    raise ValueError(
-        f"Invalid source type '{source_type}'. Allowed values are: {', '.join(ALLOWED_SOURCE_TYPES)}"
-    )
-
-AwsCdkServerlessPipelineStack(
-    app,
-    "AwsCdkServerlessPipelineStack",
-    stack_name=f"{application_name}Stack",
-    application_name=application_name,
-    environment=environment,
-    source_type=source_type,
-)
+stacks: list[AwsCdkServerlessPipelineStack] = []
+# Construction seconds of each stack name and the "synth" seconds of the app.
+# app.synth() renders the stacks together, so its seconds are not broken down by stack.
+timings: dict[str, float] = {}
+
+for stack_options in stack_options_list:
+    if stack_options["deployment_targets"]:
+        # Deployment targets in other accounts and regions need the account and region of the pipeline stack
+        stack_options["env"] = cdk.Environment(
+            account=os.environ.get("CDK_DEFAULT_ACCOUNT"),
+            region=os.environ.get("CDK_DEFAULT_REGION"),
+        )
+    started_at = time.perf_counter()
+    stacks.append(AwsCdkServerlessPipelineStack(
+        app,
+        # The single stack keeps its original construct id
+        stack_options["stack_name"] if manifest_path else "AwsCdkServerlessPipelineStack",
+        **stack_options,
+    ))
+    timings[stack_options["stack_name"]] = time.perf_counter() - started_at
+    if manifest_path:
+        print(
+            f"Constructed {stack_options['stack_name']} in {timings[stack_options['stack_name']]:.2f}s",
+            file=sys.stderr,
+        )
+
+started_at = time.perf_counter()
+cloud_assembly = app.synth()
+timings["synth"] = time.perf_counter() - started_at
+if manifest_path:
+    print(f"Synthesized {len(stacks)} stacks in {timings['synth']:.2f}s", file=sys.stderr)
 
-app.synth()
+# Write the construct tree and template size report when CDK_SYNTH_REPORT is set to a file path. (Optional)
+synth_report_path = os.environ.get(SYNTH_REPORT_ENV)
+if synth_report_path:
+    write_report(assembly_report(stacks, cloud_assembly, timings), synth_report_path)
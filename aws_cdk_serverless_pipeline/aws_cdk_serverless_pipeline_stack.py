@@ -1,12 +1,24 @@
+import base64
+import hashlib
+import json
+from pathlib import Path
 from typing import Any, cast
 
 from aws_cdk import (
     CfnCapabilities,
     CfnOutput,
     CfnParameter,
+    Duration,
     Stack,
+    Token,
+    aws_cloudwatch as cloudwatch,
+    aws_events as events,
+    aws_events_targets as events_targets,
     aws_iam as iam,
+    aws_kms as kms,
+    aws_lambda as lambda_,
     aws_s3 as s3,
+    aws_ssm as ssm,
     aws_codecommit as codecommit,
     aws_codebuild as codebuild,
     aws_codepipeline as codepipeline,
@@ -14,8 +26,142 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from aws_cdk_serverless_pipeline.context import (
+    ARTIFACT_BUCKET_LIFECYCLE_KEYS,
+    CODEBUILD_MAX_INPUT_ARTIFACTS,
+    MAX_STAGE_ACTIONS,
+    PACKAGE_BUDGET_DEFAULT_SETTINGS,
+    PERF_GATE_DEFAULT_SETTINGS,
+    TEST_SHARD_DEFAULT_SETTINGS,
+    deploy_stack_layers,
+    validate_bucket_lifecycle,
+    validate_pipeline_options,
+)
+
+
+# CodePipeline execution mode of each pipeline execution mode name
+PIPELINE_EXECUTION_MODES = {
+    "QUEUED": codepipeline.ExecutionMode.QUEUED,
+    "SUPERSEDED": codepipeline.ExecutionMode.SUPERSEDED,
+    "PARALLEL": codepipeline.ExecutionMode.PARALLEL,
+}
+
+# Code of the function publishing the pipeline metrics, and the namespace of the metrics
+PIPELINE_METRICS_FUNCTION_PATH = str(Path(__file__).parent / "functions" / "pipeline_metrics")
+PIPELINE_METRICS_NAMESPACE = "ServerlessPipeline"
+# Standard deviations of the anomaly detection band of the duration alarms
+PIPELINE_DURATION_ANOMALY_BAND_WIDTH = 2
+
+# Load test runner of the PerfGate stage, embedded in the buildspec of its project
+PERF_GATE_SCRIPT_PATH = str(Path(__file__).parent / "scripts" / "perf_gate.py")
+# Shard planner of the test shards, embedded in the buildspec of their project
+TEST_SHARD_SCRIPT_PATH = str(Path(__file__).parent / "scripts" / "test_shards.py")
+# Analyzer of the PackageBudget action, embedded in the buildspec of its project
+PACKAGE_BUDGET_SCRIPT_PATH = str(Path(__file__).parent / "scripts" / "package_budget.py")
+
+# Prefix of the codebuild cache objects in the s3 cache bucket
+BUILD_CACHE_PREFIX = "codebuild-cache"
+# Days to keep cache objects in the dedicated build cache bucket
+BUILD_CACHE_EXPIRATION_DAYS = 30
+
+# Prefix of the reusable build outputs in the application bucket
+BUILD_REUSE_PREFIX = "build-reuse"
+# Restore and store of the reusable build outputs, embedded in the buildspec of the build projects
+BUILD_REUSE_SCRIPT_PATH = str(Path(__file__).parent / "scripts" / "build_reuse.py")
+# Working directory of the script, whose output directory is the artifacts base directory of the build projects
+BUILD_REUSE_WORK_DIR = ".build-reuse"
+
+# Pipelines sharing the roles of a role set of SharedPipelineResources. The roles of a set hold the statements of
+# every pipeline of the set, which must stay within the IAM quota of 10,240 characters of inline policies per role.
+# The CodeBuild role grows the most, by about 2 KB per pipeline with every option on.
+DEFAULT_PIPELINES_PER_ROLE_SET = 5
+
+# CodeBuild compute type of each build compute size
+BUILD_COMPUTE_TYPES = {
+    "small": codebuild.ComputeType.SMALL,
+    "medium": codebuild.ComputeType.MEDIUM,
+    "large": codebuild.ComputeType.LARGE,
+    "xlarge": codebuild.ComputeType.X_LARGE,
+    "2xlarge": codebuild.ComputeType.X2_LARGE,
+}
+# CodeBuild reserved capacity fleet compute type of each build compute size
+BUILD_FLEET_COMPUTE_TYPES = {
+    "small": codebuild.FleetComputeType.SMALL,
+    "medium": codebuild.FleetComputeType.MEDIUM,
+    "large": codebuild.FleetComputeType.LARGE,
+    "xlarge": codebuild.FleetComputeType.X_LARGE,
+    "2xlarge": codebuild.FleetComputeType.X2_LARGE,
+}
+# CodeBuild reserved capacity fleet overflow behavior of each build fleet overflow
+BUILD_FLEET_OVERFLOW_BEHAVIORS = {
+    "queue": "QUEUE",
+    "on-demand": "ON_DEMAND",
+}
+# CodeBuild environment type of each build architecture
+BUILD_ENVIRONMENT_TYPES = {
+    "x86_64": codebuild.EnvironmentType.LINUX_CONTAINER,
+    "arm64": codebuild.EnvironmentType.ARM_CONTAINER,
+}
+# CodeBuild image of each build architecture
+BUILD_IMAGES = {
+    "x86_64": codebuild.LinuxBuildImage.AMAZON_LINUX_2_5,
+    "arm64": codebuild.LinuxArmBuildImage.AMAZON_LINUX_2_STANDARD_3_0,
+}
+# CodeBuild lambda compute type of each build lambda memory size (MB)
+BUILD_LAMBDA_COMPUTE_TYPES = {
+    1024: codebuild.ComputeType.LAMBDA_1GB,
+    2048: codebuild.ComputeType.LAMBDA_2GB,
+    4096: codebuild.ComputeType.LAMBDA_4GB,
+    8192: codebuild.ComputeType.LAMBDA_8GB,
+    10240: codebuild.ComputeType.LAMBDA_10GB,
+}
+# CodeBuild lambda image of each build lambda runtime and build architecture
+BUILD_LAMBDA_IMAGES = {
+    "python3.12": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2023_PYTHON_3_12,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2023_PYTHON_3_12,
+    },
+    "python3.11": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2_PYTHON_3_11,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2_PYTHON_3_11,
+    },
+    "nodejs20": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2023_NODE_20,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2023_NODE_20,
+    },
+    "nodejs18": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2_NODE_18,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2_NODE_18,
+    },
+    "java21": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2023_CORRETTO_21,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2023_CORRETTO_21,
+    },
+    "java17": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2_CORRETTO_17,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2_CORRETTO_17,
+    },
+    "dotnet8": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2023_DOTNET_8,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2023_DOTNET_8,
+    },
+    "go1.21": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2_GO_1_21,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2_GO_1_21,
+    },
+    "ruby3.2": {
+        "x86_64": codebuild.LinuxLambdaBuildImage.AMAZON_LINUX_2_RUBY_3_2,
+        "arm64": codebuild.LinuxArmLambdaBuildImage.AMAZON_LINUX_2_RUBY_3_2,
+    },
+}
+
+
+class ServerlessPipeline(Construct):
+    """The pipeline of a serverless application, with its buckets, build projects and roles.
+
+    The pipelines of a stack can share the artifact bucket and the roles of a SharedPipelineResources.
+    """
 
-class AwsCdkServerlessPipelineStack(Stack):
     def __init__(
         self,
         scope: Construct,
@@ -24,59 +170,172 @@ class AwsCdkServerlessPipelineStack(Stack):
         application_name: str,
         environment: str, # environment name (dev, stg, prd)
         source_type: str, # source code repository type (github or codecommit)
-        **kwargs: Any,
+        build_cache_mode: str = "none", # codebuild cache mode (none, local or s3)
+        build_cache_dedicated_bucket: bool = False, # use a dedicated bucket for the s3 build cache
+        build_privileged: bool = False, # run the builds in privileged mode for docker (required by the docker layer cache)
+        build_compute_size: str = "small", # codebuild compute size (small, medium, large, xlarge or 2xlarge)
+        build_architecture: str = "x86_64", # codebuild architecture (x86_64 or arm64)
+        build_timeout_minutes: int | None = None, # codebuild timeout in minutes (not supported by lambda compute)
+        build_fleet_capacity: int = 0, # base capacity of the codebuild reserved capacity fleet (0 to disable)
+        build_fleet_overflow: str = "queue", # codebuild fleet overflow behavior (queue or on-demand)
+        build_compute_mode: str = "container", # codebuild compute mode (container or lambda)
+        build_lambda_memory: int = 2048, # memory size (MB) of the codebuild lambda compute
+        build_lambda_runtime: str = "python3.12", # runtime of the codebuild lambda image
+        build_targets: list[dict[str, str]] | None = None, # build targets of a monorepo (name, path and buildspec)
+        build_fan_out: str = "parallel", # fan-out of the build targets (parallel or batch)
+        trigger_filters: dict[str, list[str]] | None = None, # git push filters of the pipeline trigger (github only)
+        execution_mode: str = "QUEUED", # pipeline execution mode (QUEUED, SUPERSEDED or PARALLEL)
+        parameter_defaults: dict[str, str] | None = None, # default values of the cloudformation parameters
+        deploy_mode: str = "changeset", # cfn deploy mode (changeset or direct, direct is dev only)
+        promotion_environments: list[str] | None = None, # environments to promote a single build through (in order)
+        promotion_parameter_name: str = "Environment", # template parameter receiving the environment of a promotion stage
+        deployment_targets: list[dict[str, Any]] | None = None, # accounts and regions to deploy to in waves (account, region, wave and role_arn)
+        deploy_stacks: list[dict[str, Any]] | None = None, # packaged templates to deploy as stacks (name, template_file, stack_name and depends_on)
+        deploy_skip_unchanged: bool = False, # skip the cfn deploy stage when the packaged templates are unchanged
+        build_reuse: bool = False, # reuse the build outputs of the same commit and build configuration
+        build_reuse_retention_days: int = 14, # days to keep the reusable build outputs
+        pipeline_monitoring: bool = False, # publish the pipeline durations with a dashboard and duration alarms
+        artifact_bucket_kms: bool = False, # encrypt the artifacts with a customer managed key (always on for cross-account targets)
+        artifact_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the artifact bucket (see ARTIFACT_BUCKET_LIFECYCLE_KEYS)
+        application_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the application bucket (see APPLICATION_BUCKET_LIFECYCLE_KEYS)
+        perf_gate: bool = False, # run a load test after each deploy and fail on its latency and error rate thresholds
+        perf_gate_settings: dict[str, Any] | None = None, # settings of the load test (see PERF_GATE_DEFAULT_SETTINGS)
+        perf_gate_environments: list[str] | None = None, # promotion environments whose deploys are load tested (default: all)
+        test_shards: int = 0, # parallel test shards of the build stage (0 to disable)
+        test_shard_settings: dict[str, str] | None = None, # settings of the test shards (see TEST_SHARD_DEFAULT_SETTINGS)
+        package_budget: bool = False, # check the code size, layers and memory of the packaged functions after the build
+        package_budget_settings: dict[str, Any] | None = None, # budgets of the packaged functions (see PACKAGE_BUDGET_DEFAULT_SETTINGS)
+        shared_resources: "SharedPipelineResources | None" = None, # artifact bucket and roles shared with other pipelines
+        parameter_values: dict[str, str] | None = None, # values of the parameters to use instead of cloudformation parameters
+        outputs: bool = True, # add the cloudformation outputs of the pipeline
     ) -> None:
-        super().__init__(scope, construct_id, **kwargs)
+        super().__init__(scope, construct_id)
+
+        # The context validates the same options with the same rules, so only the rules of the constructs are left here
+        validate_pipeline_options(dict(
+            application_name=application_name,
+            environment=environment,
+            source_type=source_type,
+            build_cache_mode=build_cache_mode,
+            build_privileged=build_privileged,
+            build_compute_size=build_compute_size,
+            build_architecture=build_architecture,
+            build_timeout_minutes=build_timeout_minutes,
+            build_fleet_capacity=build_fleet_capacity,
+            build_fleet_overflow=build_fleet_overflow,
+            build_compute_mode=build_compute_mode,
+            build_lambda_memory=build_lambda_memory,
+            build_lambda_runtime=build_lambda_runtime,
+            build_targets=build_targets,
+            build_fan_out=build_fan_out,
+            trigger_filters=trigger_filters,
+            execution_mode=execution_mode,
+            deploy_mode=deploy_mode,
+            promotion_environments=promotion_environments,
+            promotion_parameter_name=promotion_parameter_name,
+            deployment_targets=deployment_targets,
+            deploy_stacks=deploy_stacks,
+            deploy_skip_unchanged=deploy_skip_unchanged,
+            build_reuse=build_reuse,
+            build_reuse_retention_days=build_reuse_retention_days,
+            artifact_bucket_lifecycle=artifact_bucket_lifecycle,
+            application_bucket_lifecycle=application_bucket_lifecycle,
+            perf_gate=perf_gate,
+            perf_gate_settings=perf_gate_settings,
+            perf_gate_environments=perf_gate_environments,
+            test_shards=test_shards,
+            test_shard_settings=test_shard_settings,
+            package_budget_settings=package_budget_settings,
+        ))
+
+        parameter_defaults = parameter_defaults or {}
+        self._shared_resources = shared_resources
+        # The roles of the pipeline are those of its role set when the roles are shared
+        self._role_set = shared_resources.add_pipeline() if shared_resources is not None else None
 
         #############################################################
         # Parameters
         #############################################################
-        repository_name_param = CfnParameter(
-            self,
-            "RepositoryName",
-            type="String",
-            description="The name of source code repository codecommit or github.",
-        )
-        branch_name_param = CfnParameter(
-            self,
-            "BranchName",
-            type="String",
-            description="The name of repository branch.",
-        )
-        template_file_name_param = CfnParameter(
-            self,
-            "TemplateFileName",
-            default="packaged.yaml",
-            type="String",
-            description="The name of the packaged template file.",
-        )
-        github_owner_param = CfnParameter(
-            self,
-            "GithubOwner",
-            default="",
-            type="String",
-            description="The name of github repository owner. Required if source_type context is github.",
-        )
-        github_connection_arn_param = CfnParameter(
-            self,
-            "GithubConnectionArn",
-            default="",
-            type="String",
-            description="The name of code star connection arn of github. Required if source_type context is github.",
-            no_echo=True,
-        )
+        if parameter_values is not None:
+            # Literal values keep a stack of many pipelines within the CloudFormation quota of 200 parameters
+            missing_parameters = [name for name in ["RepositoryName", "BranchName"] if not parameter_values.get(name)]
+            if missing_parameters:
+                raise ValueError(f"parameter_values requires: {', '.join(missing_parameters)}")
+            repository_name = parameter_values["RepositoryName"]
+            branch_name = parameter_values["BranchName"]
+            template_file_name = parameter_values.get("TemplateFileName", "packaged.yaml")
+            github_owner_name = parameter_values.get("GithubOwner", "")
+            github_connection_arn_name = parameter_values.get("GithubConnectionArn", "")
+        else:
+            repository_name_param = CfnParameter(
+                self,
+                "RepositoryName",
+                default=parameter_defaults.get("RepositoryName"),
+                type="String",
+                description="The name of source code repository codecommit or github.",
+            )
+            branch_name_param = CfnParameter(
+                self,
+                "BranchName",
+                default=parameter_defaults.get("BranchName"),
+                type="String",
+                description="The name of repository branch.",
+            )
+            template_file_name_param = CfnParameter(
+                self,
+                "TemplateFileName",
+                default=parameter_defaults.get("TemplateFileName", "packaged.yaml"),
+                type="String",
+                description="The name of the packaged template file.",
+            )
+            github_owner_param = CfnParameter(
+                self,
+                "GithubOwner",
+                default=parameter_defaults.get("GithubOwner", ""),
+                type="String",
+                description="The name of github repository owner. Required if source_type context is github.",
+            )
+            github_connection_arn_param = CfnParameter(
+                self,
+                "GithubConnectionArn",
+                default=parameter_defaults.get("GithubConnectionArn", ""),
+                type="String",
+                description="The name of code star connection arn of github. Required if source_type context is github.",
+                no_echo=True,
+            )
 
-        repository_name = repository_name_param.value_as_string
-        branch_name = branch_name_param.value_as_string
-        template_file_name = template_file_name_param.value_as_string
-        github_owner_name = github_owner_param.value_as_string
-        github_connection_arn_name = github_connection_arn_param.value_as_string
+            repository_name = repository_name_param.value_as_string
+            branch_name = branch_name_param.value_as_string
+            template_file_name = template_file_name_param.value_as_string
+            github_owner_name = github_owner_param.value_as_string
+            github_connection_arn_name = github_connection_arn_param.value_as_string
 
         #############################################################
         # CodePipeline
         #############################################################
+        deployment_targets = deployment_targets or []
+        self._validate_deployment_targets(deployment_targets=deployment_targets)
+        cross_account = any(self._is_cross_account_target(target) for target in deployment_targets)
+
         codepipeline_project_name = f"{application_name}Pipeline"
-        artifact_bucket = s3.Bucket(self, "ArtifactBucketStore", versioned=True)
+        if shared_resources is not None:
+            if artifact_bucket_kms or artifact_bucket_lifecycle:
+                raise ValueError(
+                    "artifact_bucket_kms and artifact_bucket_lifecycle are set by the shared_resources "
+                    "of a pipeline sharing the artifact bucket."
+                )
+            if cross_account and not shared_resources.artifact_bucket_kms:
+                raise ValueError(
+                    "deployment_targets in other accounts require shared_resources with artifact_bucket_kms."
+                )
+            artifact_bucket = shared_resources.artifact_bucket
+        else:
+            # Other accounts can read the artifacts only when they are encrypted with a customer managed key
+            artifact_bucket = self._generate_artifact_bucket(
+                self,
+                artifact_bucket_kms=artifact_bucket_kms or cross_account,
+                artifact_bucket_lifecycle=artifact_bucket_lifecycle or {},
+            )
 
         codepipeline_role: iam.Role = self._generate_codepipeline_role(
             repository_name=repository_name,
@@ -91,6 +350,7 @@ class AwsCdkServerlessPipelineStack(Stack):
             artifact_bucket=artifact_bucket,
             role=cast(iam.IRole, codepipeline_role),
             pipeline_type=codepipeline.PipelineType.V2,
+            execution_mode=PIPELINE_EXECUTION_MODES[execution_mode],
         )
 
         #############################################################
@@ -106,8 +366,12 @@ class AwsCdkServerlessPipelineStack(Stack):
                 branch=branch_name,
                 connection_arn=github_connection_arn_name,
                 output=source_output,
+                role=self._generate_shared_action_role(
+                    role_id="GitHubSourceActionRole",
+                    assumed_by=cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn)),
+                ),
             )
-        elif source_type == "codecommit":
+        else:
             codepipeline_source_action_role: iam.Role = self._generate_codepipeline_source_action_role(
                 codepipeline_role=cast(iam.IRole, codepipeline_role),
                 repository_name=repository_name
@@ -121,67 +385,442 @@ class AwsCdkServerlessPipelineStack(Stack):
                 ),
                 branch=branch_name,
                 output=source_output,
-                role=cast(iam.IRole, codepipeline_source_action_role)
+                role=cast(iam.IRole, codepipeline_source_action_role),
+                event_role=self._generate_shared_action_role(
+                    role_id="SourceEventRole",
+                    assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("events.amazonaws.com")),
+                ),
             )
-        else:
-            raise ValueError(f"Unsupported source_type: {source_type}")
 
         codepipeline_project.add_stage(
             stage_name="Source",
             actions=[codepipeline_source_action],
         )
 
+        if trigger_filters:
+            # Pipeline triggers are only supported for CodeStar connections sources, which the validation checks
+            codepipeline_project.add_trigger(
+                provider_type=codepipeline.ProviderType.CODE_STAR_SOURCE_CONNECTION,
+                git_configuration=codepipeline.GitConfiguration(
+                    source_action=codepipeline_source_action,
+                    push_filter=self._generate_git_push_filters(
+                        trigger_filters=trigger_filters,
+                        branch_name=branch_name,
+                    ),
+                ),
+            )
+
         #############################################################
         # Build
         #############################################################
+        build_image: codebuild.IBuildImage = BUILD_IMAGES[build_architecture]
+        build_compute_type = BUILD_COMPUTE_TYPES[build_compute_size]
+        if build_compute_mode == "lambda":
+            build_image = BUILD_LAMBDA_IMAGES[build_lambda_runtime][build_architecture]
+            build_compute_type = BUILD_LAMBDA_COMPUTE_TYPES[build_lambda_memory]
+
+        build_targets = build_targets or []
+        promotion_environments = promotion_environments or []
+        deploy_stacks = deploy_stacks or []
+        deploy_layers = deploy_stack_layers(deploy_stacks)
+
         codebuild_project_name = f"{application_name}Build"
-        application_bucket = s3.Bucket(self, "ApplicationBucket")
+        application_bucket_lifecycle_rules = self._generate_bucket_lifecycle_rules(
+            bucket_lifecycle=application_bucket_lifecycle or {},
+        )
+        if build_reuse:
+            # The reusable build outputs expire, so the bucket holds only the recent commits
+            application_bucket_lifecycle_rules.append(
+                s3.LifecycleRule(
+                    prefix=f"{BUILD_REUSE_PREFIX}/",
+                    expiration=Duration.days(build_reuse_retention_days),
+                )
+            )
+        application_bucket = s3.Bucket(
+            self,
+            "ApplicationBucket",
+            lifecycle_rules=application_bucket_lifecycle_rules or None,
+        )
         build_output = codepipeline.Artifact("CompiledCFNTemplate")
 
+        build_cache_bucket = None
+        if build_cache_mode == "s3" and build_cache_dedicated_bucket:
+            build_cache_bucket = s3.Bucket(
+                self,
+                "BuildCacheBucket",
+                lifecycle_rules=[
+                    s3.LifecycleRule(expiration=Duration.days(BUILD_CACHE_EXPIRATION_DAYS))
+                ],
+            )
+        elif build_cache_mode == "s3":
+            build_cache_bucket = application_bucket
+
+        build_fleet = None
+        if build_fleet_capacity > 0:
+            build_fleet = codebuild.Fleet(
+                self,
+                "BuildFleet",
+                fleet_name=f"{application_name}BuildFleet",
+                base_capacity=build_fleet_capacity,
+                compute_type=BUILD_FLEET_COMPUTE_TYPES[build_compute_size],
+                environment_type=BUILD_ENVIRONMENT_TYPES[build_architecture],
+            )
+            cast(codebuild.CfnFleet, build_fleet.node.default_child).add_property_override(
+                "FleetOverflowBehavior",
+                BUILD_FLEET_OVERFLOW_BEHAVIORS[build_fleet_overflow],
+            )
+
         codebuild_role: iam.Role = self._generate_codebuild_role(
             codebuild_project_name=codebuild_project_name,
-            application_bucket=application_bucket
+            application_bucket=application_bucket,
+            build_reuse=build_reuse,
         )
+
+        build_batch = bool(build_targets) and build_fan_out == "batch"
+        codebuild_project_names = [codebuild_project_name]
+        if build_targets and build_fan_out == "parallel":
+            codebuild_project_names = [f"{codebuild_project_name}{target['name']}" for target in build_targets]
         codepipeline_build_action_role: iam.Role = self._generate_codepipeline_build_action_role(
             codepipeline_role=cast(iam.IRole, codepipeline_role),
-            codebuild_project_name=codebuild_project_name
+            codebuild_project_names=codebuild_project_names,
+            batch_build=build_batch,
+        )
+
+        build_environment_variables = {
+            "ENV": codebuild.BuildEnvironmentVariable(value=environment),
+            "APP_S3_BUCKET": codebuild.BuildEnvironmentVariable(value=application_bucket.bucket_name)
+        }
+        if promotion_environments:
+            # The artifacts are shared by every environment, which is passed to the stacks as a parameter instead
+            del build_environment_variables["ENV"]
+
+        build_action_environment_variables = None
+        if build_reuse:
+            # The build outputs are stored and looked up at BUILD_REUSE_URI/SOURCE_COMMIT_ID
+            build_config_hash = self._generate_build_config_hash(
+                environment=None if promotion_environments else environment,
+                build_compute_mode=build_compute_mode,
+                build_compute_size=build_compute_size,
+                build_architecture=build_architecture,
+                build_lambda_memory=build_lambda_memory,
+                build_lambda_runtime=build_lambda_runtime,
+                build_targets=build_targets,
+                build_fan_out=build_fan_out,
+            )
+            build_environment_variables["BUILD_CONFIG_HASH"] = codebuild.BuildEnvironmentVariable(value=build_config_hash)
+            build_environment_variables["BUILD_REUSE_URI"] = codebuild.BuildEnvironmentVariable(
+                value=f"s3://{application_bucket.bucket_name}/{BUILD_REUSE_PREFIX}/{build_config_hash}"
+            )
+            build_action_environment_variables = {
+                "SOURCE_COMMIT_ID": codebuild.BuildEnvironmentVariable(
+                    value=codepipeline_source_action.variables.commit_id
+                )
+            }
+        build_environment = codebuild.BuildEnvironment(
+            build_image=build_image,
+            compute_type=build_compute_type,
+            privileged=build_privileged,
+            fleet=build_fleet,
+            environment_variables=build_environment_variables,
         )
+        build_timeout = Duration.minutes(build_timeout_minutes) if build_timeout_minutes else None
+        build_cache = self._generate_codebuild_cache(
+            build_cache_mode=build_cache_mode,
+            build_cache_bucket=build_cache_bucket,
+            build_privileged=build_privileged,
+        ) if build_compute_mode == "container" else None
 
-        codepipeline_build_action = codepipeline_actions.CodeBuildAction(
-            action_name="CodeBuild",
-            project=cast(codebuild.IProject, codebuild.PipelineProject(
+        # Packaged templates to deploy as (build target or deploy stack name, template path in the build artifacts,
+        # stack name or None for the default name, layer of the stack dependencies)
+        deploy_templates: list[tuple[str, codepipeline.ArtifactPath, str | None, int]] = []
+        codepipeline_build_actions: list[codepipeline.IAction] = []
+        if build_targets and build_fan_out == "parallel":
+            # One project per build target. The actions share the run order, so the targets build in parallel.
+            for build_target in build_targets:
+                target_name = build_target["name"]
+                target_build_output = codepipeline.Artifact(f"CompiledCFNTemplate{target_name}")
+                codepipeline_build_actions.append(codepipeline_actions.CodeBuildAction(
+                    action_name=f"CodeBuild{target_name}",
+                    project=cast(codebuild.IProject, codebuild.PipelineProject(
+                        self,
+                        f"AppPackageBuild{target_name}",
+                        project_name=f"{codebuild_project_name}{target_name}",
+                        environment=build_environment,
+                        environment_variables={
+                            "SERVICE_DIR": codebuild.BuildEnvironmentVariable(value=build_target["path"]),
+                            **({
+                                "BUILD_REUSE_TARGET": codebuild.BuildEnvironmentVariable(value=target_name)
+                            } if build_reuse else {}),
+                        },
+                        role=cast(iam.IRole, codebuild_role),
+                        build_spec=self._generate_build_reuse_build_spec(build_target["buildspec"])
+                        if build_reuse else codebuild.BuildSpec.from_source_filename(build_target["buildspec"]),
+                        timeout=build_timeout,
+                        cache=build_cache,
+                    )),
+                    input=source_output,
+                    outputs=[target_build_output],
+                    run_order=1,
+                    environment_variables=build_action_environment_variables,
+                    role=cast(iam.IRole, codepipeline_build_action_role)
+                ))
+                deploy_templates.append((target_name, target_build_output.at_path(template_file_name), None, 0))
+        elif build_targets:
+            # One batch build whose build list holds the build targets.
+            # The combined artifacts hold the output of each target in a directory named after the target.
+            codebuild_project = codebuild.PipelineProject(
                 self,
                 "AppPackageBuild",
                 project_name=codebuild_project_name,
+                environment=build_environment,
+                role=cast(iam.IRole, codebuild_role),
+                build_spec=codebuild.BuildSpec.from_object({
+                    "version": "0.2",
+                    "batch": {
+                        "fast-fail": False,
+                        "build-list": [
+                            {
+                                "identifier": build_target["name"],
+                                "buildspec": build_target["buildspec"],
+                                "env": {
+                                    "variables": {"SERVICE_DIR": build_target["path"]}
+                                },
+                            }
+                            for build_target in build_targets
+                        ],
+                    },
+                }),
+                timeout=build_timeout,
+                cache=build_cache,
+            )
+            codebuild_project.enable_batch_builds()
+            codepipeline_build_actions.append(codepipeline_actions.CodeBuildAction(
+                action_name="CodeBuild",
+                project=cast(codebuild.IProject, codebuild_project),
+                input=source_output,
+                outputs=[build_output],
+                execute_batch_build=True,
+                combine_batch_build_artifacts=True,
+                environment_variables=build_action_environment_variables,
+                role=cast(iam.IRole, codepipeline_build_action_role)
+            ))
+            for build_target in build_targets:
+                deploy_templates.append(
+                    (build_target["name"], build_output.at_path(f"{build_target['name']}/{template_file_name}"), None, 0)
+                )
+        else:
+            codepipeline_build_actions.append(codepipeline_actions.CodeBuildAction(
+                action_name="CodeBuild",
+                project=cast(codebuild.IProject, codebuild.PipelineProject(
+                    self,
+                    "AppPackageBuild",
+                    project_name=codebuild_project_name,
+                    environment=build_environment,
+                    role=cast(iam.IRole, codebuild_role),
+                    build_spec=self._generate_build_reuse_build_spec("buildspec.yml")
+                    if build_reuse else codebuild.BuildSpec.from_source_filename("buildspec.yml"),
+                    timeout=build_timeout,
+                    cache=build_cache,
+                )),
+                input=source_output,
+                outputs=[build_output],
+                environment_variables=build_action_environment_variables,
+                role=cast(iam.IRole, codepipeline_build_action_role)
+            ))
+            # The build packages every deploy stack template into the same artifact
+            for deploy_stack in deploy_stacks:
+                deploy_templates.append((
+                    deploy_stack["name"],
+                    build_output.at_path(deploy_stack["template_file"]),
+                    deploy_stack.get("stack_name"),
+                    deploy_layers[deploy_stack["name"]],
+                ))
+            if not deploy_stacks:
+                deploy_templates.append(("", build_output.at_path(template_file_name), None, 0))
+
+        template_hash_parameter = None
+        template_hash_action_role = None
+        template_hash_check_action = None
+        if deploy_skip_unchanged:
+            # The hash of the packaged templates of the last successful deployment
+            template_hash_parameter = ssm.StringParameter(
+                self,
+                "DeployedTemplateHash",
+                parameter_name=f"/{codepipeline_project_name}/DeployedTemplateHash",
+                string_value="none",
+                description="The hash of the packaged templates of the last successful deployment.",
+            )
+            template_hash_action_role = self._generate_codepipeline_template_hash_action_role(
+                codepipeline_role=cast(iam.IRole, codepipeline_role),
+                template_hash_parameter=template_hash_parameter,
+            )
+            template_hash_check_action = self._generate_template_hash_check_action(
+                template_paths=[template_path for _, template_path, _, _ in deploy_templates],
+                template_hash_parameter=template_hash_parameter,
+                role=cast(iam.IRole, template_hash_action_role),
+            )
+            codepipeline_build_actions.append(template_hash_check_action)
+
+        package_budget_report_group = None
+        if package_budget:
+            package_budget_project_name = f"{application_name}PackageBudget"
+            package_budget_report_group = codebuild.ReportGroup(
+                self,
+                "PackageBudgetReportGroup",
+                report_group_name=package_budget_project_name,
+                type=codebuild.ReportGroupType.TEST,
+            )
+            package_budget_project = codebuild.PipelineProject(
+                self,
+                "PackageBudgetProject",
+                project_name=package_budget_project_name,
                 environment=codebuild.BuildEnvironment(
-                    build_image=codebuild.LinuxBuildImage.AMAZON_LINUX_2_5,
+                    build_image=BUILD_IMAGES[build_architecture],
                     compute_type=codebuild.ComputeType.SMALL,
                     environment_variables={
-                        "ENV": codebuild.BuildEnvironmentVariable(value=environment),
-                        "APP_S3_BUCKET": codebuild.BuildEnvironmentVariable(value=application_bucket.bucket_name)
+                        f"PACKAGE_BUDGET_{key.upper()}": codebuild.BuildEnvironmentVariable(value=str(value))
+                        for key, value in {**PACKAGE_BUDGET_DEFAULT_SETTINGS, **(package_budget_settings or {})}.items()
+                        if value is not None
                     },
                 ),
-                role=cast(iam.IRole, codebuild_role),
-                build_spec=codebuild.BuildSpec.from_source_filename("buildspec.yml"),
-            )),
-            input=source_output,
-            outputs=[build_output],
-            role=cast(iam.IRole, codepipeline_build_action_role)
-        )
+                role=cast(iam.IRole, self._generate_package_budget_role(
+                    package_budget_project_name=package_budget_project_name,
+                    package_budget_report_group=package_budget_report_group,
+                    application_bucket=application_bucket,
+                )),
+                # The analyzer is a part of this package, so the action needs no file in the application source
+                build_spec=codebuild.BuildSpec.from_object({
+                    "version": "0.2",
+                    "phases": {
+                        # The analyzer reads the packaged templates with the CloudFormation tags of their YAML
+                        "install": {
+                            "commands": ["pip3 install --quiet PyYAML"],
+                        },
+                        "build": {
+                            "commands": [
+                                *self._generate_inline_script_commands(PACKAGE_BUDGET_SCRIPT_PATH, "package_budget.py"),
+                                "python3 package_budget.py",
+                            ],
+                        },
+                    },
+                    "reports": {
+                        package_budget_report_group.report_group_arn: {
+                            "files": ["package-budget-report.xml"],
+                            "file-format": "JUNITXML",
+                        },
+                    },
+                }),
+                timeout=Duration.minutes(15),
+            )
+            codepipeline_build_actions.append(self._generate_package_budget_action(
+                package_budget_project=package_budget_project,
+                template_paths=[template_path for _, template_path, _, _ in deploy_templates],
+                role=cast(iam.IRole, self._generate_codepipeline_build_action_role(
+                    codepipeline_role=cast(iam.IRole, codepipeline_role),
+                    codebuild_project_names=[package_budget_project_name],
+                    role_id="PackageBudgetActionRole",
+                )),
+            ))
+
+        #############################################################
+        # Test
+        #############################################################
+        test_report_group = None
+        if test_shards:
+            test_shard_settings = {**TEST_SHARD_DEFAULT_SETTINGS, **(test_shard_settings or {})}
+            test_project_name = f"{application_name}Test"
+            # The per-test durations of the reports balance the shards of the later runs
+            test_report_group = codebuild.ReportGroup(
+                self,
+                "TestReportGroup",
+                report_group_name=test_project_name,
+                type=codebuild.ReportGroupType.TEST,
+            )
+            test_project = codebuild.PipelineProject(
+                self,
+                "TestProject",
+                project_name=test_project_name,
+                environment=build_environment,
+                environment_variables={
+                    "TEST_SHARD_FILES_GLOB": codebuild.BuildEnvironmentVariable(value=test_shard_settings["files"]),
+                    "TEST_REPORT_GROUP_ARN": codebuild.BuildEnvironmentVariable(value=test_report_group.report_group_arn),
+                },
+                role=cast(iam.IRole, self._generate_test_role(
+                    test_project_name=test_project_name,
+                    test_report_group=test_report_group,
+                )),
+                build_spec=codebuild.BuildSpec.from_object({
+                    "version": "0.2",
+                    "phases": {
+                        "build": {
+                            "commands": [
+                                *self._generate_inline_script_commands(TEST_SHARD_SCRIPT_PATH, "test_shards.py"),
+                                'export TEST_SHARD_FILES="$(python3 test_shards.py)"',
+                                # A shard without files would run the whole suite with most test commands
+                                f'if [ -n "$TEST_SHARD_FILES" ]; then {test_shard_settings["command"]}; '
+                                'else echo "No test files in this shard."; fi',
+                            ],
+                        },
+                    },
+                    "reports": {
+                        test_report_group.report_group_arn: {
+                            "files": [test_shard_settings["report_files"]],
+                            "file-format": "JUNITXML",
+                        },
+                    },
+                }),
+                timeout=build_timeout,
+                cache=build_cache,
+            )
+            test_action_role = self._generate_codepipeline_build_action_role(
+                codepipeline_role=cast(iam.IRole, codepipeline_role),
+                codebuild_project_names=[test_project_name],
+                role_id="TestActionRole",
+            )
+            # The shards share the run order of the build actions, so the tests run in parallel with the build.
+            # A failing shard fails the Build stage, so nothing is deployed.
+            codepipeline_build_actions.extend(
+                codepipeline_actions.CodeBuildAction(
+                    action_name=f"TestShard{shard_index + 1}",
+                    project=cast(codebuild.IProject, test_project),
+                    input=source_output,
+                    environment_variables={
+                        "TEST_SHARD_INDEX": codebuild.BuildEnvironmentVariable(value=str(shard_index)),
+                        "TEST_SHARD_COUNT": codebuild.BuildEnvironmentVariable(value=str(test_shards)),
+                        # The shards leave the reports of their own execution out of the history
+                        "TEST_PIPELINE_EXECUTION_ID": codebuild.BuildEnvironmentVariable(
+                            value="#{codepipeline.PipelineExecutionId}"
+                        ),
+                    },
+                    run_order=1,
+                    role=cast(iam.IRole, test_action_role),
+                )
+                for shard_index in range(test_shards)
+            )
+            if len(codepipeline_build_actions) > MAX_STAGE_ACTIONS:
+                raise ValueError(
+                    f"The Build stage has {len(codepipeline_build_actions)} actions with test_shards {test_shards}. "
+                    f"A stage has at most {MAX_STAGE_ACTIONS} actions."
+                )
 
         codepipeline_project.add_stage(
             stage_name="Build",
-            actions=[codepipeline_build_action],
+            actions=codepipeline_build_actions,
         )
 
         #############################################################
         # Approval only stg and prd
         #############################################################
         codepipeline_manual_approval_action = None
-        if environment in ["stg", "prd"]:
+        # The promotion stages have approvals of their own
+        if environment in ["stg", "prd"] and not promotion_environments:
             codepipeline_manual_approval_action = codepipeline_actions.ManualApprovalAction(
                 action_name="ManualApproval",
                 additional_information="Please review the build artifacts before deploying.",
+                role=self._generate_shared_action_role(
+                    role_id="ManualApprovalActionRole",
+                    assumed_by=cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn)),
+                ),
             )
 
             codepipeline_project.add_stage(
@@ -189,66 +828,847 @@ class AwsCdkServerlessPipelineStack(Stack):
                 actions=[codepipeline_manual_approval_action],
             )
 
+        #############################################################
+        # PerfGate
+        #############################################################
+        perf_gate_report_group = None
+        perf_gate_action_role = None
+        perf_gate_project = None
+        if perf_gate:
+            perf_gate_project_name = f"{application_name}PerfGate"
+            perf_gate_report_group = codebuild.ReportGroup(
+                self,
+                "PerfGateReportGroup",
+                report_group_name=perf_gate_project_name,
+                type=codebuild.ReportGroupType.TEST,
+            )
+            perf_gate_project = codebuild.PipelineProject(
+                self,
+                "PerfGateProject",
+                project_name=perf_gate_project_name,
+                environment=codebuild.BuildEnvironment(
+                    build_image=BUILD_IMAGES[build_architecture],
+                    compute_type=codebuild.ComputeType.SMALL,
+                    environment_variables={
+                        f"PERF_GATE_{key.upper()}": codebuild.BuildEnvironmentVariable(value=str(value))
+                        for key, value in {**PERF_GATE_DEFAULT_SETTINGS, **(perf_gate_settings or {})}.items()
+                        if value is not None
+                    },
+                ),
+                role=cast(iam.IRole, self._generate_perf_gate_role(
+                    perf_gate_project_name=perf_gate_project_name,
+                    perf_gate_report_group=perf_gate_report_group,
+                )),
+                # The load test runner is a part of this package, so the stage needs no file in the application source
+                build_spec=codebuild.BuildSpec.from_object({
+                    "version": "0.2",
+                    "phases": {
+                        "build": {
+                            "commands": [
+                                *self._generate_inline_script_commands(PERF_GATE_SCRIPT_PATH, "perf_gate.py"),
+                                "python3 perf_gate.py",
+                            ],
+                        },
+                    },
+                    "reports": {
+                        perf_gate_report_group.report_group_arn: {
+                            "files": ["perf-gate-report.xml"],
+                            "file-format": "JUNITXML",
+                        },
+                    },
+                }),
+                timeout=Duration.minutes(15),
+            )
+            perf_gate_action_role = self._generate_codepipeline_build_action_role(
+                codepipeline_role=cast(iam.IRole, codepipeline_role),
+                codebuild_project_names=[perf_gate_project_name],
+                role_id="PerfGateActionRole",
+            )
+
         #############################################################
         # CfnDeploy
         #############################################################
+        # The role deploys the stacks of the targets in the pipeline account, and the targets of other accounts
+        # deploy with their own role_arn
+        deploy_target_regions = [
+            target["region"] for target in deployment_targets if not self._is_cross_account_target(target)
+        ]
         codepipeline_cfn_deploy_action_role: iam.Role = self._generate_codepipeline_cfn_deploy_action_role(
-            codepipeline_role=cast(iam.IRole, codepipeline_role)
-        )
-
-        codepipeline_cloudformation_create_replace_change_set_action = codepipeline_actions.CloudFormationCreateReplaceChangeSetAction(
-            action_name="CreateReplaceChangeSet",
-            stack_name=f"{application_name}BetaStack",
-            change_set_name=f"{application_name}ChangeSet",
-            admin_permissions=True,
-            template_path=build_output.at_path(template_file_name),
-            run_order=1,
-            role=cast(iam.IRole, codepipeline_cfn_deploy_action_role),
-            cfn_capabilities=[
-                CfnCapabilities.ANONYMOUS_IAM
-            ]
+            codepipeline_role=cast(iam.IRole, codepipeline_role),
+            deploy_stack_arns=[
+                f"arn:aws:cloudformation:{region}:{Stack.of(self).account}:stack/{application_name}*"
+                for region in deploy_target_regions
+            ] + [
+                f"arn:aws:cloudformation:{region}:{Stack.of(self).account}:stack/{deploy_stack['stack_name']}*"
+                for region in (deploy_target_regions if deployment_targets else [Stack.of(self).region])
+                for deploy_stack in deploy_stacks
+                if deploy_stack.get("stack_name")
+            ],
         )
 
-        codepipeline_cloudformation_execute_change_set_action = codepipeline_actions.CloudFormationExecuteChangeSetAction(
-            action_name="ExecuteChangeSet",
-            stack_name=f"{application_name}BetaStack",
-            change_set_name=f"{application_name}ChangeSet",
-            run_order=2,
-            output=codepipeline.Artifact("AppDeploymentValues"),
-        )
+        if promotion_environments:
+            # The build artifacts are promoted through the environments in order.
+            # A manual approval precedes stg and prd, and only dev may deploy directly.
+            for promotion_environment in promotion_environments:
+                stage_suffix = promotion_environment.capitalize()
+                if promotion_environment in ["stg", "prd"]:
+                    codepipeline_project.add_stage(
+                        stage_name=f"Approval{stage_suffix}",
+                        actions=[
+                            codepipeline_actions.ManualApprovalAction(
+                                action_name="ManualApproval",
+                                additional_information=f"Please review the deployment before promoting it to {promotion_environment}.",
+                                role=self._generate_shared_action_role(
+                                    role_id="ManualApprovalActionRole",
+                                    assumed_by=cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn)),
+                                ),
+                            )
+                        ],
+                    )
 
-        codepipeline_project.add_stage(
-            stage_name="CfnDeploy",
-            actions=[
-                codepipeline_cloudformation_create_replace_change_set_action,
-                codepipeline_cloudformation_execute_change_set_action
-            ],
-        )
+                codepipeline_cfn_deploy_actions: list[codepipeline.IAction] = []
+                for target_name, template_path, stack_name, layer in deploy_templates:
+                    codepipeline_cfn_deploy_actions.extend(self._generate_cfn_deploy_actions(
+                        application_name=application_name,
+                        target_name=target_name,
+                        template_path=template_path,
+                        stack_name=stack_name,
+                        layer=layer,
+                        deploy_mode=deploy_mode if promotion_environment == "dev" else "changeset",
+                        role=cast(iam.IRole, codepipeline_cfn_deploy_action_role),
+                        stage_suffix=stage_suffix,
+                        parameter_overrides={promotion_parameter_name: promotion_environment},
+                    ))
+
+                codepipeline_project.add_stage(
+                    stage_name=f"CfnDeploy{stage_suffix}",
+                    actions=codepipeline_cfn_deploy_actions,
+                )
+                if perf_gate_project is not None and (
+                    perf_gate_environments is None or promotion_environment in perf_gate_environments
+                ):
+                    codepipeline_project.add_stage(
+                        stage_name=f"PerfGate{stage_suffix}",
+                        actions=[self._generate_perf_gate_action(
+                            perf_gate_project=perf_gate_project,
+                            cfn_deploy_actions=codepipeline_cfn_deploy_actions,
+                            role=cast(iam.IRole, perf_gate_action_role),
+                        )],
+                    )
+        elif deployment_targets:
+            # The targets of a wave are deployed in parallel with a shared run order, and the waves one after another
+            for wave in sorted({target.get("wave", 1) for target in deployment_targets}):
+                codepipeline_cfn_deploy_actions = []
+                for deployment_target in [target for target in deployment_targets if target.get("wave", 1) == wave]:
+                    cross_account_role = None
+                    if self._is_cross_account_target(deployment_target):
+                        # The role of the target account is assumed by the pipeline and passed to CloudFormation
+                        cross_account_role = iam.Role.from_role_arn(
+                            self,
+                            f"DeployRole{deployment_target['account']}{deployment_target['region']}",
+                            deployment_target["role_arn"],
+                            mutable=False,
+                        )
+                    for target_name, template_path, stack_name, layer in deploy_templates:
+                        codepipeline_cfn_deploy_actions.extend(self._generate_cfn_deploy_actions(
+                            application_name=application_name,
+                            target_name=target_name,
+                            template_path=template_path,
+                            stack_name=stack_name,
+                            layer=layer,
+                            deploy_mode=deploy_mode,
+                            role=cross_account_role or cast(iam.IRole, codepipeline_cfn_deploy_action_role),
+                            deployment_role=cross_account_role,
+                            action_suffix=f"-{self._deployment_target_label(deployment_target)}",
+                            account=deployment_target.get("account"),
+                            region=deployment_target["region"],
+                        ))
+
+                codepipeline_project.add_stage(
+                    stage_name=f"CfnDeployWave{wave}",
+                    actions=codepipeline_cfn_deploy_actions,
+                )
+        else:
+            # The stacks of the build targets are deployed in parallel
+            codepipeline_cfn_deploy_actions = []
+            for target_name, template_path, stack_name, layer in deploy_templates:
+                codepipeline_cfn_deploy_actions.extend(self._generate_cfn_deploy_actions(
+                    application_name=application_name,
+                    target_name=target_name,
+                    template_path=template_path,
+                    stack_name=stack_name,
+                    layer=layer,
+                    deploy_mode=deploy_mode,
+                    role=cast(iam.IRole, codepipeline_cfn_deploy_action_role),
+                ))
+
+            cfn_deploy_conditions = None
+            if template_hash_check_action is not None and template_hash_parameter is not None:
+                # The hash is recorded after every stack is deployed
+                codepipeline_cfn_deploy_actions.append(codepipeline_actions.CommandsAction(
+                    action_name="RecordTemplateHash",
+                    commands=[
+                        f"aws ssm put-parameter --name {template_hash_parameter.parameter_name} "
+                        f"--value {template_hash_check_action.variable('TEMPLATE_HASH')} --overwrite"
+                    ],
+                    input=deploy_templates[0][1].artifact,
+                    run_order=max(action.action_properties.run_order or 1 for action in codepipeline_cfn_deploy_actions) + 1,
+                    role=template_hash_action_role,
+                ))
+                # The stage is entered only if the rule succeeds, and skipped if the templates are unchanged
+                cfn_deploy_conditions = codepipeline.Conditions(
+                    conditions=[
+                        codepipeline.Condition(
+                            result=codepipeline.Result.SKIP,
+                            rules=[
+                                codepipeline.Rule(
+                                    name="TemplateChanged",
+                                    provider="VariableCheck",
+                                    configuration={
+                                        "Variable": template_hash_check_action.variable("TEMPLATE_CHANGED"),
+                                        "Value": "true",
+                                        "Operator": "EQ",
+                                    },
+                                )
+                            ],
+                        )
+                    ]
+                )
+
+            codepipeline_project.add_stage(
+                stage_name="CfnDeploy",
+                actions=codepipeline_cfn_deploy_actions,
+                before_entry=cfn_deploy_conditions,
+            )
+            if perf_gate_project is not None:
+                # A skipped deploy changes nothing to test, so the gate is skipped with it
+                codepipeline_project.add_stage(
+                    stage_name="PerfGate",
+                    actions=[self._generate_perf_gate_action(
+                        perf_gate_project=perf_gate_project,
+                        cfn_deploy_actions=codepipeline_cfn_deploy_actions,
+                        role=cast(iam.IRole, perf_gate_action_role),
+                    )],
+                    before_entry=cfn_deploy_conditions,
+                )
+
+        #############################################################
+        # Monitoring
+        #############################################################
+        pipeline_metrics_function = None
+        pipeline_dashboard = None
+        if pipeline_monitoring:
+            pipeline_metrics_function_name = f"{codepipeline_project_name}Metrics"
+            pipeline_metrics_function = lambda_.Function(
+                self,
+                "PipelineMetricsFunction",
+                function_name=pipeline_metrics_function_name,
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                handler="index.handler",
+                code=lambda_.Code.from_asset(PIPELINE_METRICS_FUNCTION_PATH, exclude=["__pycache__"]),
+                timeout=Duration.seconds(30),
+                environment={"METRICS_NAMESPACE": PIPELINE_METRICS_NAMESPACE},
+                role=cast(iam.IRole, self._generate_pipeline_metrics_function_role(
+                    codepipeline_project_name=codepipeline_project_name,
+                    pipeline_metrics_function_name=pipeline_metrics_function_name,
+                )),
+            )
+            # Only the finished executions have durations, so the other states do not invoke the function
+            events.Rule(
+                self,
+                "PipelineStateChangeRule",
+                event_pattern=events.EventPattern(
+                    source=["aws.codepipeline"],
+                    detail_type=[
+                        "CodePipeline Pipeline Execution State Change",
+                        "CodePipeline Stage Execution State Change",
+                        "CodePipeline Action Execution State Change",
+                    ],
+                    detail={
+                        "pipeline": [codepipeline_project_name],
+                        "state": ["SUCCEEDED", "FAILED"],
+                    },
+                ),
+                targets=[events_targets.LambdaFunction(cast(lambda_.IFunction, pipeline_metrics_function))],
+            )
+            pipeline_dashboard = self._generate_pipeline_dashboard(
+                application_name=application_name,
+                codepipeline_project_name=codepipeline_project_name,
+                stage_names=[stage.stage_name for stage in codepipeline_project.stages],
+            )
+
+        self.pipeline = codepipeline_project
+        self.artifact_bucket = artifact_bucket
+        self.application_bucket = application_bucket
+        self.codepipeline_role = codepipeline_role
+        self.codebuild_role = codebuild_role
 
         #############################################################
         # CloudFormation Outputs
         #############################################################
+        # A stack of many pipelines would exceed the CloudFormation quota of 200 outputs
+        if not outputs:
+            return
         CfnOutput(self, "S3ApplicationBucket", value=application_bucket.bucket_name)
         CfnOutput(self, "CodeBuildRoleArn", value=codebuild_role.role_arn)
         CfnOutput(self, "S3PipelineBucket", value=artifact_bucket.bucket_name)
+        if artifact_bucket.encryption_key is not None:
+            # The roles of the deployment targets in other accounts decrypt the artifacts with the key
+            CfnOutput(self, "S3PipelineBucketKeyArn", value=artifact_bucket.encryption_key.key_arn)
         CfnOutput(self, "CodePipelineRoleArn", value=codepipeline_role.role_arn)
         CfnOutput(self, "CFNDeployRoleArn", value=codepipeline_cfn_deploy_action_role.role_arn)
+        if build_fleet is not None:
+            CfnOutput(self, "CodeBuildFleetArn", value=build_fleet.fleet_arn)
+        if build_cache_bucket is not None and build_cache_bucket is not application_bucket:
+            CfnOutput(self, "S3BuildCacheBucket", value=build_cache_bucket.bucket_name)
+        if template_hash_parameter is not None:
+            CfnOutput(self, "DeployedTemplateHashParameter", value=template_hash_parameter.parameter_name)
+        if pipeline_metrics_function is not None and pipeline_dashboard is not None:
+            CfnOutput(self, "PipelineMetricsFunctionArn", value=pipeline_metrics_function.function_arn)
+            CfnOutput(self, "PipelineMetricsNamespace", value=PIPELINE_METRICS_NAMESPACE)
+            CfnOutput(self, "PipelineDashboardName", value=pipeline_dashboard.dashboard_name)
+        if perf_gate_report_group is not None:
+            CfnOutput(self, "PerfGateReportGroupArn", value=perf_gate_report_group.report_group_arn)
+        if test_report_group is not None:
+            CfnOutput(self, "TestReportGroupArn", value=test_report_group.report_group_arn)
+        if package_budget_report_group is not None:
+            CfnOutput(self, "PackageBudgetReportGroupArn", value=package_budget_report_group.report_group_arn)
+
+
+    def _generate_git_push_filters(
+        self,
+        trigger_filters: dict[str, list[str]],
+        branch_name: str,
+    ) -> list[codepipeline.GitPushFilter]:
+        # The branch filter is always included, so tag filters add triggers to the pushes of the branch instead of
+        # replacing them. The branch of the source action is used unless the branches to include are specified.
+        push_filters: list[codepipeline.GitPushFilter] = [codepipeline.GitPushFilter(
+            branches_includes=trigger_filters.get("branches_includes") or [branch_name],
+            branches_excludes=trigger_filters.get("branches_excludes") or None,
+            file_paths_includes=trigger_filters.get("file_paths_includes") or None,
+            file_paths_excludes=trigger_filters.get("file_paths_excludes") or None,
+        )]
+        # A push filter cannot combine tags with branches and file paths, so tags get a filter of their own
+        if trigger_filters.get("tags_includes") or trigger_filters.get("tags_excludes"):
+            push_filters.append(codepipeline.GitPushFilter(
+                tags_includes=trigger_filters.get("tags_includes") or None,
+                tags_excludes=trigger_filters.get("tags_excludes") or None,
+            ))
+        return push_filters
+
+    def _validate_deployment_targets(
+        self,
+        deployment_targets: list[dict[str, Any]],
+    ) -> None:
+        # The keys, accounts and waves are validated with the other options, and these rules depend on the stack env
+        target_labels: list[str] = []
+        for deployment_target in deployment_targets:
+            account = deployment_target.get("account")
+            # Actions in other regions need the replication buckets of support stacks, which need a concrete environment
+            if Token.is_unresolved(Stack.of(self).region) or (account is not None and Token.is_unresolved(Stack.of(self).account)):
+                raise ValueError("deployment_targets requires the account and region of the stack env.")
+            if self._is_cross_account_target(deployment_target) and not deployment_target.get("role_arn"):
+                raise ValueError(f"The deployment target of the account '{account}' requires role_arn.")
+
+            target_label = self._deployment_target_label(deployment_target)
+            if target_label in target_labels:
+                raise ValueError(f"The deployment target '{target_label}' is duplicated.")
+            target_labels.append(target_label)
+
+    def _is_cross_account_target(self, deployment_target: dict[str, Any]) -> bool:
+        account = deployment_target.get("account")
+        return account is not None and account != Stack.of(self).account
+
+    def _deployment_target_label(self, deployment_target: dict[str, Any]) -> str:
+        # The region names the targets of the pipeline account, the account and region those of other accounts
+        if self._is_cross_account_target(deployment_target):
+            return f"{deployment_target['account']}-{deployment_target['region']}"
+        return deployment_target["region"]
+
+    def _generate_cfn_deploy_actions(
+        self,
+        application_name: str,
+        target_name: str,
+        template_path: codepipeline.ArtifactPath,
+        deploy_mode: str,
+        role: iam.IRole,
+        stack_name: str | None = None,
+        layer: int = 0,
+        stage_suffix: str = "",
+        parameter_overrides: dict[str, str] | None = None,
+        deployment_role: iam.IRole | None = None,
+        action_suffix: str = "",
+        account: str | None = None,
+        region: str | None = None,
+    ) -> list[codepipeline.IAction]:
+        # The stage suffix names the stacks and artifacts of each promotion stage apart,
+        # and the action suffix the actions and artifacts of each deployment target of a wave
+        if stack_name:
+            stack_name = f"{stack_name}{stage_suffix}"
+        else:
+            stack_name = f"{application_name}{target_name}{stage_suffix or 'Beta'}Stack"
+        change_set_name = f"{application_name}{target_name}{stage_suffix}ChangeSet"
+        output = codepipeline.Artifact(f"AppDeploymentValues{target_name}{stage_suffix}{action_suffix}")
+        if deploy_mode == "direct":
+            # Creates or updates the stack in one action without computing a change set to review
+            return [
+                codepipeline_actions.CloudFormationCreateUpdateStackAction(
+                    action_name=f"CreateUpdateStack{target_name}{action_suffix}",
+                    stack_name=stack_name,
+                    admin_permissions=True,
+                    template_path=template_path,
+                    # The stacks of a layer depend only on the stacks of earlier layers
+                    run_order=layer + 1,
+                    role=role,
+                    deployment_role=deployment_role or self._generate_cfn_deployment_role(),
+                    account=account,
+                    region=region,
+                    cfn_capabilities=[
+                        CfnCapabilities.ANONYMOUS_IAM
+                    ],
+                    parameter_overrides=parameter_overrides,
+                    # The stack outputs are written only when the output file name is set
+                    output=output,
+                    output_file_name="outputs.json",
+                )
+            ]
+
+        return [
+            codepipeline_actions.CloudFormationCreateReplaceChangeSetAction(
+                action_name=f"CreateReplaceChangeSet{target_name}{action_suffix}",
+                stack_name=stack_name,
+                change_set_name=change_set_name,
+                admin_permissions=True,
+                template_path=template_path,
+                # Each layer creates and then executes its change sets before the next layer starts
+                run_order=layer * 2 + 1,
+                role=role,
+                deployment_role=deployment_role or self._generate_cfn_deployment_role(),
+                account=account,
+                region=region,
+                cfn_capabilities=[
+                    CfnCapabilities.ANONYMOUS_IAM
+                ],
+                parameter_overrides=parameter_overrides,
+            ),
+            codepipeline_actions.CloudFormationExecuteChangeSetAction(
+                action_name=f"ExecuteChangeSet{target_name}{action_suffix}",
+                stack_name=stack_name,
+                change_set_name=change_set_name,
+                run_order=layer * 2 + 2,
+                output=output,
+                output_file_name="outputs.json",
+                # The action role is generated unless the action is in another account or region or the roles are shared
+                role=role if account or region or self._role_set is not None else None,
+                account=account,
+                region=region,
+            ),
+        ]
+
+    def _generate_template_hash_check_action(
+        self,
+        template_paths: list[codepipeline.ArtifactPath],
+        template_hash_parameter: ssm.StringParameter,
+        role: iam.IRole,
+    ) -> codepipeline_actions.CommandsAction:
+        # The first artifact is the primary input in the working directory,
+        # and the others are extra inputs in the CODEBUILD_SRC_DIR_<artifact name> directories
+        artifacts: list[codepipeline.Artifact] = []
+        for template_path in template_paths:
+            if template_path.artifact.artifact_name not in [artifact.artifact_name for artifact in artifacts]:
+                artifacts.append(template_path.artifact)
+        template_files = " ".join(
+            template_path.file_name if template_path.artifact.artifact_name == artifacts[0].artifact_name
+            else f"$CODEBUILD_SRC_DIR_{template_path.artifact.artifact_name}/{template_path.file_name}"
+            for template_path in template_paths
+        )
+        return codepipeline_actions.CommandsAction(
+            action_name="TemplateHash",
+            # sam package uploads the code by content hash, so the packaged templates change whenever the code does
+            commands=[
+                f"TEMPLATE_HASH=$(cat {template_files} | sha256sum | cut -d ' ' -f 1)",
+                f"DEPLOYED_HASH=$(aws ssm get-parameter --name {template_hash_parameter.parameter_name} "
+                "--query Parameter.Value --output text)",
+                'if [ "$TEMPLATE_HASH" = "$DEPLOYED_HASH" ]; then TEMPLATE_CHANGED=false; else TEMPLATE_CHANGED=true; fi',
+                'echo "Template hash $TEMPLATE_HASH, deployed $DEPLOYED_HASH, changed $TEMPLATE_CHANGED"',
+            ],
+            input=artifacts[0],
+            extra_inputs=artifacts[1:] or None,
+            output_variables=["TEMPLATE_HASH", "TEMPLATE_CHANGED"],
+            variables_namespace="TemplateHash",
+            run_order=2,
+            role=role,
+        )
+
+    def _generate_build_reuse_build_spec(self, buildspec: str) -> codebuild.BuildSpec:
+        # The outputs are restored before the phase commands of the application buildspec,
+        # which run in the phases of the same name only if BUILD_REUSE_RESTORED is not true
+        build_reuse_script = f"python3 {BUILD_REUSE_WORK_DIR}/build_reuse.py"
+        return codebuild.BuildSpec.from_object({
+            "version": "0.2",
+            "phases": {
+                "install": {
+                    "commands": ["pip3 install --quiet PyYAML"],
+                },
+                "pre_build": {
+                    "commands": [
+                        f"mkdir -p {BUILD_REUSE_WORK_DIR}",
+                        *self._generate_inline_script_commands(
+                            BUILD_REUSE_SCRIPT_PATH, f"{BUILD_REUSE_WORK_DIR}/build_reuse.py"
+                        ),
+                        f"{build_reuse_script} restore",
+                        f"export BUILD_REUSE_RESTORED=$(cat {BUILD_REUSE_WORK_DIR}/restored)",
+                    ],
+                },
+                "build": {
+                    "commands": [f"{build_reuse_script} build {buildspec}"],
+                },
+                "post_build": {
+                    "commands": [f"{build_reuse_script} post_build {buildspec}"],
+                },
+            },
+            "artifacts": {
+                "base-directory": f"{BUILD_REUSE_WORK_DIR}/output",
+                "files": ["**/*"],
+            },
+        })
+
+    def _generate_build_config_hash(self, **build_settings: Any) -> str:
+        # Builds of the same commit with the same settings produce the same outputs
+        build_config = json.dumps(build_settings, sort_keys=True)
+        return hashlib.sha256(build_config.encode("utf-8")).hexdigest()[:16]
+
+    def _generate_inline_script_commands(self, script_path: str, file_name: str) -> list[str]:
+        # The script is base64 encoded, so no character of it is interpreted by the buildspec YAML or the shell
+        encoded_script = base64.b64encode(Path(script_path).read_bytes()).decode("ascii")
+        return [f"echo {encoded_script} | base64 -d > {file_name}"]
+
+    def _generate_perf_gate_action(
+        self,
+        perf_gate_project: codebuild.PipelineProject,
+        cfn_deploy_actions: list[codepipeline.IAction],
+        role: iam.IRole,
+    ) -> codepipeline_actions.CodeBuildAction:
+        # The stack outputs of every deployed stack are inputs, and the load test reads the URL from them
+        deployment_values = [
+            output
+            for action in cfn_deploy_actions
+            for output in action.action_properties.outputs or []
+            if (output.artifact_name or "").startswith("AppDeploymentValues")
+        ]
+        if len(deployment_values) > CODEBUILD_MAX_INPUT_ARTIFACTS:
+            raise ValueError(
+                f"perf_gate supports up to {CODEBUILD_MAX_INPUT_ARTIFACTS} deployed stacks, not {len(deployment_values)}."
+            )
+        return codepipeline_actions.CodeBuildAction(
+            action_name="LoadTest",
+            project=cast(codebuild.IProject, perf_gate_project),
+            input=deployment_values[0],
+            extra_inputs=deployment_values[1:] or None,
+            role=role,
+        )
+
+    def _generate_package_budget_action(
+        self,
+        package_budget_project: codebuild.PipelineProject,
+        template_paths: list[codepipeline.ArtifactPath],
+        role: iam.IRole,
+    ) -> codepipeline_actions.CodeBuildAction:
+        # The build artifacts of every packaged template are inputs, and the analyzer looks up the templates in each
+        artifacts: list[codepipeline.Artifact] = []
+        for template_path in template_paths:
+            if template_path.artifact.artifact_name not in [artifact.artifact_name for artifact in artifacts]:
+                artifacts.append(template_path.artifact)
+        if len(artifacts) > CODEBUILD_MAX_INPUT_ARTIFACTS:
+            raise ValueError(
+                f"package_budget supports up to {CODEBUILD_MAX_INPUT_ARTIFACTS} build artifacts, not {len(artifacts)}."
+            )
+        return codepipeline_actions.CodeBuildAction(
+            action_name="PackageBudget",
+            project=cast(codebuild.IProject, package_budget_project),
+            input=artifacts[0],
+            extra_inputs=artifacts[1:] or None,
+            environment_variables={
+                "PACKAGE_BUDGET_TEMPLATES": codebuild.BuildEnvironmentVariable(
+                    value=" ".join(dict.fromkeys(template_path.file_name for template_path in template_paths))
+                ),
+            },
+            # The budget is checked once the build outputs exist, and a failure stops the pipeline before the deploy
+            run_order=2,
+            role=role,
+        )
+
+    def _generate_pipeline_dashboard(
+        self,
+        application_name: str,
+        codepipeline_project_name: str,
+        stage_names: list[str],
+    ) -> cloudwatch.Dashboard:
+        def pipeline_metric(metric_name: str, statistic: str, **dimensions: str) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                namespace=PIPELINE_METRICS_NAMESPACE,
+                metric_name=metric_name,
+                dimensions_map={"PipelineName": codepipeline_project_name, **dimensions},
+                statistic=statistic,
+                period=Duration.hours(1),
+                label=f"{dimensions.get('StageName', metric_name)} {statistic}",
+            )
+
+        dashboard = cloudwatch.Dashboard(
+            self,
+            "PipelineDashboard",
+            dashboard_name=f"{application_name}PipelineDashboard",
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Pipeline duration (seconds)",
+                left=[pipeline_metric("PipelineDuration", "p50"), pipeline_metric("PipelineDuration", "p95")],
+            ),
+            cloudwatch.GraphWidget(
+                title="Queue time (seconds)",
+                left=[pipeline_metric("QueueTime", "p50"), pipeline_metric("QueueTime", "p95")],
+            ),
+            cloudwatch.GraphWidget(
+                title="Success rate (%)",
+                left=[cloudwatch.MathExpression(
+                    expression="100 * succeeded",
+                    using_metrics={"succeeded": pipeline_metric("PipelineSucceeded", "Average")},
+                    label="Success rate",
+                    period=Duration.hours(1),
+                )],
+                left_y_axis=cloudwatch.YAxisProps(min=0, max=100),
+            ),
+        )
+        dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Stage duration p95 (seconds)",
+                left=[pipeline_metric("StageDuration", "p95", StageName=stage_name) for stage_name in stage_names],
+                width=24,
+            ),
+        )
+
+        # The p95 duration of each stage raises an alarm when it rises above the band of its usual values.
+        # The source stage and the manual approvals are not alarmed, because their durations are not build or deploy time.
+        for stage_name in stage_names:
+            if stage_name == "Source" or stage_name.startswith("Approval"):
+                continue
+            cloudwatch.CfnAlarm(
+                self,
+                f"{stage_name}DurationAlarm",
+                alarm_description=f"The p95 duration of the {stage_name} stage of {codepipeline_project_name} regressed.",
+                comparison_operator="GreaterThanUpperThreshold",
+                evaluation_periods=3,
+                datapoints_to_alarm=2,
+                threshold_metric_id="band",
+                treat_missing_data="notBreaching",
+                metrics=[
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="duration",
+                        metric_stat=cloudwatch.CfnAlarm.MetricStatProperty(
+                            metric=cloudwatch.CfnAlarm.MetricProperty(
+                                namespace=PIPELINE_METRICS_NAMESPACE,
+                                metric_name="StageDuration",
+                                dimensions=[
+                                    cloudwatch.CfnAlarm.DimensionProperty(name="PipelineName", value=codepipeline_project_name),
+                                    cloudwatch.CfnAlarm.DimensionProperty(name="StageName", value=stage_name),
+                                ],
+                            ),
+                            period=3600,
+                            stat="p95",
+                        ),
+                        return_data=True,
+                    ),
+                    cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                        id="band",
+                        expression=f"ANOMALY_DETECTION_BAND(duration, {PIPELINE_DURATION_ANOMALY_BAND_WIDTH})",
+                        return_data=True,
+                    ),
+                ],
+            )
+        return dashboard
+
+    @staticmethod
+    def _generate_artifact_bucket(
+        scope: Construct,
+        artifact_bucket_kms: bool,
+        artifact_bucket_lifecycle: dict[str, int],
+    ) -> s3.Bucket:
+        return s3.Bucket(
+            scope,
+            "ArtifactBucketStore",
+            versioned=True,
+            encryption_key=kms.Key(scope, "ArtifactBucketKey", enable_key_rotation=True) if artifact_bucket_kms else None,
+            # A bucket key encrypts the objects with data keys of the bucket instead of a KMS request per object
+            bucket_key_enabled=True if artifact_bucket_kms else None,
+            # Every execution writes new artifacts, and the versioning keeps the replaced ones
+            lifecycle_rules=ServerlessPipeline._generate_bucket_lifecycle_rules(
+                bucket_lifecycle=artifact_bucket_lifecycle,
+            ) or None,
+        )
+
+    @staticmethod
+    def _generate_bucket_lifecycle_rules(
+        bucket_lifecycle: dict[str, int],
+    ) -> list[s3.LifecycleRule]:
+        if not bucket_lifecycle:
+            return []
+
+        def days(key: str) -> Duration | None:
+            return Duration.days(bucket_lifecycle[key]) if key in bucket_lifecycle else None
+
+        return [
+            s3.LifecycleRule(
+                abort_incomplete_multipart_upload_after=days("abort_multipart_days"),
+                noncurrent_version_expiration=days("noncurrent_expiration_days"),
+                expiration=days("expiration_days"),
+                transitions=[
+                    s3.Transition(
+                        storage_class=s3.StorageClass.INTELLIGENT_TIERING,
+                        transition_after=cast(Duration, days("intelligent_tiering_days")),
+                    )
+                ] if "intelligent_tiering_days" in bucket_lifecycle else None,
+            )
+        ]
+
+    def _generate_codebuild_cache(
+        self,
+        build_cache_mode: str,
+        build_cache_bucket: s3.Bucket | None,
+        build_privileged: bool = False,
+    ) -> codebuild.Cache:
+        if build_cache_mode == "none":
+            return codebuild.Cache.none()
+        if build_cache_mode == "local":
+            # Docker layer caching requires the build to run in privileged mode, so it is cached only if opted in.
+            return codebuild.Cache.local(
+                codebuild.LocalCacheMode.SOURCE,
+                codebuild.LocalCacheMode.CUSTOM,
+                *([codebuild.LocalCacheMode.DOCKER_LAYER] if build_privileged else []),
+            )
+        # The cache grants the project role access to the bucket
+        return codebuild.Cache.bucket(
+            cast(s3.IBucket, build_cache_bucket),
+            prefix=BUILD_CACHE_PREFIX,
+        )
+
+    def _generate_role(
+        self,
+        role_id: str,
+        assumed_by: iam.IPrincipal,
+        policy_name: str,
+        statements: list[iam.PolicyStatement],
+    ) -> iam.Role:
+        if self._shared_resources is not None and self._role_set is not None:
+            return self._shared_resources.role(self._role_set, role_id, assumed_by, policy_name, statements)
+        return iam.Role(
+            self,
+            role_id,
+            assumed_by=assumed_by,
+            inline_policies={
+                policy_name: iam.PolicyDocument(
+                    statements=statements
+                )
+            },
+        )
 
+    def _generate_shared_action_role(self, role_id: str, assumed_by: iam.IPrincipal) -> iam.IRole | None:
+        # CDK generates a role for each action without one, so a role is passed only when the roles are shared.
+        # The actions add the statements they need to the default policy of the role.
+        if self._shared_resources is None or self._role_set is None:
+            return None
+        return cast(iam.IRole, self._shared_resources.role(self._role_set, role_id, assumed_by))
+
+    def _generate_cfn_deployment_role(self) -> iam.IRole | None:
+        if self._role_set is None:
+            return None
+        # The deploy actions grant admin permissions only to the deployment roles they generate
+        return self._generate_role(
+            role_id="CfnDeploymentRole",
+            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("cloudformation.amazonaws.com")),
+            policy_name="DeploymentAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=["*"],
+                    resources=["*"],
+                )
+            ],
+        )
 
     def _generate_codebuild_role(
         self,
         codebuild_project_name: str,
-        application_bucket: s3.Bucket
+        application_bucket: s3.Bucket,
+        build_reuse: bool = False,
     ) -> iam.Role:
+        codebuild_policy_statements = [
+            iam.PolicyStatement(
+                actions=[
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                ],
+                resources=[
+                    f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/codebuild/{codebuild_project_name}*"
+                ],
+            ),
+            iam.PolicyStatement(
+                actions=[
+                    "s3:GetObject",
+                    "s3:GetObjectVersion",
+                    "s3:PutObject"
+                ],
+                resources=[
+                    f"arn:aws:s3:::{application_bucket.bucket_name}/*"
+                ],
+            ),
+        ]
+        if build_reuse:
+            # Listing the prefix tells a missing build output apart from a denied one
+            codebuild_policy_statements.append(
+                iam.PolicyStatement(
+                    actions=[
+                        "s3:ListBucket",
+                    ],
+                    resources=[
+                        f"arn:aws:s3:::{application_bucket.bucket_name}"
+                    ],
+                    conditions={
+                        "StringLike": {"s3:prefix": [f"{BUILD_REUSE_PREFIX}/*"]}
+                    },
+                ),
+            )
+
+        codebuild_principal = cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com"))
+        if self._role_set is not None:
+            return self._generate_role(
+                role_id="CodeBuildRole",
+                assumed_by=codebuild_principal,
+                policy_name="CodeBuildPolicy",
+                statements=codebuild_policy_statements,
+            )
         codebuild_role = iam.Role(
             self,
             "CodeBuildRole",
-            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com")),
+            assumed_by=codebuild_principal,
         )
-        codebuild_policy = iam.Policy(
+        iam.Policy(
             self,
             "CodeBuildPolicy",
             policy_name="CodeBuildPolicy",
+            statements=codebuild_policy_statements,
+        ).attach_to_role(cast(iam.IRole, codebuild_role))
+
+        return codebuild_role
+
+    def _generate_perf_gate_role(
+        self,
+        perf_gate_project_name: str,
+        perf_gate_report_group: codebuild.ReportGroup,
+    ) -> iam.Role:
+        return self._generate_role(
+            role_id="PerfGateRole",
+            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com")),
+            policy_name="PerfGateAccess",
             statements=[
                 iam.PolicyStatement(
                     actions=[
@@ -257,24 +1677,118 @@ class AwsCdkServerlessPipelineStack(Stack):
                         "logs:PutLogEvents"
                     ],
                     resources=[
-                        f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/codebuild/{codebuild_project_name}*"
+                        f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/codebuild/{perf_gate_project_name}*"
                     ],
                 ),
+                iam.PolicyStatement(
+                    actions=[
+                        "codebuild:CreateReport",
+                        "codebuild:UpdateReport",
+                        "codebuild:BatchPutTestCases",
+                    ],
+                    resources=[
+                        perf_gate_report_group.report_group_arn
+                    ],
+                ),
+            ],
+        )
+
+    def _generate_package_budget_role(
+        self,
+        package_budget_project_name: str,
+        package_budget_report_group: codebuild.ReportGroup,
+        application_bucket: s3.Bucket,
+    ) -> iam.Role:
+        return self._generate_role(
+            role_id="PackageBudgetRole",
+            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com")),
+            policy_name="PackageBudgetAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogGroup",
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents"
+                    ],
+                    resources=[
+                        f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/codebuild/{package_budget_project_name}*"
+                    ],
+                ),
+                iam.PolicyStatement(
+                    actions=[
+                        "codebuild:CreateReport",
+                        "codebuild:UpdateReport",
+                        "codebuild:BatchPutTestCases",
+                    ],
+                    resources=[
+                        package_budget_report_group.report_group_arn
+                    ],
+                ),
+                # The zipped sizes of the packages uploaded by sam package
                 iam.PolicyStatement(
                     actions=[
                         "s3:GetObject",
-                        "s3:GetObjectVersion",
-                        "s3:PutObject"
                     ],
                     resources=[
-                        f"arn:aws:s3:::{application_bucket.bucket_name}/*"
+                        application_bucket.arn_for_objects("*")
+                    ],
+                ),
+                # The sizes of the layers of other templates
+                iam.PolicyStatement(
+                    actions=[
+                        "lambda:GetLayerVersion",
+                    ],
+                    resources=[
+                        "arn:aws:lambda:*:*:layer:*:*"
                     ],
                 ),
             ],
         )
-        codebuild_policy.attach_to_role(cast(iam.IRole, codebuild_role))
 
-        return codebuild_role
+    def _generate_test_role(
+        self,
+        test_project_name: str,
+        test_report_group: codebuild.ReportGroup,
+    ) -> iam.Role:
+        return self._generate_role(
+            role_id="TestRole",
+            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com")),
+            policy_name="TestAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogGroup",
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents"
+                    ],
+                    resources=[
+                        f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/codebuild/{test_project_name}*"
+                    ],
+                ),
+                iam.PolicyStatement(
+                    actions=[
+                        "codebuild:CreateReport",
+                        "codebuild:UpdateReport",
+                        "codebuild:BatchPutTestCases",
+                        # The shard planner reads the test durations of the earlier reports
+                        "codebuild:ListReportsForReportGroup",
+                        "codebuild:BatchGetReports",
+                        "codebuild:DescribeTestCases",
+                    ],
+                    resources=[
+                        test_report_group.report_group_arn
+                    ],
+                ),
+                iam.PolicyStatement(
+                    actions=[
+                        "codebuild:BatchGetBuilds",
+                    ],
+                    resources=[
+                        f"arn:aws:codebuild:{Stack.of(self).region}:{Stack.of(self).account}:project/{test_project_name}"
+                    ],
+                ),
+            ],
+        )
 
     def _generate_codepipeline_role(
         self,
@@ -302,7 +1816,7 @@ class AwsCdkServerlessPipelineStack(Stack):
                     "cloudwatch:*"
                 ],
                 resources=[
-                    f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/codepipeline/{codepipeline_project_name}*"
+                    f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/codepipeline/{codepipeline_project_name}*"
                 ],
             ),
             iam.PolicyStatement(
@@ -311,7 +1825,7 @@ class AwsCdkServerlessPipelineStack(Stack):
                     "lambda:ListFunctions"
                 ],
                 resources=[
-                    f"arn:aws:lambda:{self.region}:{self.account}:function:{repository_name}*"
+                    f"arn:aws:lambda:{Stack.of(self).region}:{Stack.of(self).account}:function:{repository_name}*"
                 ],
             ),
             iam.PolicyStatement(
@@ -322,15 +1836,11 @@ class AwsCdkServerlessPipelineStack(Stack):
             )
         ]
 
-        return iam.Role(
-            self,
-            "CodePipelineRole",
+        return self._generate_role(
+            role_id="CodePipelineRole",
             assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("codepipeline.amazonaws.com")),
-            inline_policies={
-                "DefaultPolicy": iam.PolicyDocument(
-                    statements=code_pipeline_policy_statments
-                )
-            },
+            policy_name="DefaultPolicy",
+            statements=code_pipeline_policy_statments,
         )
 
     def _generate_codepipeline_source_action_role(
@@ -338,94 +1848,362 @@ class AwsCdkServerlessPipelineStack(Stack):
         codepipeline_role: iam.IRole,
         repository_name: str
     ) -> iam.Role:
-        return iam.Role(
-            self,
-            "SourceActionRole",
+        return self._generate_role(
+            role_id="SourceActionRole",
             assumed_by=cast(iam.IPrincipal, iam.CompositePrincipal(
                 cast(iam.IPrincipal, iam.ServicePrincipal("codepipeline.amazonaws.com")),
                 cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn))),
             ),
-            inline_policies={
-                "SourceAccess": iam.PolicyDocument(
-                    statements=[
-                        iam.PolicyStatement(
-                            actions=[
-                                "codecommit:GetBranch",
-                                "codecommit:GetCommit",
-                                "codecommit:UploadArchive",
-                                "codecommit:GetUploadArchiveStatus",
-                                "codecommit:CancelUploadArchive",
-                            ],
-                            resources=[
-                                f"arn:aws:codecommit:{self.region}:{self.account}:{repository_name}"
-                            ],
-                        )
-                    ]
+            policy_name="SourceAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "codecommit:GetBranch",
+                        "codecommit:GetCommit",
+                        "codecommit:UploadArchive",
+                        "codecommit:GetUploadArchiveStatus",
+                        "codecommit:CancelUploadArchive",
+                    ],
+                    resources=[
+                        f"arn:aws:codecommit:{Stack.of(self).region}:{Stack.of(self).account}:{repository_name}"
+                    ],
                 )
-            },
+            ],
         )
 
     def _generate_codepipeline_build_action_role(
         self,
         codepipeline_role: iam.IRole,
-        codebuild_project_name: str
+        codebuild_project_names: list[str],
+        batch_build: bool = False,
+        role_id: str = "BuildActionRole",
     ) -> iam.Role:
-        return iam.Role(
-            self,
-            "BuildActionRole",
+        actions = [
+            "codebuild:BatchGetBuilds",
+            "codebuild:StartBuild",
+        ]
+        if batch_build:
+            actions = [
+                "codebuild:BatchGetBuildBatches",
+                "codebuild:StartBuildBatch",
+            ]
+        return self._generate_role(
+            role_id=role_id,
             assumed_by=cast(iam.IPrincipal, iam.CompositePrincipal(
                 cast(iam.IPrincipal, iam.ServicePrincipal("codebuild.amazonaws.com")),
                 cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn))),
             ),
-            inline_policies={
-                "BuildAccess": iam.PolicyDocument(
-                    statements=[
-                        iam.PolicyStatement(
-                            actions=[
-                                "codebuild:BatchGetBuilds",
-                                "codebuild:StartBuild",
-                            ],
-                            resources=[
-                                f"arn:aws:codebuild:{self.region}:{self.account}:project/{codebuild_project_name}"
-                            ],
-                        )
-                    ]
+            policy_name="BuildAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=actions,
+                    resources=[
+                        f"arn:aws:codebuild:{Stack.of(self).region}:{Stack.of(self).account}:project/{codebuild_project_name}"
+                        for codebuild_project_name in codebuild_project_names
+                    ],
                 )
-            },
+            ],
+        )
+
+    def _generate_codepipeline_template_hash_action_role(
+        self,
+        codepipeline_role: iam.IRole,
+        template_hash_parameter: ssm.StringParameter,
+    ) -> iam.Role:
+        return self._generate_role(
+            role_id="TemplateHashActionRole",
+            assumed_by=cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn)),
+            policy_name="TemplateHashAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "ssm:GetParameter",
+                        "ssm:PutParameter",
+                    ],
+                    resources=[
+                        template_hash_parameter.parameter_arn
+                    ],
+                )
+            ],
+        )
+
+    def _generate_pipeline_metrics_function_role(
+        self,
+        codepipeline_project_name: str,
+        pipeline_metrics_function_name: str,
+    ) -> iam.Role:
+        return self._generate_role(
+            role_id="PipelineMetricsFunctionRole",
+            assumed_by=cast(iam.IPrincipal, iam.ServicePrincipal("lambda.amazonaws.com")),
+            policy_name="PipelineMetricsAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogGroup",
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents"
+                    ],
+                    resources=[
+                        f"arn:aws:logs:{Stack.of(self).region}:{Stack.of(self).account}:log-group:/aws/lambda/{pipeline_metrics_function_name}*"
+                    ],
+                ),
+                iam.PolicyStatement(
+                    actions=[
+                        "codepipeline:GetPipelineExecution",
+                        "codepipeline:ListActionExecutions",
+                    ],
+                    resources=[
+                        f"arn:aws:codepipeline:{Stack.of(self).region}:{Stack.of(self).account}:{codepipeline_project_name}"
+                    ],
+                ),
+            ],
         )
 
     def _generate_codepipeline_cfn_deploy_action_role(
             self,
             codepipeline_role: iam.IRole,
+            deploy_stack_arns: list[str] | None = None,
         ) -> iam.Role:
-        return iam.Role(
-            self,
-            "CFNDeployRole",
+        return self._generate_role(
+            role_id="CFNDeployRole",
             assumed_by=cast(iam.IPrincipal, iam.CompositePrincipal(
                 cast(iam.IPrincipal, iam.ServicePrincipal("cloudformation.amazonaws.com")),
                 cast(iam.IPrincipal, iam.ArnPrincipal(codepipeline_role.role_arn))),
             ),
-            inline_policies={
-                "DeployAccess": iam.PolicyDocument(
-                    statements=[
-                        iam.PolicyStatement(
-                            actions=[
-                                "cloudformation:CreateStack",
-                                "cloudformation:DeleteStack",
-                                "cloudformation:DescribeStacks",
-                                "cloudformation:UpdateStack",
-                                "cloudformation:CreateChangeSet",
-                                "cloudformation:DeleteChangeSet",
-                                "cloudformation:DescribeChangeSet",
-                                "cloudformation:ExecuteChangeSet",
-                                "cloudformation:SetStackPolicy",
-                                "cloudformation:ValidateTemplate",
-                            ],
-                            resources=[
-                                f"arn:aws:cloudformation:{self.region}:{self.account}:stack/{self.stack_name}*"
-                            ],
-                        )
-                    ]
+            policy_name="DeployAccess",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "cloudformation:CreateStack",
+                        "cloudformation:DeleteStack",
+                        "cloudformation:DescribeStacks",
+                        "cloudformation:UpdateStack",
+                        "cloudformation:CreateChangeSet",
+                        "cloudformation:DeleteChangeSet",
+                        "cloudformation:DescribeChangeSet",
+                        "cloudformation:ExecuteChangeSet",
+                        "cloudformation:SetStackPolicy",
+                        "cloudformation:ValidateTemplate",
+                    ],
+                    resources=[
+                        f"arn:aws:cloudformation:{Stack.of(self).region}:{Stack.of(self).account}:stack/{Stack.of(self).stack_name}*",
+                        *(deploy_stack_arns or []),
+                    ],
                 )
-            },
+            ],
         )
+
+
+class SharedPipelineResources(Construct):
+    """An artifact bucket and pooled roles shared by the ServerlessPipeline constructs of a stack.
+
+    The pipelines are assigned in order to role sets of up to pipelines_per_role_set pipelines. A role of a set is
+    created by the first pipeline using it, and holds the least-privilege statements of the pipelines of the set only.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        *,
+        artifact_bucket_kms: bool = False, # encrypt the artifacts with a customer managed key (required for cross-account targets)
+        artifact_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the artifact bucket (see ARTIFACT_BUCKET_LIFECYCLE_KEYS)
+        share_roles: bool = True, # share the roles of the pipelines in role sets
+        pipelines_per_role_set: int = DEFAULT_PIPELINES_PER_ROLE_SET, # pipelines sharing the roles of a role set
+    ) -> None:
+        super().__init__(scope, construct_id)
+
+        if pipelines_per_role_set < 1:
+            raise ValueError(f"Unsupported pipelines_per_role_set: {pipelines_per_role_set}")
+        validate_bucket_lifecycle("artifact_bucket_lifecycle", artifact_bucket_lifecycle or {}, ARTIFACT_BUCKET_LIFECYCLE_KEYS)
+
+        self.artifact_bucket_kms = artifact_bucket_kms
+        self.artifact_bucket = ServerlessPipeline._generate_artifact_bucket(
+            self,
+            artifact_bucket_kms=artifact_bucket_kms,
+            artifact_bucket_lifecycle=artifact_bucket_lifecycle or {},
+        )
+        self._share_roles = share_roles
+        self._pipelines_per_role_set = pipelines_per_role_set
+        self._pipeline_count = 0
+        self._role_sets: list[Construct] = []
+        # Inline policy of each role of the role sets keyed by the construct path of the role
+        self._policy_documents: dict[str, iam.PolicyDocument] = {}
+
+    def add_pipeline(self) -> Construct | None:
+        """Assign a pipeline to a role set and return the role set, or None if the roles are not shared."""
+        if not self._share_roles:
+            return None
+        if self._pipeline_count % self._pipelines_per_role_set == 0:
+            self._role_sets.append(Construct(self, f"RoleSet{len(self._role_sets) + 1}"))
+        self._pipeline_count += 1
+        return self._role_sets[-1]
+
+    def role(
+        self,
+        role_set: Construct,
+        role_id: str,
+        assumed_by: iam.IPrincipal,
+        policy_name: str | None = None,
+        statements: list[iam.PolicyStatement] | None = None,
+    ) -> iam.Role:
+        """Return the role of the role set with the statements of a pipeline added to its inline policy.
+
+        A role without a policy name has no inline policy, and the actions using it add to its default policy.
+        """
+        role = cast(iam.Role | None, role_set.node.try_find_child(role_id))
+        if role is None:
+            inline_policies = None
+            if policy_name is not None:
+                self._policy_documents[f"{role_set.node.path}/{role_id}"] = iam.PolicyDocument()
+                inline_policies = {policy_name: self._policy_documents[f"{role_set.node.path}/{role_id}"]}
+            role = iam.Role(role_set, role_id, assumed_by=assumed_by, inline_policies=inline_policies)
+        if statements:
+            # The identical statements of the pipelines, such as those of the artifact bucket, are rendered once
+            self._policy_documents[role.node.path].add_statements(*statements)
+        return role
+
+
+class AwsCdkServerlessPipelineStack(Stack):
+    """A stack of a single ServerlessPipeline.
+
+    The pipeline has the construct id "Default", which is left out of the logical ids,
+    so the resources keep the logical ids they had before the pipeline was a construct of its own.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        *,
+        application_name: str,
+        environment: str, # environment name (dev, stg, prd)
+        source_type: str, # source code repository type (github or codecommit)
+        build_cache_mode: str = "none", # codebuild cache mode (none, local or s3)
+        build_cache_dedicated_bucket: bool = False, # use a dedicated bucket for the s3 build cache
+        build_privileged: bool = False, # run the builds in privileged mode for docker (required by the docker layer cache)
+        build_compute_size: str = "small", # codebuild compute size (small, medium, large, xlarge or 2xlarge)
+        build_architecture: str = "x86_64", # codebuild architecture (x86_64 or arm64)
+        build_timeout_minutes: int | None = None, # codebuild timeout in minutes (not supported by lambda compute)
+        build_fleet_capacity: int = 0, # base capacity of the codebuild reserved capacity fleet (0 to disable)
+        build_fleet_overflow: str = "queue", # codebuild fleet overflow behavior (queue or on-demand)
+        build_compute_mode: str = "container", # codebuild compute mode (container or lambda)
+        build_lambda_memory: int = 2048, # memory size (MB) of the codebuild lambda compute
+        build_lambda_runtime: str = "python3.12", # runtime of the codebuild lambda image
+        build_targets: list[dict[str, str]] | None = None, # build targets of a monorepo (name, path and buildspec)
+        build_fan_out: str = "parallel", # fan-out of the build targets (parallel or batch)
+        trigger_filters: dict[str, list[str]] | None = None, # git push filters of the pipeline trigger (github only)
+        execution_mode: str = "QUEUED", # pipeline execution mode (QUEUED, SUPERSEDED or PARALLEL)
+        parameter_defaults: dict[str, str] | None = None, # default values of the cloudformation parameters
+        deploy_mode: str = "changeset", # cfn deploy mode (changeset or direct, direct is dev only)
+        promotion_environments: list[str] | None = None, # environments to promote a single build through (in order)
+        promotion_parameter_name: str = "Environment", # template parameter receiving the environment of a promotion stage
+        deployment_targets: list[dict[str, Any]] | None = None, # accounts and regions to deploy to in waves (account, region, wave and role_arn)
+        deploy_stacks: list[dict[str, Any]] | None = None, # packaged templates to deploy as stacks (name, template_file, stack_name and depends_on)
+        deploy_skip_unchanged: bool = False, # skip the cfn deploy stage when the packaged templates are unchanged
+        build_reuse: bool = False, # reuse the build outputs of the same commit and build configuration
+        build_reuse_retention_days: int = 14, # days to keep the reusable build outputs
+        pipeline_monitoring: bool = False, # publish the pipeline durations with a dashboard and duration alarms
+        artifact_bucket_kms: bool = False, # encrypt the artifacts with a customer managed key (always on for cross-account targets)
+        artifact_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the artifact bucket (see ARTIFACT_BUCKET_LIFECYCLE_KEYS)
+        application_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the application bucket (see APPLICATION_BUCKET_LIFECYCLE_KEYS)
+        perf_gate: bool = False, # run a load test after each deploy and fail on its latency and error rate thresholds
+        perf_gate_settings: dict[str, Any] | None = None, # settings of the load test (see PERF_GATE_DEFAULT_SETTINGS)
+        perf_gate_environments: list[str] | None = None, # promotion environments whose deploys are load tested (default: all)
+        test_shards: int = 0, # parallel test shards of the build stage (0 to disable)
+        test_shard_settings: dict[str, str] | None = None, # settings of the test shards (see TEST_SHARD_DEFAULT_SETTINGS)
+        package_budget: bool = False, # check the code size, layers and memory of the packaged functions after the build
+        package_budget_settings: dict[str, Any] | None = None, # budgets of the packaged functions (see PACKAGE_BUDGET_DEFAULT_SETTINGS)
+        **kwargs: Any, # properties of the stack
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        self.pipeline = ServerlessPipeline(
+            self,
+            "Default",
+            application_name=application_name,
+            environment=environment,
+            source_type=source_type,
+            build_cache_mode=build_cache_mode,
+            build_cache_dedicated_bucket=build_cache_dedicated_bucket,
+            build_privileged=build_privileged,
+            build_compute_size=build_compute_size,
+            build_architecture=build_architecture,
+            build_timeout_minutes=build_timeout_minutes,
+            build_fleet_capacity=build_fleet_capacity,
+            build_fleet_overflow=build_fleet_overflow,
+            build_compute_mode=build_compute_mode,
+            build_lambda_memory=build_lambda_memory,
+            build_lambda_runtime=build_lambda_runtime,
+            build_targets=build_targets,
+            build_fan_out=build_fan_out,
+            trigger_filters=trigger_filters,
+            execution_mode=execution_mode,
+            parameter_defaults=parameter_defaults,
+            deploy_mode=deploy_mode,
+            promotion_environments=promotion_environments,
+            promotion_parameter_name=promotion_parameter_name,
+            deployment_targets=deployment_targets,
+            deploy_stacks=deploy_stacks,
+            deploy_skip_unchanged=deploy_skip_unchanged,
+            build_reuse=build_reuse,
+            build_reuse_retention_days=build_reuse_retention_days,
+            pipeline_monitoring=pipeline_monitoring,
+            artifact_bucket_kms=artifact_bucket_kms,
+            artifact_bucket_lifecycle=artifact_bucket_lifecycle,
+            application_bucket_lifecycle=application_bucket_lifecycle,
+            perf_gate=perf_gate,
+            perf_gate_settings=perf_gate_settings,
+            perf_gate_environments=perf_gate_environments,
+            test_shards=test_shards,
+            test_shard_settings=test_shard_settings,
+            package_budget=package_budget,
+            package_budget_settings=package_budget_settings,
+        )
+
+
+class ServerlessPipelineFleetStack(Stack):
+    """A stack of many ServerlessPipeline constructs, which share an artifact bucket and pooled roles by default.
+
+    Each pipeline takes the keyword arguments of ServerlessPipeline and is named after its application_name.
+    Its parameter_defaults are used as literal values instead of CloudFormation parameters, and it has no outputs,
+    so the stack stays within the CloudFormation quotas of 200 parameters and 200 outputs.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        *,
+        pipelines: list[dict[str, Any]], # keyword arguments of each ServerlessPipeline
+        share_resources: bool = True, # share the artifact bucket of the pipelines
+        share_roles: bool = True, # share the roles of the pipelines in role sets (requires share_resources)
+        pipelines_per_role_set: int = DEFAULT_PIPELINES_PER_ROLE_SET, # pipelines sharing the roles of a role set
+        artifact_bucket_kms: bool = False, # encrypt the shared artifacts with a customer managed key
+        artifact_bucket_lifecycle: dict[str, int] | None = None, # lifecycle of the shared artifact bucket
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        shared_resources = None
+        if share_resources:
+            shared_resources = SharedPipelineResources(
+                self,
+                "SharedResources",
+                artifact_bucket_kms=artifact_bucket_kms,
+                artifact_bucket_lifecycle=artifact_bucket_lifecycle,
+                share_roles=share_roles,
+                pipelines_per_role_set=pipelines_per_role_set,
+            )
+
+        self.pipelines: list[ServerlessPipeline] = []
+        for pipeline_options in pipelines:
+            pipeline_options = dict(pipeline_options)
+            self.pipelines.append(ServerlessPipeline(
+                self,
+                pipeline_options["application_name"],
+                shared_resources=shared_resources,
+                parameter_values=pipeline_options.pop("parameter_defaults", None) or {},
+                outputs=False,
+                **pipeline_options,
+            ))
@@ -0,0 +1,824 @@
+"""Context values of the app and the validation of the pipeline options.
+
+This module does not import aws_cdk, so the context is validated in milliseconds
+before app.py starts the jsii runtime. ServerlessPipeline imports its limits and
+validates its keyword arguments with validate_pipeline_options, so the context
+and the stack share one set of rules.
+"""
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Callable
+
+
+ALLOWED_ENVIRONMENTS = ["dev", "stg", "prd"]
+ALLOWED_SOURCE_TYPES = ["github", "codecommit"]
+ALLOWED_BUILD_CACHE_MODES = ["none", "local", "s3"]
+ALLOWED_BUILD_COMPUTE_SIZES = ["small", "medium", "large", "xlarge", "2xlarge"]
+ALLOWED_BUILD_ARCHITECTURES = ["x86_64", "arm64"]
+# Build compute sizes of the arm64 architecture. On-demand ARM containers run only small and large,
+# a reserved capacity fleet also runs medium and xlarge.
+ALLOWED_ARM64_BUILD_COMPUTE_SIZES = ["small", "large"]
+ALLOWED_ARM64_BUILD_FLEET_COMPUTE_SIZES = ["small", "medium", "large", "xlarge"]
+BUILD_TIMEOUT_MINUTES_RANGE = (5, 2160)
+ALLOWED_BUILD_FLEET_OVERFLOWS = ["queue", "on-demand"]
+ALLOWED_BUILD_COMPUTE_MODES = ["container", "lambda"]
+ALLOWED_BUILD_LAMBDA_MEMORIES = [1024, 2048, 4096, 8192, 10240]
+ALLOWED_BUILD_FAN_OUTS = ["parallel", "batch"]
+ALLOWED_EXECUTION_MODES = ["QUEUED", "SUPERSEDED", "PARALLEL"]
+ALLOWED_BUILD_LAMBDA_RUNTIMES = [
+    "python3.12", "python3.11", "nodejs20", "nodejs18", "java21", "java17", "dotnet8", "go1.21", "ruby3.2"
+]
+# Pattern of the names used in construct ids, stack names and artifact names
+PASCAL_CASE_PATTERN = r'^[A-Z][a-zA-Z0-9]*$'
+# Pattern of the AWS account ids of the deployment targets
+ACCOUNT_ID_PATTERN = r'^[0-9]{12}$'
+
+# Default pipeline execution mode of each environment.
+# dev runs only the newest commit, stg and prd deploy every commit in order.
+DEFAULT_EXECUTION_MODES = {
+    "dev": "SUPERSEDED",
+    "stg": "QUEUED",
+    "prd": "QUEUED",
+}
+
+ALLOWED_DEPLOY_MODES = ["changeset", "direct"]
+# Default deploy mode of each environment.
+# dev deploys the stack directly, stg and prd keep the reviewed change set flow.
+DEFAULT_DEPLOY_MODES = {
+    "dev": "direct",
+    "stg": "changeset",
+    "prd": "changeset",
+}
+
+# Whether each environment skips the CfnDeploy stage by default when the packaged templates are unchanged.
+# stg and prd redeploy every execution, so a stack changed outside the pipeline is restored.
+DEFAULT_DEPLOY_SKIP_UNCHANGED = {
+    "dev": True,
+    "stg": False,
+    "prd": False,
+}
+
+# Whether each environment runs the PerfGate load test after its deploys by default.
+# stg and prd gate the releases on latency and error rate, dev deploys without waiting for a load test.
+DEFAULT_PERF_GATE = {
+    "dev": False,
+    "stg": True,
+    "prd": True,
+}
+
+# Settings of the PerfGate load test and their defaults. A None threshold is reported but not checked.
+PERF_GATE_DEFAULT_SETTINGS: dict[str, Any] = {
+    "url_output": "ApiUrl", # stack output holding the base URL to test
+    "path": "/", # path appended to the base URL
+    "requests": 200,
+    "concurrency": 10,
+    "p95_ms": 1000,
+    "p99_ms": 2000,
+    "max_error_rate": 0.01,
+    "first_request_ms": None, # latency of the first request after the deploy, which includes the cold starts
+}
+# Perf gate settings whose values are numbers. The others are strings.
+PERF_GATE_NUMBER_SETTINGS = ["requests", "concurrency", "p95_ms", "p99_ms", "max_error_rate", "first_request_ms"]
+PERF_GATE_INTEGER_SETTINGS = ["requests", "concurrency"]
+# Input artifacts of a CodeBuild action
+CODEBUILD_MAX_INPUT_ARTIFACTS = 5
+
+# Settings of the test shards and their defaults
+TEST_SHARD_DEFAULT_SETTINGS: dict[str, str] = {
+    "command": "python -m pytest --junitxml=test-report.xml $TEST_SHARD_FILES", # test command of a shard
+    "files": "tests/**/test_*.py", # glob of the test files to split across the shards
+    "report_files": "test-report.xml", # JUnit XML reports of the test command
+}
+# Actions of a stage (the CodePipeline quota of actions per stage)
+MAX_STAGE_ACTIONS = 50
+# Shard actions of the Build stage, which also holds the build actions
+MAX_TEST_SHARDS = MAX_STAGE_ACTIONS
+
+# Budgets of the PackageBudget action and their defaults. A None budget is reported but not checked.
+PACKAGE_BUDGET_DEFAULT_SETTINGS: dict[str, Any] = {
+    "build_dir": ".aws-sam/build", # sam build output next to each packaged template, for the unzipped code sizes
+    "max_code_mb": 50, # unzipped code size of a function, checked only with the build output
+    "max_total_mb": 250, # unzipped code size of a function with its layers (the Lambda quota), checked only with the build output
+    "max_layers": 5, # layers of a function (the Lambda quota)
+    "min_memory_mb": None, # memory size of a function, which sets its CPU and so the duration of its cold starts
+    "max_memory_mb": None,
+}
+# Package budget settings whose values are numbers. The others are strings.
+PACKAGE_BUDGET_NUMBER_SETTINGS = ["max_code_mb", "max_total_mb", "max_layers", "min_memory_mb", "max_memory_mb"]
+PACKAGE_BUDGET_INTEGER_SETTINGS = ["max_layers", "min_memory_mb", "max_memory_mb"]
+
+# Keys of the lifecycle settings of the artifact bucket and the application bucket.
+# The application bucket holds the code of the deployed stacks, so its current objects never expire.
+ARTIFACT_BUCKET_LIFECYCLE_KEYS = [
+    "noncurrent_expiration_days", # days to keep the noncurrent versions of the artifacts
+    "abort_multipart_days", # days to keep the parts of incomplete multipart uploads
+    "intelligent_tiering_days", # days before the objects move to S3 Intelligent-Tiering (0 at once)
+    "expiration_days", # days to keep the artifacts
+]
+APPLICATION_BUCKET_LIFECYCLE_KEYS = [
+    "noncurrent_expiration_days",
+    "abort_multipart_days",
+    "intelligent_tiering_days",
+]
+# Default lifecycles of the buckets. A key set to null in the context removes its default.
+DEFAULT_ARTIFACT_BUCKET_LIFECYCLE = {
+    "noncurrentExpirationDays": 30,
+    "abortMultipartDays": 7,
+}
+DEFAULT_APPLICATION_BUCKET_LIFECYCLE = {
+    "abortMultipartDays": 7,
+}
+
+# Pattern of the CloudFormation parameter names
+PARAMETER_NAME_PATTERN = r'^[a-zA-Z0-9]+$'
+
+# Keys of the build targets, which are all required
+BUILD_TARGET_KEYS = ["name", "path", "buildspec"]
+# Keys of the deployment targets, and those that are required
+DEPLOYMENT_TARGET_KEYS = ["account", "region", "wave", "role_arn"]
+REQUIRED_DEPLOYMENT_TARGET_KEYS = ["region"]
+# Keys of the deploy stacks, and those that are required
+DEPLOY_STACK_KEYS = ["name", "template_file", "stack_name", "depends_on"]
+REQUIRED_DEPLOY_STACK_KEYS = ["name", "template_file"]
+# Keys of the git push filters of the pipeline trigger
+TRIGGER_FILTER_KEYS = [
+    "branches_includes",
+    "branches_excludes",
+    "file_paths_includes",
+    "file_paths_excludes",
+    "tags_includes",
+    "tags_excludes",
+]
+
+# Default CodeBuild compute profile of each environment.
+# Each value can be overridden per application with the buildComputeSize, buildArchitecture
+# and buildTimeoutMinutes contexts.
+BUILD_COMPUTE_PROFILES = {
+    "dev": {"compute_size": "small", "architecture": "x86_64", "timeout_minutes": 60},
+    "stg": {"compute_size": "medium", "architecture": "x86_64", "timeout_minutes": 60},
+    "prd": {"compute_size": "medium", "architecture": "x86_64", "timeout_minutes": 60},
+}
+
+# CloudFormation parameters of the stack whose defaults can be set by the parameters of a manifest entry
+STACK_PARAMETER_NAMES = ["RepositoryName", "BranchName", "TemplateFileName", "GithubOwner", "GithubConnectionArn"]
+
+
+def get_stack_options(get_context: Callable[[str], Any]) -> dict[str, Any]:
+    """Validate the context values and return them as the keyword arguments of AwsCdkServerlessPipelineStack."""
+    # Application name for use as the name of cloudformation stack ,codebuild, and codepipeline
+    # Enter in Pascal case.
+    application_name = get_context("applicationName")
+    # The environment name. Specify one of dev, stg, or prd.
+    # Used as the ENV environment variable in CodeBuild and for handling environment-specific logic in buildspec.yml
+    environment = get_context("environment")
+    # The type of source repository. Specify either github or codecommit.
+    source_type = get_context("sourceType")
+    # The CodeBuild cache mode. Specify one of none, local, or s3. (Optional, default: none)
+    build_cache_mode = get_context("buildCacheMode") or "none"
+    # Store the s3 build cache in a dedicated bucket instead of the application bucket. (Optional, default: false)
+    build_cache_dedicated_bucket = str(get_context("buildCacheDedicatedBucket")).lower() == "true"
+    # Run the builds in privileged mode to build docker images. Required to cache the docker layers with the local build
+    # cache mode. (Optional, default: false)
+    build_privileged = str(get_context("buildPrivileged")).lower() == "true"
+    # The CodeBuild compute size. Specify one of small, medium, large, xlarge, or 2xlarge. (Optional, default: environment profile)
+    build_compute_size = get_context("buildComputeSize")
+    # The CodeBuild architecture. Specify either x86_64 or arm64 (Graviton). (Optional, default: environment profile)
+    build_architecture = get_context("buildArchitecture")
+    # The CodeBuild timeout in minutes. (Optional, default: environment profile)
+    build_timeout_minutes = get_context("buildTimeoutMinutes")
+    # The base capacity of the CodeBuild reserved capacity fleet. 0 runs builds on demand. (Optional, default: 0)
+    build_fleet_capacity = get_context("buildFleetCapacity") or 0
+    # The behavior of builds exceeding the fleet capacity. Specify either queue or on-demand. (Optional, default: queue)
+    build_fleet_overflow = get_context("buildFleetOverflow") or "queue"
+    # The CodeBuild compute mode. Specify either container or lambda. (Optional, default: container)
+    build_compute_mode = get_context("buildComputeMode") or "container"
+    # The memory size (MB) of the CodeBuild lambda compute. Used only if buildComputeMode is lambda. (Optional, default: 2048)
+    build_lambda_memory = get_context("buildLambdaMemory") or 2048
+    # The runtime of the CodeBuild lambda image. Used only if buildComputeMode is lambda. (Optional, default: python3.12)
+    build_lambda_runtime = get_context("buildLambdaRuntime") or "python3.12"
+    # The build targets of a monorepo. A JSON list of {"name", "path", "buildspec"}. (Optional, default: none)
+    build_targets = get_context("buildTargets") or []
+    if isinstance(build_targets, str):
+        build_targets = json.loads(build_targets)
+    # The fan-out of the build targets. Specify either parallel or batch. (Optional, default: parallel)
+    build_fan_out = get_context("buildFanOut") or "parallel"
+    # The git push filters of the pipeline trigger. A JSON object of glob lists. Supported only by the github source type.
+    # (Optional, default: trigger on every push to BranchName)
+    trigger_filters = get_context("triggerFilters") or {}
+    if isinstance(trigger_filters, str):
+        trigger_filters = json.loads(trigger_filters)
+    # The pipeline execution mode. Specify one of QUEUED, SUPERSEDED, or PARALLEL. (Optional, default: environment default)
+    execution_mode = get_context("executionMode")
+    # The deploy mode of the CfnDeploy stage. Specify either changeset or direct. direct is supported only by dev.
+    # (Optional, default: environment default)
+    deploy_mode = get_context("deployMode")
+    # The environments to promote a single build through, in the order dev, stg, prd. A JSON list or a comma separated string.
+    # (Optional, default: deploy only to environment)
+    promotion_environments = get_context("promotionEnvironments") or []
+    if isinstance(promotion_environments, str):
+        promotion_environments = [env.strip() for env in promotion_environments.split(",") if env.strip()]
+    # The template parameter receiving the environment of each promotion stage. (Optional, default: Environment)
+    promotion_parameter_name = get_context("promotionParameterName") or "Environment"
+    # The accounts and regions to deploy to in waves. A JSON list of {"account", "region", "wave", "roleArn"}.
+    # (Optional, default: deploy to the pipeline account and region)
+    deployment_targets = get_context("deploymentTargets") or []
+    if isinstance(deployment_targets, str):
+        deployment_targets = json.loads(deployment_targets)
+    # The packaged templates to deploy as stacks. A JSON list of {"name", "templateFile", "stackName", "dependsOn"}.
+    # (Optional, default: deploy TemplateFileName as a single stack)
+    deploy_stacks = get_context("deployStacks") or []
+    if isinstance(deploy_stacks, str):
+        deploy_stacks = json.loads(deploy_stacks)
+    # Skip the CfnDeploy stage when the packaged templates are the same as the last successful deployment.
+    # (Optional, default: environment default)
+    deploy_skip_unchanged = get_context("deploySkipUnchanged")
+    # Reuse the build outputs stored for the same commit and build configuration. (Optional, default: false)
+    build_reuse = str(get_context("buildReuse")).lower() == "true"
+    # Days to keep the reusable build outputs in the application bucket. (Optional, default: 14)
+    build_reuse_retention_days = get_context("buildReuseRetentionDays") or 14
+    # Publish the stage durations, queue time and success rate of the pipeline with a dashboard and alarms.
+    # (Optional, default: false)
+    pipeline_monitoring = str(get_context("pipelineMonitoring")).lower() == "true"
+    # Run a load test against the stack outputs after each deploy and fail on its latency and error rate thresholds.
+    # (Optional, default: environment default)
+    perf_gate = get_context("perfGate")
+    # The settings of the load test. A JSON object of {"urlOutput", "path", "requests", "concurrency", "p95Ms", "p99Ms",
+    # "maxErrorRate", "firstRequestMs"}. (Optional, default: the ApiUrl output with 200 requests, p95 1000ms, p99 2000ms
+    # and 1% errors)
+    perf_gate_settings = get_context("perfGateSettings") or {}
+    if isinstance(perf_gate_settings, str):
+        perf_gate_settings = json.loads(perf_gate_settings)
+    # The parallel test shards of the Build stage, which run with the build. 0 runs no tests. (Optional, default: 0)
+    test_shards = get_context("testShards") or 0
+    # The settings of the test shards. A JSON object of {"command", "files", "reportFiles"}. (Optional, default:
+    # pytest of the tests/**/test_*.py files of the shard with a test-report.xml JUnit report)
+    test_shard_settings = get_context("testShardSettings") or {}
+    if isinstance(test_shard_settings, str):
+        test_shard_settings = json.loads(test_shard_settings)
+    # Check the code size, layers and memory of the functions of the packaged templates after the build.
+    # (Optional, default: false)
+    package_budget = str(get_context("packageBudget")).lower() == "true"
+    # The budgets of the packaged functions. A JSON object of {"buildDir", "maxCodeMb", "maxTotalMb", "maxLayers",
+    # "minMemoryMb", "maxMemoryMb"}. (Optional, default: 50MB of code, 250MB with the layers and 5 layers per function)
+    package_budget_settings = get_context("packageBudgetSettings") or {}
+    if isinstance(package_budget_settings, str):
+        package_budget_settings = json.loads(package_budget_settings)
+    # Encrypt the pipeline artifacts with a customer managed KMS key and an S3 Bucket Key. (Optional, default: false,
+    # always true for deployment targets in other accounts)
+    artifact_bucket_kms = str(get_context("artifactBucketKms")).lower() == "true"
+    # The lifecycle of the artifact bucket and the application bucket. JSON objects of {"noncurrentExpirationDays",
+    # "abortMultipartDays", "intelligentTieringDays", "expirationDays"} merged over the defaults.
+    # (Optional, default: noncurrent artifacts expire after 30 days, incomplete multipart uploads are aborted after 7 days)
+    bucket_lifecycles = {}
+    for context_key, default_lifecycle in [
+        ("artifactBucketLifecycle", DEFAULT_ARTIFACT_BUCKET_LIFECYCLE),
+        ("applicationBucketLifecycle", DEFAULT_APPLICATION_BUCKET_LIFECYCLE),
+    ]:
+        bucket_lifecycle = get_context(context_key) or {}
+        if isinstance(bucket_lifecycle, str):
+            bucket_lifecycle = json.loads(bucket_lifecycle)
+        bucket_lifecycles[context_key] = {
+            key: value for key, value in {**default_lifecycle, **bucket_lifecycle}.items() if value is not None
+        }
+
+    # Validation context
+    missing_contexts: list[str] = []
+
+    if not application_name:
+        missing_contexts.append("applicationName")
+    if not environment:
+        missing_contexts.append("environment")
+    if not source_type:
+        missing_contexts.append("sourceType")
+
+    if missing_contexts:
+        raise ValueError(
+            f"The following context values are required but missing: {', '.join(missing_contexts)}. "
+            "Please provide them using the '-c <key>=<value>' option."
+        )
+
+    # Resolve the build compute profile of the environment with the context overrides.
+    # An invalid environment has no defaults, and is reported by validate_pipeline_options.
+    build_compute_profile = BUILD_COMPUTE_PROFILES.get(environment, {})
+    build_compute_size = build_compute_size or build_compute_profile.get("compute_size")
+    build_architecture = build_architecture or build_compute_profile.get("architecture")
+    # Lambda compute does not support build timeouts, so the profile timeout is used only for container compute
+    if build_compute_mode == "container":
+        build_timeout_minutes = build_timeout_minutes or build_compute_profile.get("timeout_minutes")
+    execution_mode = execution_mode or DEFAULT_EXECUTION_MODES.get(environment)
+    deploy_mode = deploy_mode or DEFAULT_DEPLOY_MODES.get(environment)
+
+    # The dev default of deploySkipUnchanged is not applied to promotions and deployment targets
+    if deploy_skip_unchanged is None:
+        deploy_skip_unchanged = DEFAULT_DEPLOY_SKIP_UNCHANGED.get(environment, False) and not (
+            promotion_environments or deployment_targets
+        )
+    else:
+        deploy_skip_unchanged = str(deploy_skip_unchanged).lower() == "true"
+
+    # The default of perfGate is that of the environment of each deploy stage, so a promotion runs the gate after stg
+    # and prd only. Deployment targets are not load tested by default.
+    perf_gate_environments = None
+    if perf_gate is None:
+        perf_gate_environments = [] if deployment_targets else [
+            env for env in promotion_environments or [environment] if DEFAULT_PERF_GATE.get(env, False)
+        ]
+        perf_gate = bool(perf_gate_environments)
+    else:
+        perf_gate = str(perf_gate).lower() == "true"
+
+    stack_options = dict(
+        application_name=application_name,
+        environment=environment,
+        source_type=source_type,
+        build_cache_mode=build_cache_mode,
+        build_cache_dedicated_bucket=build_cache_dedicated_bucket,
+        build_privileged=build_privileged,
+        build_compute_size=build_compute_size,
+        build_architecture=build_architecture,
+        build_timeout_minutes=_integer(build_timeout_minutes),
+        build_fleet_capacity=_integer(build_fleet_capacity),
+        build_fleet_overflow=build_fleet_overflow,
+        build_compute_mode=build_compute_mode,
+        build_lambda_memory=_integer(build_lambda_memory),
+        build_lambda_runtime=build_lambda_runtime,
+        build_targets=build_targets,
+        build_fan_out=build_fan_out,
+        trigger_filters=_translate_keys("triggerFilters", trigger_filters, TRIGGER_FILTER_KEYS),
+        execution_mode=execution_mode,
+        deploy_mode=deploy_mode,
+        promotion_environments=promotion_environments,
+        promotion_parameter_name=promotion_parameter_name,
+        deployment_targets=[
+            {
+                key: _integer(value) if key == "wave" else str(value) if key == "account" else value
+                for key, value in _translate_keys("deploymentTargets", deployment_target, DEPLOYMENT_TARGET_KEYS).items()
+            }
+            for deployment_target in deployment_targets
+        ],
+        deploy_stacks=[
+            _translate_keys("deployStacks", deploy_stack, DEPLOY_STACK_KEYS) for deploy_stack in deploy_stacks
+        ],
+        deploy_skip_unchanged=deploy_skip_unchanged,
+        build_reuse=build_reuse,
+        build_reuse_retention_days=_integer(build_reuse_retention_days),
+        pipeline_monitoring=pipeline_monitoring,
+        perf_gate=perf_gate,
+        perf_gate_environments=perf_gate_environments if promotion_environments else None,
+        artifact_bucket_kms=artifact_bucket_kms,
+        artifact_bucket_lifecycle=_translate_keys(
+            "artifactBucketLifecycle", bucket_lifecycles["artifactBucketLifecycle"], ARTIFACT_BUCKET_LIFECYCLE_KEYS
+        ),
+        application_bucket_lifecycle=_translate_keys(
+            "applicationBucketLifecycle", bucket_lifecycles["applicationBucketLifecycle"], APPLICATION_BUCKET_LIFECYCLE_KEYS
+        ),
+        perf_gate_settings=_translate_keys("perfGateSettings", perf_gate_settings, list(PERF_GATE_DEFAULT_SETTINGS)),
+        test_shards=_integer(test_shards),
+        test_shard_settings=_translate_keys("testShardSettings", test_shard_settings, list(TEST_SHARD_DEFAULT_SETTINGS)),
+        package_budget=package_budget,
+        package_budget_settings=_translate_keys(
+            "packageBudgetSettings", package_budget_settings, list(PACKAGE_BUDGET_DEFAULT_SETTINGS)
+        ),
+    )
+    # The stack validates its keyword arguments with the same rules, and the messages name the context keys
+    validate_pipeline_options(stack_options, option_name=_camel_case)
+    return stack_options
+
+
+def validate_pipeline_options(
+    options: dict[str, Any],
+    option_name: Callable[[str], str] = lambda name: name,
+) -> None:
+    """Validate the keyword arguments of ServerlessPipeline, which are also the stack options of the context.
+
+    option_name renders the name of an option or a setting in the messages.
+    The rules that depend on the constructs, such as the stack env and the actions of a stage, are left to ServerlessPipeline.
+    """
+    name = option_name
+    environment = options["environment"]
+    build_compute_mode = options["build_compute_mode"]
+    build_targets = options["build_targets"] or []
+    promotion_environments = options["promotion_environments"] or []
+    deployment_targets = options["deployment_targets"] or []
+    deploy_stacks = options["deploy_stacks"] or []
+    trigger_filters = options["trigger_filters"] or {}
+
+    # check Application name is pascal case
+    if not re.match(PASCAL_CASE_PATTERN, options["application_name"]):
+        raise ValueError(
+            f"The application name '{options['application_name']}' is invalid. It must be in PascalCase format."
+        )
+
+    # check the options with a list of allowed values
+    for key, allowed_values in [
+        ("environment", ALLOWED_ENVIRONMENTS),
+        ("source_type", ALLOWED_SOURCE_TYPES),
+        ("build_cache_mode", ALLOWED_BUILD_CACHE_MODES),
+        ("build_compute_mode", ALLOWED_BUILD_COMPUTE_MODES),
+        ("build_compute_size", ALLOWED_BUILD_COMPUTE_SIZES),
+        ("build_architecture", ALLOWED_BUILD_ARCHITECTURES),
+        ("build_fleet_overflow", ALLOWED_BUILD_FLEET_OVERFLOWS),
+        ("build_lambda_memory", ALLOWED_BUILD_LAMBDA_MEMORIES),
+        ("build_lambda_runtime", ALLOWED_BUILD_LAMBDA_RUNTIMES),
+        ("build_fan_out", ALLOWED_BUILD_FAN_OUTS),
+        ("execution_mode", ALLOWED_EXECUTION_MODES),
+        ("deploy_mode", ALLOWED_DEPLOY_MODES),
+    ]:
+        if options[key] not in allowed_values:
+            raise ValueError(
+                f"Invalid {name(key)} '{options[key]}'. Allowed values are: {', '.join(map(str, allowed_values))}"
+            )
+
+    # check Build timeout is an integer within the CodeBuild limits
+    build_timeout_minutes = options["build_timeout_minutes"]
+    if build_timeout_minutes is not None and (
+        not _is_integer(build_timeout_minutes)
+        or not BUILD_TIMEOUT_MINUTES_RANGE[0] <= build_timeout_minutes <= BUILD_TIMEOUT_MINUTES_RANGE[1]
+    ):
+        raise ValueError(
+            f"Invalid {name('build_timeout_minutes')} '{build_timeout_minutes}'. It must be an integer between "
+            f"{BUILD_TIMEOUT_MINUTES_RANGE[0]} and {BUILD_TIMEOUT_MINUTES_RANGE[1]} minutes."
+        )
+
+    # check the options with a count of 0 or more, or days of 1 or more
+    for key, min_value, max_value in [
+        ("build_fleet_capacity", 0, None),
+        ("test_shards", 0, MAX_TEST_SHARDS),
+        ("build_reuse_retention_days", 1, None),
+    ]:
+        value = options[key]
+        if not _is_integer(value, min_value) or (max_value is not None and value > max_value):
+            raise ValueError(
+                f"Invalid {name(key)} '{value}'. It must be an integer of {min_value} or more"
+                + (f" and {max_value} or less." if max_value is not None else ".")
+            )
+
+    # check Lambda compute is not combined with the build settings of container compute
+    if build_compute_mode == "lambda":
+        if options["build_cache_mode"] != "none":
+            raise ValueError(
+                f"The {name('build_cache_mode')} '{options['build_cache_mode']}' is not supported by the lambda "
+                f"{name('build_compute_mode')}."
+            )
+        # The test project runs in the build environment, whose lambda image lacks most test toolchains
+        for key in ["build_privileged", "build_timeout_minutes", "build_fleet_capacity", "test_shards"]:
+            if options[key]:
+                raise ValueError(f"{name(key)} is not supported by the lambda {name('build_compute_mode')}.")
+        if build_targets and options["build_fan_out"] == "batch":
+            raise ValueError(
+                f"The batch {name('build_fan_out')} is not supported by the lambda {name('build_compute_mode')}."
+            )
+
+    # check Build compute size is supported by the arm64 containers of the build
+    if build_compute_mode == "container" and options["build_architecture"] == "arm64":
+        arm64_compute_sizes = (
+            ALLOWED_ARM64_BUILD_FLEET_COMPUTE_SIZES if options["build_fleet_capacity"] > 0
+            else ALLOWED_ARM64_BUILD_COMPUTE_SIZES
+        )
+        if options["build_compute_size"] not in arm64_compute_sizes:
+            raise ValueError(
+                f"Invalid {name('build_compute_size')} '{options['build_compute_size']}' for the arm64 architecture. "
+                f"Allowed values are: {', '.join(arm64_compute_sizes)}"
+            )
+
+    # check Build targets have the keys of a build and unique PascalCase names
+    _check_named_items("build target", build_targets, BUILD_TARGET_KEYS, name)
+
+    # check Deploy mode direct is used only by dev, and stg and prd deploy through a change set
+    if options["deploy_mode"] == "direct" and environment != "dev":
+        raise ValueError(
+            f"The {name('deploy_mode')} 'direct' is supported only by the dev environment, not '{environment}'."
+        )
+
+    # check Promotion environments are unique environments in promotion order
+    if promotion_environments:
+        invalid_environments = [env for env in promotion_environments if env not in ALLOWED_ENVIRONMENTS]
+        if invalid_environments:
+            raise ValueError(
+                f"Invalid {name('promotion_environments')} '{', '.join(invalid_environments)}'. "
+                f"Allowed values are: {', '.join(ALLOWED_ENVIRONMENTS)}"
+            )
+        if len(promotion_environments) < 2 or promotion_environments != sorted(
+            set(promotion_environments), key=ALLOWED_ENVIRONMENTS.index
+        ):
+            raise ValueError(
+                f"Invalid {name('promotion_environments')} '{', '.join(promotion_environments)}'. "
+                f"They must be two or more unique environments in the order {', '.join(ALLOWED_ENVIRONMENTS)}."
+            )
+
+    # check Promotion parameter name is a CloudFormation parameter name
+    if not re.match(PARAMETER_NAME_PATTERN, options["promotion_parameter_name"]):
+        raise ValueError(
+            f"Invalid {name('promotion_parameter_name')} '{options['promotion_parameter_name']}'. It must be alphanumeric."
+        )
+
+    # check Deployment targets have only supported keys, a region, an account id and a positive wave
+    for deployment_target in deployment_targets:
+        _check_keys("deployment_targets", deployment_target, DEPLOYMENT_TARGET_KEYS, name)
+        _check_required_keys("deployment target", deployment_target, REQUIRED_DEPLOYMENT_TARGET_KEYS, name)
+        account = deployment_target.get("account")
+        if account is not None and not re.match(ACCOUNT_ID_PATTERN, str(account)):
+            raise ValueError(f"Invalid deployment target account '{account}'. It must be a 12-digit account id.")
+        if not _is_integer(deployment_target.get("wave", 1), 1):
+            raise ValueError(
+                f"Invalid deployment target wave '{deployment_target['wave']}'. It must be a positive integer."
+            )
+    if deployment_targets and promotion_environments:
+        raise ValueError(f"{name('deployment_targets')} cannot be combined with {name('promotion_environments')}.")
+
+    # check Deploy stacks have only supported keys, unique PascalCase names and no dependency cycle
+    for deploy_stack in deploy_stacks:
+        _check_keys("deploy_stacks", deploy_stack, DEPLOY_STACK_KEYS, name)
+    _check_named_items("deploy stack", deploy_stacks, REQUIRED_DEPLOY_STACK_KEYS, name)
+    deploy_stack_names = [deploy_stack["name"] for deploy_stack in deploy_stacks]
+    for deploy_stack in deploy_stacks:
+        depends_on = deploy_stack.get("depends_on") or []
+        if not isinstance(depends_on, list):
+            raise ValueError(
+                f"Invalid {name('depends_on')} of the deploy stack '{deploy_stack['name']}'. "
+                "It must be a list of deploy stack names."
+            )
+        unknown_names = [dependency for dependency in depends_on if dependency not in deploy_stack_names]
+        if unknown_names:
+            raise ValueError(
+                f"The deploy stack '{deploy_stack['name']}' depends on unknown stacks: {', '.join(unknown_names)}"
+            )
+    deploy_stack_layers(deploy_stacks)
+    if deploy_stacks and build_targets:
+        raise ValueError(f"{name('deploy_stacks')} cannot be combined with {name('build_targets')}.")
+
+    # check Deploy skip and perf gate are not combined with the deploy stages they do not support
+    if options["deploy_skip_unchanged"] and (promotion_environments or deployment_targets):
+        raise ValueError(
+            f"{name('deploy_skip_unchanged')} cannot be combined with {name('promotion_environments')} "
+            f"or {name('deployment_targets')}."
+        )
+    if options["perf_gate"] and deployment_targets:
+        raise ValueError(f"{name('perf_gate')} cannot be combined with {name('deployment_targets')}.")
+    if options["perf_gate_environments"] is not None and any(
+        env not in promotion_environments for env in options["perf_gate_environments"]
+    ):
+        raise ValueError(f"{name('perf_gate_environments')} must be a subset of {name('promotion_environments')}.")
+
+    # check the settings have only supported keys, positive numbers and non-empty strings
+    _check_settings(
+        "perf_gate_settings",
+        options["perf_gate_settings"] or {},
+        PERF_GATE_DEFAULT_SETTINGS,
+        PERF_GATE_NUMBER_SETTINGS,
+        PERF_GATE_INTEGER_SETTINGS,
+        name,
+    )
+    max_error_rate = (options["perf_gate_settings"] or {}).get("max_error_rate", 0)
+    if max_error_rate > 1:
+        raise ValueError(
+            f"Invalid {name('perf_gate_settings')} {name('max_error_rate')} '{max_error_rate}'. It must be a rate up to 1."
+        )
+    _check_settings("test_shard_settings", options["test_shard_settings"] or {}, TEST_SHARD_DEFAULT_SETTINGS, [], [], name)
+    _check_settings(
+        "package_budget_settings",
+        options["package_budget_settings"] or {},
+        PACKAGE_BUDGET_DEFAULT_SETTINGS,
+        PACKAGE_BUDGET_NUMBER_SETTINGS,
+        PACKAGE_BUDGET_INTEGER_SETTINGS,
+        name,
+    )
+
+    # check Bucket lifecycles have only supported keys with integer days
+    validate_bucket_lifecycle(
+        "artifact_bucket_lifecycle", options["artifact_bucket_lifecycle"] or {}, ARTIFACT_BUCKET_LIFECYCLE_KEYS, name
+    )
+    validate_bucket_lifecycle(
+        "application_bucket_lifecycle", options["application_bucket_lifecycle"] or {}, APPLICATION_BUCKET_LIFECYCLE_KEYS, name
+    )
+
+    # check Build reuse runs in a build that can run its script
+    if options["build_reuse"] and build_targets and options["build_fan_out"] == "batch":
+        raise ValueError(f"{name('build_reuse')} cannot be combined with the batch {name('build_fan_out')}.")
+    if options["build_reuse"] and build_compute_mode == "lambda" and not options["build_lambda_runtime"].startswith("python"):
+        raise ValueError(
+            f"{name('build_reuse')} requires a python {name('build_lambda_runtime')} with lambda compute, "
+            f"not '{options['build_lambda_runtime']}'."
+        )
+
+    # check Trigger filters have only supported keys with lists of globs, and are used with the github source type
+    _check_keys("trigger_filters", trigger_filters, TRIGGER_FILTER_KEYS, name)
+    for trigger_filter_key, trigger_filter_globs in trigger_filters.items():
+        if not isinstance(trigger_filter_globs, list):
+            raise ValueError(
+                f"The {name('trigger_filters')} {name(trigger_filter_key)} must be a list of glob patterns."
+            )
+    if trigger_filters and options["source_type"] != "github":
+        raise ValueError(
+            f"{name('trigger_filters')} is supported only by the github source type. "
+            "CodePipeline trigger filters are only supported for CodeStar connections sources."
+        )
+
+
+def validate_bucket_lifecycle(
+    key: str,
+    bucket_lifecycle: dict[str, Any],
+    supported_keys: list[str],
+    option_name: Callable[[str], str] = lambda name: name,
+) -> None:
+    """Validate the lifecycle of a bucket, whose days are integers of 1 or more (0 or more to move to Intelligent-Tiering)."""
+    _check_keys(key, bucket_lifecycle, supported_keys, option_name)
+    for lifecycle_key, days in bucket_lifecycle.items():
+        # Objects can move to Intelligent-Tiering on the day they are created, the other rules need a day at least
+        min_days = 0 if lifecycle_key == "intelligent_tiering_days" else 1
+        if not _is_integer(days, min_days):
+            raise ValueError(
+                f"Invalid {option_name(key)} {option_name(lifecycle_key)} '{days}'. "
+                f"It must be an integer of {min_days} or more days."
+            )
+
+
+def deploy_stack_layers(deploy_stacks: list[dict[str, Any]]) -> dict[str, int]:
+    """Return the layer of each deploy stack, which is deployed one layer after the last stack it depends on."""
+    dependencies = {deploy_stack["name"]: list(deploy_stack.get("depends_on") or []) for deploy_stack in deploy_stacks}
+
+    # Peel the stacks whose dependencies are all layered, one layer at a time
+    layers: dict[str, int] = {}
+    while len(layers) < len(dependencies):
+        ready_names = [
+            name for name, depends_on in dependencies.items()
+            if name not in layers and all(dependency in layers for dependency in depends_on)
+        ]
+        if not ready_names:
+            cyclic_names = [name for name in dependencies if name not in layers]
+            raise ValueError(f"The deploy stacks have a dependency cycle: {', '.join(cyclic_names)}")
+        for name in ready_names:
+            layers[name] = max((layers[dependency] + 1 for dependency in dependencies[name]), default=0)
+    return layers
+
+
+def _camel_case(name: str) -> str:
+    # The context keys are the camelCase names of the stack options and their settings
+    first_word, *words = name.split("_")
+    return first_word + "".join(word.capitalize() for word in words)
+
+
+def _integer(value: Any) -> Any:
+    # The '-c <key>=<value>' option passes the numbers as strings. Other values are left to the validation.
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+def _is_integer(value: Any, min_value: int = 0) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= min_value
+
+
+def _translate_keys(context_key: str, values: dict[str, Any], keys: list[str]) -> dict[str, Any]:
+    # The camelCase keys of a context object are translated to the keys of the stack option
+    context_keys = {_camel_case(key): key for key in keys}
+    _check_keys(context_key, values, list(context_keys), lambda name: name)
+    return {context_keys[key]: value for key, value in values.items()}
+
+
+def _check_keys(key: str, values: dict[str, Any], supported_keys: list[str], option_name: Callable[[str], str]) -> None:
+    invalid_keys = [value_key for value_key in values if value_key not in supported_keys]
+    if invalid_keys:
+        raise ValueError(
+            f"Invalid {option_name(key)} keys '{', '.join(map(option_name, invalid_keys))}'. "
+            f"Allowed values are: {', '.join(map(option_name, supported_keys))}"
+        )
+
+
+def _check_required_keys(
+    label: str,
+    values: dict[str, Any],
+    required_keys: list[str],
+    option_name: Callable[[str], str],
+) -> None:
+    missing_keys = [key for key in required_keys if not values.get(key)]
+    if missing_keys:
+        raise ValueError(f"The {label} {values} is missing: {', '.join(map(option_name, missing_keys))}")
+
+
+def _check_named_items(
+    label: str,
+    items: list[dict[str, Any]],
+    required_keys: list[str],
+    option_name: Callable[[str], str],
+) -> None:
+    # The names of the items are used in construct ids, so they are unique and in PascalCase
+    item_names: list[str] = []
+    for item in items:
+        _check_required_keys(label, item, required_keys, option_name)
+        if not re.match(PASCAL_CASE_PATTERN, item["name"]):
+            raise ValueError(f"The {label} name '{item['name']}' is invalid. It must be in PascalCase format.")
+        if item["name"] in item_names:
+            raise ValueError(f"The {label} name '{item['name']}' is duplicated.")
+        item_names.append(item["name"])
+
+
+def _check_settings(
+    key: str,
+    settings: dict[str, Any],
+    default_settings: dict[str, Any],
+    number_keys: list[str],
+    integer_keys: list[str],
+    option_name: Callable[[str], str],
+) -> None:
+    _check_keys(key, settings, list(default_settings), option_name)
+    for setting_key, value in settings.items():
+        if setting_key in integer_keys and not _is_integer(value, 1):
+            raise ValueError(
+                f"Invalid {option_name(key)} {option_name(setting_key)} '{value}'. It must be a positive integer."
+            )
+        if setting_key in number_keys and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            raise ValueError(
+                f"Invalid {option_name(key)} {option_name(setting_key)} '{value}'. It must be a positive number."
+            )
+        if setting_key not in number_keys and (not isinstance(value, str) or not value):
+            raise ValueError(
+                f"Invalid {option_name(key)} {option_name(setting_key)} '{value}'. It must be a non-empty string."
+            )
+
+
+def load_manifest(manifest_path: str) -> list[dict[str, Any]]:
+    """Load the pipelines of a JSON or YAML manifest file."""
+    path = Path(manifest_path)
+    if path.suffix in [".yaml", ".yml"]:
+        # PyYAML is only needed for YAML manifests
+        import yaml
+        manifest = yaml.safe_load(path.read_text())
+    else:
+        manifest = json.loads(path.read_text())
+
+    pipelines = manifest.get("pipelines") if isinstance(manifest, dict) else None
+    if not isinstance(pipelines, list) or not pipelines:
+        raise ValueError(f"The manifest '{manifest_path}' must have a non-empty 'pipelines' list.")
+    return pipelines
+
+
+def get_manifest_stack_options(pipelines: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Validate every pipeline of a manifest up front and return the keyword arguments of each stack.
+
+    The errors of all pipelines are reported together, so a fleet is fixed in one pass.
+    """
+    stack_options_list: list[dict[str, Any]] = []
+    errors: list[str] = []
+    stack_names: set[str] = set()
+    for index, pipeline in enumerate(pipelines):
+        label = f"pipelines[{index}] ({pipeline.get('applicationName', 'unknown')})"
+        try:
+            stack_options = get_stack_options(pipeline.get)
+
+            parameter_defaults = pipeline.get("parameters") or {}
+            unsupported_parameters = [name for name in parameter_defaults if name not in STACK_PARAMETER_NAMES]
+            if unsupported_parameters:
+                raise ValueError(
+                    f"Invalid parameters: {', '.join(unsupported_parameters)}. "
+                    f"Allowed values are: {', '.join(STACK_PARAMETER_NAMES)}"
+                )
+            stack_options["parameter_defaults"] = {name: str(value) for name, value in parameter_defaults.items()}
+
+            stack_name = pipeline.get("stackName") or f"{stack_options['application_name']}Stack"
+            if stack_name in stack_names:
+                raise ValueError(
+                    f"The stack name '{stack_name}' is duplicated. Set 'stackName' to synthesize it more than once."
+                )
+            stack_names.add(stack_name)
+            stack_options["stack_name"] = stack_name
+            stack_options_list.append(stack_options)
+        except (ValueError, json.JSONDecodeError) as error:
+            errors.append(f"{label}: {error}")
+
+    if errors:
+        raise ValueError("The manifest is invalid:\n" + "\n".join(errors))
+    return stack_options_list
+
+
+def read_context(
+    argv: list[str] | None = None,
+    cdk_json_path: str = "cdk.json",
+    environ: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """Read the context values without the CDK runtime.
+
+    Later sources take precedence: the context of cdk.json, the CDK_CONTEXT_JSON environment
+    variable set by the CDK CLI, and the '-c <key>=<value>' or '--context <key>=<value>' options of argv.
+    """
+    environ = os.environ if environ is None else environ
+    context: dict[str, Any] = {}
+
+    path = Path(cdk_json_path)
+    if path.is_file():
+        context.update(json.loads(path.read_text()).get("context", {}))
+
+    if environ.get("CDK_CONTEXT_JSON"):
+        context.update(json.loads(environ["CDK_CONTEXT_JSON"]))
+
+    args = list(argv or [])
+    for index, arg in enumerate(args):
+        value = None
+        if arg in ["-c", "--context"] and index + 1 < len(args):
+            value = args[index + 1]
+        elif arg.startswith("--context="):
+            value = arg[len("--context="):]
+        if value is not None and "=" in value:
+            key, _, context_value = value.partition("=")
+            context[key] = context_value
+    return context
@@ -0,0 +1,144 @@
+"""Publish the durations of CodePipeline executions, stages and actions as CloudWatch metrics.
+
+The function receives the CodePipeline state change events of EventBridge and writes the metrics
+in the CloudWatch embedded metric format, so it needs no cloudwatch:PutMetricData permission.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "ServerlessPipeline")
+
+# States of the finished executions. Stopped and superseded executions have no meaningful duration.
+FINISHED_STATES = ["SUCCEEDED", "FAILED"]
+
+PIPELINE_EVENT = "CodePipeline Pipeline Execution State Change"
+STAGE_EVENT = "CodePipeline Stage Execution State Change"
+ACTION_EVENT = "CodePipeline Action Execution State Change"
+
+
+def _seconds(start: datetime, end: datetime) -> float:
+    return round((end - start).total_seconds(), 3)
+
+
+def _list_action_executions(client: Any, pipeline_name: str, execution_id: str) -> list[dict[str, Any]]:
+    action_executions: list[dict[str, Any]] = []
+    kwargs: dict[str, Any] = {"pipelineName": pipeline_name, "filter": {"pipelineExecutionId": execution_id}}
+    while True:
+        response = client.list_action_executions(**kwargs)
+        action_executions.extend(response.get("actionExecutionDetails", []))
+        if not response.get("nextToken"):
+            return action_executions
+        kwargs["nextToken"] = response["nextToken"]
+
+
+def _get_pipeline_execution(client: Any, pipeline_name: str, execution_id: str) -> dict[str, Any]:
+    return client.get_pipeline_execution(pipelineName=pipeline_name, pipelineExecutionId=execution_id)["pipelineExecution"]
+
+
+def _idle_seconds(action_executions: list[dict[str, Any]], finished_at: datetime) -> float:
+    """Return the seconds between the first action start and the end in which no action of the execution ran."""
+    idle_seconds = 0.0
+    covered_until = min(action["startTime"] for action in action_executions)
+    for action in sorted(action_executions, key=lambda action: action["startTime"]):
+        if action["startTime"] > covered_until:
+            idle_seconds += _seconds(covered_until, action["startTime"])
+        covered_until = max(covered_until, action["lastUpdateTime"])
+    if finished_at > covered_until:
+        idle_seconds += _seconds(covered_until, finished_at)
+    return round(idle_seconds, 3)
+
+
+def pipeline_metrics(client: Any, detail: dict[str, Any], finished_at: datetime) -> dict[str, float]:
+    """Return the duration, queue time and success of a finished pipeline execution.
+
+    GetPipelineExecution returns no start and end times, so the duration runs from the first action start of the
+    execution to the time of the finished event.
+    """
+    execution = _get_pipeline_execution(client, detail["pipeline"], detail["execution-id"])
+    if execution["status"] not in FINISHED_STATES:
+        return {}
+    action_executions = _list_action_executions(client, detail["pipeline"], detail["execution-id"])
+    if not action_executions:
+        return {}
+    started_at = min(action["startTime"] for action in action_executions)
+    return {
+        "PipelineDuration": _seconds(started_at, finished_at),
+        # The time the execution waited between its stages, for earlier executions or entry conditions
+        "QueueTime": _idle_seconds(action_executions, finished_at),
+        "PipelineSucceeded": 1.0 if execution["status"] == "SUCCEEDED" else 0.0,
+    }
+
+
+def stage_metrics(client: Any, detail: dict[str, Any]) -> dict[str, float]:
+    """Return the duration of a finished stage execution, from its first action start to its last action end."""
+    action_executions = [
+        action for action in _list_action_executions(client, detail["pipeline"], detail["execution-id"])
+        if action["stageName"] == detail["stage"]
+    ]
+    if not action_executions:
+        return {}
+    started_at = min(action["startTime"] for action in action_executions)
+    finished_at = max(action["lastUpdateTime"] for action in action_executions)
+    return {"StageDuration": _seconds(started_at, finished_at)}
+
+
+def action_metrics(client: Any, detail: dict[str, Any]) -> dict[str, float]:
+    """Return the duration of a finished action execution."""
+    for action in _list_action_executions(client, detail["pipeline"], detail["execution-id"]):
+        if action["stageName"] == detail["stage"] and action["actionName"] == detail["action"]:
+            return {"ActionDuration": _seconds(action["startTime"], action["lastUpdateTime"])}
+    return {}
+
+
+def embedded_metrics(dimensions: dict[str, str], metrics: dict[str, float]) -> dict[str, Any]:
+    """Return a log record of the metrics in the CloudWatch embedded metric format."""
+    return {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": "None" if name == "PipelineSucceeded" else "Seconds"}
+                        for name in metrics
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **metrics,
+    }
+
+
+def handler(event: dict[str, Any], context: Any, client: Any = None) -> dict[str, Any] | None:
+    detail = event.get("detail", {})
+    if detail.get("state") not in FINISHED_STATES:
+        return None
+
+    if client is None:
+        # boto3 is provided by the Lambda runtime
+        import boto3
+        client = boto3.client("codepipeline")
+
+    dimensions = {"PipelineName": detail["pipeline"]}
+    if event["detail-type"] == PIPELINE_EVENT:
+        metrics = pipeline_metrics(client, detail, datetime.fromisoformat(event["time"]))
+    elif event["detail-type"] == STAGE_EVENT:
+        dimensions["StageName"] = detail["stage"]
+        metrics = stage_metrics(client, detail)
+    elif event["detail-type"] == ACTION_EVENT:
+        dimensions["StageName"] = detail["stage"]
+        dimensions["ActionName"] = detail["action"]
+        metrics = action_metrics(client, detail)
+    else:
+        return None
+
+    if not metrics:
+        return None
+    record = embedded_metrics(dimensions, metrics)
+    print(json.dumps(record))
+    return record
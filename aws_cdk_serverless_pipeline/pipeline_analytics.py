@@ -0,0 +1,428 @@
+"""Analyze exported CodePipeline and CodeBuild execution history offline.
+
+The inputs are the JSON outputs of the AWS CLI, either as single documents, concatenated pages or JSON Lines:
+
+    aws codepipeline list-pipeline-executions --pipeline-name MyAppPipeline > executions.json
+    aws codepipeline list-action-executions --pipeline-name MyAppPipeline > actions.json
+    aws codebuild batch-get-builds --ids <build ids> > builds.json
+
+Usage:
+    python -m aws_cdk_serverless_pipeline.pipeline_analytics \\
+        --executions MyAppPipeline=executions.json --actions MyAppPipeline=actions.json \\
+        [--builds builds.json] [--output report.json]
+
+The files are streamed, so the history of a long-lived pipeline is analyzed without loading it whole.
+This module does not import aws_cdk or boto3 and needs no AWS access.
+"""
+import argparse
+import json
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import IO, Any, Iterator
+
+# Keys of the lists of items in the AWS CLI outputs
+LIST_KEYS = ["pipelineExecutionSummaries", "actionExecutionDetails", "builds"]
+
+# Characters read from a history file at a time
+CHUNK_SIZE = 1 << 16
+
+# CodeBuild phases spent before the build commands start
+BUILD_WAIT_PHASES = ["SUBMITTED", "QUEUED", "PROVISIONING"]
+BUILD_CACHEABLE_PHASES = ["DOWNLOAD_SOURCE", "INSTALL"]
+
+# Seconds of a p95 wait or phase duration worth a recommendation
+RECOMMENDATION_THRESHOLD_SECONDS = 30.0
+
+_WHITESPACE = " \t\r\n"
+
+
+class _JsonStream:
+    """A JSON reader decoding one value at a time from a file read in chunks."""
+
+    def __init__(self, file: IO[str], chunk_size: int = CHUNK_SIZE) -> None:
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def peek(self) -> str | None:
+        """Skip the whitespace and return the next character, or None at the end of the file."""
+        while True:
+            self._buffer = self._buffer.lstrip(_WHITESPACE)
+            if self._buffer:
+                return self._buffer[0]
+            if not self._fill():
+                return None
+
+    def advance(self) -> None:
+        self._buffer = self._buffer[1:]
+
+    def match(self, pattern: re.Pattern[str], lookahead: int = 256) -> re.Match[str] | None:
+        """Match the pattern at the next character, reading at least lookahead characters ahead."""
+        while len(self._buffer) < lookahead and self._fill():
+            pass
+        match = pattern.match(self._buffer)
+        if match:
+            self._buffer = self._buffer[match.end():]
+        return match
+
+    def decode(self) -> Any:
+        """Decode the next value, reading more chunks until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and isinstance(value, (int, float)) and self._fill():
+                continue
+            self._buffer = self._buffer[end:]
+            return value
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the items of an array whose opening bracket has been consumed."""
+        while True:
+            char = self.peek()
+            if char is None:
+                raise ValueError("The history file ended inside an array.")
+            if char == "]":
+                self.advance()
+                return
+            if char == ",":
+                self.advance()
+                continue
+            yield self.decode()
+
+    def skip_object_rest(self) -> None:
+        """Skip the remaining members of an object, such as the nextToken after the list of a page."""
+        while True:
+            char = self.peek()
+            if char is None:
+                raise ValueError("The history file ended inside an object.")
+            if char == "}":
+                self.advance()
+                return
+            if char in ",:":
+                self.advance()
+                continue
+            self.decode()
+
+
+def iter_json_items(file: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[dict[str, Any]]:
+    """Yield the items of the AWS CLI output pages in a file without loading it whole.
+
+    A page is an object whose first member is one of LIST_KEYS, like the AWS CLI writes them.
+    The items of its list are decoded one at a time. Top-level arrays and objects without a list,
+    such as the records of a JSON Lines file, are yielded as they are.
+    """
+    stream = _JsonStream(file, chunk_size)
+    page_pattern = re.compile(r'\{\s*"(' + "|".join(LIST_KEYS) + r')"\s*:\s*\[')
+    while True:
+        char = stream.peek()
+        if char is None:
+            return
+        if char == "[":
+            stream.advance()
+            yield from stream.iter_array()
+        elif char == "{" and stream.match(page_pattern):
+            yield from stream.iter_array()
+            stream.skip_object_rest()
+        else:
+            document = stream.decode()
+            list_key = next((key for key in LIST_KEYS if isinstance(document, dict) and key in document), None)
+            if list_key:
+                yield from document[list_key]
+            else:
+                yield document
+
+
+def parse_time(value: Any) -> datetime:
+    """Parse an ISO 8601 or epoch seconds timestamp of the AWS CLI."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    """Return the percentile of the values with linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return round(ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower), 3)
+
+
+def summarize(values: list[float]) -> dict[str, Any]:
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+
+
+def _seconds(start: datetime, end: datetime) -> float:
+    return (end - start).total_seconds()
+
+
+def critical_path(actions: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return the actions of an execution that its duration depends on.
+
+    The stages run one after another. In a stage, the path ends at the action finishing last
+    and goes back through the latest action finishing before each action started.
+    """
+    stages: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for action in actions:
+        stages[action["stage"]].append(action)
+
+    path: list[dict[str, Any]] = []
+    for stage_actions in sorted(stages.values(), key=lambda items: min(item["start"] for item in items)):
+        stage_path = []
+        action: dict[str, Any] | None = max(stage_actions, key=lambda item: item["end"])
+        while action is not None:
+            stage_path.append(action)
+            started_at = action["start"]
+            earlier = [item for item in stage_actions if item["end"] <= started_at and item not in stage_path]
+            action = max(earlier, key=lambda item: item["end"]) if earlier else None
+        path.extend(reversed(stage_path))
+    return path
+
+
+class PipelineHistory:
+    """The execution history of a pipeline, aggregated from the streamed items."""
+
+    def __init__(self, pipeline_name: str) -> None:
+        self.pipeline_name = pipeline_name
+        self.executions: dict[str, dict[str, Any]] = {}
+        self.actions: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        # CodeBuild build ids of the actions of this pipeline
+        self.build_ids: set[str] = set()
+        self.phase_durations: dict[str, list[float]] = defaultdict(list)
+
+    def add_execution(self, summary: dict[str, Any]) -> None:
+        self.executions[summary["pipelineExecutionId"]] = {
+            "status": summary.get("status"),
+            "start": parse_time(summary["startTime"]),
+            "end": parse_time(summary["lastUpdateTime"]),
+        }
+
+    def add_action(self, detail: dict[str, Any]) -> None:
+        if "startTime" not in detail or "lastUpdateTime" not in detail:
+            return
+        self.actions[detail["pipelineExecutionId"]].append({
+            "stage": detail["stageName"],
+            "action": detail["actionName"],
+            "start": parse_time(detail["startTime"]),
+            "end": parse_time(detail["lastUpdateTime"]),
+        })
+        external_execution_id = detail.get("output", {}).get("executionResult", {}).get("externalExecutionId")
+        if external_execution_id:
+            self.build_ids.add(external_execution_id)
+
+    def owns_build(self, build: dict[str, Any]) -> bool:
+        # Builds are matched by the build ids of the actions, or by the project names of the stack
+        # ({applicationName}Build...) when the action history holds no build ids
+        if self.build_ids:
+            return build.get("id") in self.build_ids
+        application_name = self.pipeline_name.removesuffix("Pipeline")
+        return str(build.get("projectName", "")).startswith(f"{application_name}Build")
+
+    def add_build(self, build: dict[str, Any]) -> None:
+        for phase in build.get("phases", []):
+            if phase.get("durationInSeconds") is not None:
+                self.phase_durations[phase["phaseType"]].append(float(phase["durationInSeconds"]))
+
+    def report(self) -> dict[str, Any]:
+        execution_durations: list[float] = []
+        queue_times: list[float] = []
+        stage_durations: dict[str, list[float]] = defaultdict(list)
+        stage_order: dict[str, datetime] = {}
+        critical_actions: dict[tuple[str, str], list[float]] = defaultdict(list)
+        statuses: dict[str, int] = defaultdict(int)
+
+        for execution_id, execution in self.executions.items():
+            statuses[str(execution["status"])] += 1
+            if execution["status"] in ["Succeeded", "Failed"]:
+                execution_durations.append(_seconds(execution["start"], execution["end"]))
+            actions = self.actions.get(execution_id, [])
+            if actions:
+                queue_times.append(max(_seconds(execution["start"], min(action["start"] for action in actions)), 0.0))
+
+        for actions in self.actions.values():
+            stages: dict[str, list[dict[str, Any]]] = defaultdict(list)
+            for action in actions:
+                stages[action["stage"]].append(action)
+            for stage_name, stage_actions in stages.items():
+                started_at = min(action["start"] for action in stage_actions)
+                stage_durations[stage_name].append(_seconds(started_at, max(action["end"] for action in stage_actions)))
+                stage_order[stage_name] = min(stage_order.get(stage_name, started_at), started_at)
+            for action in critical_path(actions):
+                critical_actions[(action["stage"], action["action"])].append(_seconds(action["start"], action["end"]))
+
+        stage_names = sorted(stage_durations, key=lambda name: stage_order[name].timestamp())
+        executions_with_actions = len(self.actions) or 1
+        finished = statuses.get("Succeeded", 0) + statuses.get("Failed", 0)
+        phases = {phase: summarize(durations) for phase, durations in self.phase_durations.items()}
+        report: dict[str, Any] = {
+            "pipeline_name": self.pipeline_name,
+            "execution_count": len(self.executions),
+            "statuses": dict(sorted(statuses.items())),
+            "success_rate": round(statuses.get("Succeeded", 0) / finished, 3) if finished else None,
+            "execution_duration": summarize(execution_durations),
+            "queue_time": summarize(queue_times),
+            "stages": {stage_name: summarize(stage_durations[stage_name]) for stage_name in stage_names},
+            "critical_path": [
+                {
+                    "stage": stage_name,
+                    "action": action_name,
+                    "share": round(len(durations) / executions_with_actions, 3),
+                    **summarize(durations),
+                }
+                for (stage_name, action_name), durations in sorted(
+                    critical_actions.items(), key=lambda item: stage_names.index(item[0][0])
+                )
+            ],
+            "slowest_build_phases": dict(sorted(phases.items(), key=lambda item: -(item[1]["p95"] or 0))),
+        }
+        report["recommendations"] = recommend(report)
+        return report
+
+
+def recommend(report: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return the context values of the stack that would shorten the pipeline, the largest saving first.
+
+    The saving of each recommendation is the p50 seconds of the time it removes or shortens.
+    """
+    recommendations: list[dict[str, Any]] = []
+
+    def add(context: str, reason: str, seconds: float | None) -> None:
+        if seconds is not None and seconds >= RECOMMENDATION_THRESHOLD_SECONDS / 2:
+            recommendations.append({"context": context, "reason": reason, "p50_seconds": round(seconds, 3)})
+
+    queue_time = report["queue_time"]
+    if (queue_time["p95"] or 0) >= RECOMMENDATION_THRESHOLD_SECONDS:
+        add("executionMode", "Executions wait for earlier executions. SUPERSEDED runs only the newest commit.", queue_time["p50"])
+
+    phases = report["slowest_build_phases"]
+    build_wait = [phases[phase]["p50"] or 0 for phase in BUILD_WAIT_PHASES if phase in phases]
+    if sum(phase["p95"] or 0 for name, phase in phases.items() if name in BUILD_WAIT_PHASES) >= RECOMMENDATION_THRESHOLD_SECONDS:
+        add("buildFleetCapacity", "Builds wait for on-demand capacity. A reserved capacity fleet starts them at once.", sum(build_wait))
+    cacheable = [phases[phase]["p50"] or 0 for phase in BUILD_CACHEABLE_PHASES if phase in phases]
+    if sum(phase["p95"] or 0 for name, phase in phases.items() if name in BUILD_CACHEABLE_PHASES) >= RECOMMENDATION_THRESHOLD_SECONDS:
+        add("buildCacheMode", "Downloading the source and installing dependencies is slow. A build cache reuses them.", sum(cacheable))
+    if (phases.get("BUILD", {}).get("p95") or 0) >= RECOMMENDATION_THRESHOLD_SECONDS:
+        add(
+            "buildComputeSize",
+            "The build commands dominate the build. A larger compute size, or buildTargets for a monorepo, shortens them.",
+            phases["BUILD"]["p50"],
+        )
+
+    deploy_stages = {name: stage for name, stage in report["stages"].items() if name.startswith("CfnDeploy")}
+    deploy_p50 = sum(stage["p50"] or 0 for stage in deploy_stages.values())
+    if sum(stage["p95"] or 0 for stage in deploy_stages.values()) >= RECOMMENDATION_THRESHOLD_SECONDS:
+        add(
+            "deploySkipUnchanged",
+            "Every execution deploys. Skipping unchanged templates removes the deploy of commits that do not change them.",
+            deploy_p50,
+        )
+        change_set_paths = [
+            item for item in report["critical_path"]
+            if item["stage"] in deploy_stages and item["action"].startswith("CreateReplaceChangeSet")
+        ]
+        if change_set_paths:
+            add(
+                "deployMode",
+                "Creating the change set is on the critical path. The direct deploy mode skips it in dev.",
+                sum(item["p50"] or 0 for item in change_set_paths),
+            )
+
+    return sorted(recommendations, key=lambda item: -item["p50_seconds"])
+
+
+def _named_paths(values: list[str], option: str) -> list[tuple[str, str]]:
+    named_paths = []
+    for value in values:
+        name, separator, path = value.partition("=")
+        if not separator or not name or not path:
+            raise ValueError(f"{option} must be PIPELINE_NAME=PATH, not '{value}'.")
+        named_paths.append((name, path))
+    return named_paths
+
+
+def analyze(
+    executions: list[tuple[str, str]],
+    actions: list[tuple[str, str]],
+    builds: list[str],
+    chunk_size: int = CHUNK_SIZE,
+) -> dict[str, Any]:
+    """Stream the history files and return the report of each pipeline."""
+    histories: dict[str, PipelineHistory] = {}
+
+    def history(pipeline_name: str) -> PipelineHistory:
+        if pipeline_name not in histories:
+            histories[pipeline_name] = PipelineHistory(pipeline_name)
+        return histories[pipeline_name]
+
+    for pipeline_name, path in executions:
+        with open(path) as file:
+            for item in iter_json_items(file, chunk_size):
+                history(pipeline_name).add_execution(item)
+    for pipeline_name, path in actions:
+        with open(path) as file:
+            for item in iter_json_items(file, chunk_size):
+                history(pipeline_name).add_action(item)
+    for path in builds:
+        with open(path) as file:
+            for item in iter_json_items(file, chunk_size):
+                for pipeline_history in histories.values():
+                    if pipeline_history.owns_build(item):
+                        pipeline_history.add_build(item)
+
+    return {"pipelines": [histories[name].report() for name in sorted(histories)]}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executions", action="append", default=[], metavar="PIPELINE=PATH",
+                        help="The list-pipeline-executions output of a pipeline.")
+    parser.add_argument("--actions", action="append", default=[], metavar="PIPELINE=PATH",
+                        help="The list-action-executions output of a pipeline.")
+    parser.add_argument("--builds", action="append", default=[], metavar="PATH",
+                        help="A batch-get-builds output of the builds of the pipelines.")
+    parser.add_argument("--output", help="The path to write the JSON report to. (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        report = analyze(
+            _named_paths(args.executions, "--executions"),
+            _named_paths(args.actions, "--actions"),
+            args.builds,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    output = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
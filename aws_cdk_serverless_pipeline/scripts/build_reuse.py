@@ -0,0 +1,233 @@
+"""Restore the build outputs stored for the same commit and build configuration, or build and store them.
+
+The script runs in the build project when buildReuse is enabled. It is embedded in the buildspec at synth, so it uses
+only the standard library, PyYAML (installed by the buildspec) and the AWS CLI of the build image.
+The outputs are stored at BUILD_REUSE_URI/SOURCE_COMMIT_ID (/BUILD_REUSE_TARGET for a build target):
+
+- restore (pre_build): downloads the stored outputs, if the outputs of the build are complete, and writes the
+  restored flag, which the buildspec exports as BUILD_REUSE_RESTORED.
+- build <buildspec> (build): runs the install, pre_build and build phase commands of the application buildspec
+  unless BUILD_REUSE_RESTORED is true.
+- post_build <buildspec> (post_build): runs the post_build phase commands, copies the artifacts of a succeeded build
+  to the output directory, which is the artifacts base directory of the project, and stores them with the complete
+  marker last.
+
+The phases follow the transitions of CodeBuild: a failing command stops its phase, a failure in install or pre_build
+skips post_build, and post_build runs after a failed build with CODEBUILD_BUILD_SUCCEEDING set to 0.
+The exported variables and the working directory carry over from build to post_build.
+The keys of the application buildspec that the script does not run, such as runtime-versions, finally, cache and
+reports, fail the build instead of being ignored.
+"""
+import glob
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+from typing import Any, Callable
+
+import yaml
+
+# Working directory of the script, next to the source
+WORK_DIR = ".build-reuse"
+# Output directory of the build, which is the artifacts base directory of the project
+OUTPUT_DIR = os.path.join(WORK_DIR, "output")
+# Flag file of the restored outputs, "true" or "false"
+RESTORED_FLAG = os.path.join(WORK_DIR, "restored")
+# Exported variables and working directory at the end of the build phases, sourced by post_build
+ENV_FILE = os.path.join(WORK_DIR, "env.sh")
+# Last phase of the application buildspec that started, which is the failed phase of a failed build
+PHASE_FILE = os.path.join(WORK_DIR, "phase")
+# Marker object stored after the outputs, so partially stored outputs are never restored
+COMPLETE_MARKER = ".complete"
+# Phases of the application buildspec run by the build command, in order
+BUILD_PHASES = ["install", "pre_build", "build"]
+# Phases whose failure skips post_build
+SETUP_PHASES = ["install", "pre_build"]
+# Keys of the application buildspec that are supported
+SUPPORTED_KEYS = ["version", "env", "phases", "artifacts"]
+SUPPORTED_ENV_KEYS = ["variables", "shell"]
+SUPPORTED_PHASES = [*BUILD_PHASES, "post_build"]
+SUPPORTED_PHASE_KEYS = ["commands"]
+SUPPORTED_ARTIFACT_KEYS = ["files", "base-directory", "discard-paths"]
+
+
+def s3(*args: str) -> bool:
+    """Run an aws s3 command and return whether it succeeded."""
+    return subprocess.run(["aws", "s3", *args, "--only-show-errors"], capture_output=True).returncode == 0
+
+
+def reuse_uri(environ: dict[str, str]) -> str | None:
+    # A build started outside the pipeline has no commit ID, so it is neither restored nor stored
+    if not environ.get("BUILD_REUSE_URI") or not environ.get("SOURCE_COMMIT_ID"):
+        return None
+    uri = f"{environ['BUILD_REUSE_URI']}/{environ['SOURCE_COMMIT_ID']}"
+    return f"{uri}/{environ['BUILD_REUSE_TARGET']}" if environ.get("BUILD_REUSE_TARGET") else uri
+
+
+def write_file(path: str, content: str) -> None:
+    with open(path, "w") as file:
+        file.write(content)
+
+
+def restore(environ: dict[str, str], run: Callable[..., bool] = s3) -> int:
+    uri = reuse_uri(environ)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    write_file(RESTORED_FLAG, "false")
+    if uri is None or not run("ls", f"{uri}/{COMPLETE_MARKER}"):
+        print(f"No build outputs to reuse at {uri}. The application buildspec is run.")
+        return 0
+    if not run("cp", "--recursive", f"{uri}/", OUTPUT_DIR, "--exclude", COMPLETE_MARKER):
+        # A failed download falls back to a build, which overwrites the partial outputs
+        print(f"The build outputs of {uri} could not be downloaded. The application buildspec is run.")
+        return 0
+    write_file(RESTORED_FLAG, "true")
+    print(f"Reused the build outputs of {uri}.")
+    return 0
+
+
+def load_buildspec(path: str) -> dict[str, Any]:
+    with open(path) as file:
+        buildspec = yaml.safe_load(file) or {}
+    unsupported_keys = [
+        *(key for key in buildspec if key not in SUPPORTED_KEYS),
+        *(f"env.{key}" for key in buildspec.get("env") or {} if key not in SUPPORTED_ENV_KEYS),
+        *(f"phases.{phase}" for phase in buildspec.get("phases") or {} if phase not in SUPPORTED_PHASES),
+        *(
+            f"phases.{phase}.{key}"
+            for phase, settings in (buildspec.get("phases") or {}).items()
+            for key in settings or {}
+            if phase in SUPPORTED_PHASES and key not in SUPPORTED_PHASE_KEYS
+        ),
+        *(f"artifacts.{key}" for key in buildspec.get("artifacts") or {} if key not in SUPPORTED_ARTIFACT_KEYS),
+    ]
+    if unsupported_keys:
+        raise ValueError(f"The keys {', '.join(unsupported_keys)} of {path} are not supported with buildReuse.")
+    if not (buildspec.get("artifacts") or {}).get("files"):
+        raise ValueError(f"{path} has no artifacts files to reuse.")
+    return buildspec
+
+
+def phase_commands(buildspec: dict[str, Any], phase: str) -> list[str]:
+    return [str(command) for command in ((buildspec.get("phases") or {}).get(phase) or {}).get("commands") or []]
+
+
+def build_script(buildspec: dict[str, Any]) -> str:
+    """Return the script running the build phase commands of the buildspec with its env variables.
+
+    The script records each phase before running it, and saves the exported variables and the working directory
+    on exit.
+    """
+    # The absolute paths stay valid after the commands change the working directory
+    phase_file = shlex.quote(os.path.abspath(PHASE_FILE))
+    lines = [
+        f"BUILD_REUSE_ENV_FILE={shlex.quote(os.path.abspath(ENV_FILE))}",
+        """trap 'export -p > "$BUILD_REUSE_ENV_FILE"; printf "cd '"'%s'"'\\n" "$PWD" >> "$BUILD_REUSE_ENV_FILE"' EXIT""",
+        "set -e",
+    ]
+    for name, value in ((buildspec.get("env") or {}).get("variables") or {}).items():
+        lines.append(f"export {name}={shlex.quote(str(value))}")
+    for phase in BUILD_PHASES:
+        lines.append(f"echo {phase} > {phase_file}")
+        lines.extend(phase_commands(buildspec, phase))
+    lines.append(f"rm -f {phase_file}")
+    return "\n".join(lines) + "\n"
+
+
+def post_build_script(buildspec: dict[str, Any]) -> str:
+    """Return the script running the post_build phase commands with the variables and directory of the build."""
+    # The readonly variables of the saved environment cannot be set again, which is harmless
+    env_file = shlex.quote(os.path.abspath(ENV_FILE))
+    lines = [f"[ -f {env_file} ] && . {env_file} 2> /dev/null", "set -e"]
+    lines.extend(phase_commands(buildspec, "post_build"))
+    return "\n".join(lines) + "\n"
+
+
+def collect_artifacts(artifacts: dict[str, Any], output_dir: str) -> list[str]:
+    """Copy the artifact files to the output directory and return their paths in it."""
+    base_directory = artifacts.get("base-directory") or "."
+    discard_paths = str(artifacts.get("discard-paths", "no")).lower() in ("yes", "true")
+    paths: list[str] = []
+    for pattern in artifacts["files"]:
+        for path in sorted(glob.glob(os.path.join(base_directory, pattern), recursive=True)):
+            if not os.path.isfile(path):
+                continue
+            relative_path = os.path.basename(path) if discard_paths else os.path.relpath(path, base_directory)
+            os.makedirs(os.path.dirname(os.path.join(output_dir, relative_path)) or output_dir, exist_ok=True)
+            shutil.copy2(path, os.path.join(output_dir, relative_path))
+            paths.append(relative_path)
+    return paths
+
+
+def load_runnable_buildspec(buildspec_path: str) -> dict[str, Any] | None:
+    try:
+        return load_buildspec(buildspec_path)
+    except (OSError, ValueError, yaml.YAMLError) as error:
+        print(f"The buildspec cannot be run with buildReuse: {error}")
+        return None
+
+
+def build(buildspec_path: str, environ: dict[str, str]) -> int:
+    if environ.get("BUILD_REUSE_RESTORED") == "true":
+        print(f"The outputs were restored, so {buildspec_path} is not run.")
+        return 0
+    buildspec = load_runnable_buildspec(buildspec_path)
+    if buildspec is None:
+        return 1
+    shell = (buildspec.get("env") or {}).get("shell") or "bash"
+    return subprocess.run([shell, "-c", build_script(buildspec)], env=environ).returncode
+
+
+def post_build(buildspec_path: str, environ: dict[str, str], run: Callable[..., bool] = s3) -> int:
+    if environ.get("BUILD_REUSE_RESTORED") == "true":
+        return 0
+    buildspec = load_runnable_buildspec(buildspec_path)
+    if buildspec is None:
+        return 1
+    if os.path.exists(PHASE_FILE):
+        with open(PHASE_FILE) as file:
+            failed_phase = file.read().strip()
+        if failed_phase in SETUP_PHASES:
+            # CodeBuild skips post_build after a failed install or pre_build phase
+            print(f"The {failed_phase} phase of {buildspec_path} failed, so its post_build phase is not run.")
+            return 0
+    shell = (buildspec.get("env") or {}).get("shell") or "bash"
+    result = subprocess.run([shell, "-c", post_build_script(buildspec)], env=environ)
+    if result.returncode != 0:
+        return result.returncode
+    if environ.get("CODEBUILD_BUILD_SUCCEEDING") != "1":
+        return 0
+    if not collect_artifacts(buildspec["artifacts"], OUTPUT_DIR):
+        print(f"No artifact files of {buildspec_path} are found. Expected: {', '.join(buildspec['artifacts']['files'])}")
+        return 1
+    return store(environ, run=run)
+
+
+def store(environ: dict[str, str], run: Callable[..., bool] = s3) -> int:
+    uri = reuse_uri(environ)
+    if uri is None:
+        return 0
+    marker_path = os.path.join(WORK_DIR, COMPLETE_MARKER)
+    open(marker_path, "w").close()
+    # A build that cannot be stored still succeeds, and the next build of the commit runs the buildspec again
+    if not run("cp", "--recursive", OUTPUT_DIR, f"{uri}/") or not run("cp", marker_path, f"{uri}/{COMPLETE_MARKER}"):
+        print(f"The build outputs could not be stored at {uri}.")
+        return 0
+    print(f"Stored the build outputs at {uri}.")
+    return 0
+
+
+def main(argv: list[str], environ: dict[str, str] | None = None, run: Callable[..., bool] = s3) -> int:
+    environ = dict(os.environ) if environ is None else environ
+    if argv[:1] == ["restore"]:
+        return restore(environ, run=run)
+    if argv[:1] == ["build"] and len(argv) == 2:
+        return build(argv[1], environ)
+    if argv[:1] == ["post_build"] and len(argv) == 2:
+        return post_build(argv[1], environ, run=run)
+    print("Usage: build_reuse.py restore | build <buildspec> | post_build <buildspec>")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
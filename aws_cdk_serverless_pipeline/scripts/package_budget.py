@@ -0,0 +1,314 @@
+"""Report the code size, layers, runtime, architecture and memory of the functions of the packaged templates,
+and fail on the package budgets.
+
+The script runs in the PackageBudget CodeBuild project. It is embedded in the buildspec at synth, so it uses
+only the standard library, PyYAML (installed by the buildspec) and the AWS CLI of the build image.
+The packaged templates (PACKAGE_BUDGET_TEMPLATES) are read from the build artifacts, in YAML or JSON.
+
+The code size budgets are unzipped sizes, like the Lambda quota of 250 MB. The unzipped size of a function or
+a layer is that of its directory in the sam build output next to the template (PACKAGE_BUDGET_BUILD_DIR), so
+the size budgets are checked only when the build artifacts include it. Otherwise the zipped size of the package
+uploaded by sam package is reported for information, and the unzipped size is reported as unknown.
+A JUnit XML report of the functions is written for the report group of the project.
+"""
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Callable
+from xml.sax.saxutils import escape
+
+import yaml
+
+# Code properties of the function and layer resource types
+FUNCTION_CODE_PROPERTIES = {"AWS::Serverless::Function": "CodeUri", "AWS::Lambda::Function": "Code"}
+LAYER_CODE_PROPERTIES = {"AWS::Serverless::LayerVersion": "ContentUri", "AWS::Lambda::LayerVersion": "Content"}
+# Defaults of Lambda for the properties a template may leave out
+LAMBDA_DEFAULT_MEMORY_MB = 128
+LAMBDA_DEFAULT_ARCHITECTURE = "x86_64"
+# Budgets of the unzipped code sizes
+SIZE_BUDGETS = ["max_code_mb", "max_total_mb"]
+
+
+class TemplateLoader(yaml.SafeLoader):
+    """A YAML loader of CloudFormation templates, which reads the short form of the intrinsic functions."""
+
+
+def _construct_intrinsic(loader: TemplateLoader, tag_suffix: str, node: yaml.Node) -> dict[str, Any]:
+    # !Ref A is {"Ref": "A"}, !GetAtt A.B is {"Fn::GetAtt": ["A", "B"]} and !Sub ... is {"Fn::Sub": ...}
+    name = tag_suffix if tag_suffix in ("Ref", "Condition") else f"Fn::{tag_suffix}"
+    if isinstance(node, yaml.ScalarNode):
+        value: Any = loader.construct_scalar(node)
+        if tag_suffix == "GetAtt":
+            value = value.split(".", 1)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    return {name: value}
+
+
+TemplateLoader.add_multi_constructor("!", _construct_intrinsic)
+
+
+def aws(*args: str) -> dict[str, Any]:
+    result = subprocess.run(["aws", *args, "--output", "json"], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout or "{}")
+
+
+def input_directories(environ: dict[str, str]) -> list[str]:
+    # The primary input is CODEBUILD_SRC_DIR, and the other inputs are CODEBUILD_SRC_DIR_<artifact name>
+    return [environ.get("CODEBUILD_SRC_DIR", ".")] + [
+        value for key, value in sorted(environ.items()) if key.startswith("CODEBUILD_SRC_DIR_")
+    ]
+
+
+def load_template(path: str) -> dict[str, Any]:
+    # A JSON template is also a YAML document
+    with open(path) as file:
+        return yaml.load(file, Loader=TemplateLoader) or {}
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for directory, _, file_names in os.walk(path)
+        for file_name in file_names
+        if not os.path.islink(os.path.join(directory, file_name))
+    )
+
+
+def s3_location(code: Any) -> tuple[str, str] | None:
+    """Return the bucket and key of a packaged code property (s3://bucket/key, or a Bucket and Key mapping)."""
+    if isinstance(code, str) and code.startswith("s3://"):
+        bucket, _, key = code[len("s3://"):].partition("/")
+        return (bucket, key) if key else None
+    if isinstance(code, dict):
+        bucket = code.get("Bucket", code.get("S3Bucket"))
+        key = code.get("Key", code.get("S3Key"))
+        if isinstance(bucket, str) and isinstance(key, str):
+            return bucket, key
+    return None
+
+
+def code_size(
+    logical_id: str,
+    code: Any,
+    build_dir: str,
+    run: Callable[..., dict[str, Any]] = aws,
+) -> tuple[int | None, int | None]:
+    """Return the unzipped size of the build output directory of the resource, or else the zipped size of its package.
+
+    The size that is not measured is None.
+    """
+    directory = os.path.join(build_dir, logical_id)
+    if os.path.isdir(directory):
+        return directory_size(directory), None
+    location = s3_location(code)
+    if location is None:
+        return None, None
+    try:
+        return None, int(run("s3api", "head-object", "--bucket", location[0], "--key", location[1])["ContentLength"])
+    except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as error:
+        print(f"The size of {logical_id} is unavailable: {error}", file=sys.stderr)
+        return None, None
+
+
+def layer_version_size(arn: str, run: Callable[..., dict[str, Any]] = aws) -> tuple[int | None, int | None]:
+    """Return the zipped size of a layer version of another template, whose unzipped size is not published."""
+    try:
+        return None, int(run("lambda", "get-layer-version-by-arn", "--arn", arn)["Content"]["CodeSize"])
+    except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as error:
+        print(f"The size of the layer {arn} is unavailable: {error}", file=sys.stderr)
+        return None, None
+
+
+def _megabytes(size: int | None) -> float | None:
+    return None if size is None else round(size / 1024 / 1024, 2)
+
+
+def analyze_template(
+    template_path: str,
+    build_dir: str = ".aws-sam/build",
+    run: Callable[..., dict[str, Any]] = aws,
+) -> list[dict[str, Any]]:
+    """Return the code size, layers, runtime, architecture and memory of each function of the template.
+
+    The unzipped sizes (code_mb, layer_mb and total_mb) are None unless every part of them is measured unzipped.
+    zipped_mb adds up the zipped sizes of the parts without an unzipped size, and unknown_sizes names those parts.
+    """
+    template = load_template(template_path)
+    resources = template.get("Resources") or {}
+    function_globals = (template.get("Globals") or {}).get("Function") or {}
+    build_dir = os.path.join(os.path.dirname(template_path), build_dir)
+
+    layer_sizes: dict[str, tuple[int | None, int | None]] = {}
+    for logical_id, resource in resources.items():
+        if isinstance(resource, dict) and resource.get("Type") in LAYER_CODE_PROPERTIES:
+            properties = resource.get("Properties") or {}
+            layer_sizes[logical_id] = code_size(
+                logical_id, properties.get(LAYER_CODE_PROPERTIES[resource["Type"]]), build_dir, run=run
+            )
+
+    functions = []
+    for logical_id, resource in resources.items():
+        if not isinstance(resource, dict) or resource.get("Type") not in FUNCTION_CODE_PROPERTIES:
+            continue
+        properties = resource.get("Properties") or {}
+        if resource["Type"] == "AWS::Serverless::Function":
+            properties = {**function_globals, **properties}
+        image = properties.get("PackageType") == "Image"
+
+        # The (name, unzipped size, zipped size) of the layers of the function
+        layers: list[tuple[str, int | None, int | None]] = []
+        for layer in properties.get("Layers") or []:
+            if isinstance(layer, dict) and layer.get("Ref") in layer_sizes:
+                layers.append((layer["Ref"], *layer_sizes[layer["Ref"]]))
+            elif isinstance(layer, str) and layer.startswith("arn:"):
+                layers.append((layer, *layer_version_size(layer, run=run)))
+            else:
+                layers.append((json.dumps(layer), None, None))
+        parts = list(layers)
+        if not image:
+            parts.insert(0, (logical_id, *code_size(
+                logical_id, properties.get(FUNCTION_CODE_PROPERTIES[resource["Type"]]), build_dir, run=run
+            )))
+
+        code = parts[0][1] if not image else 0
+        layer_total = None if any(unzipped is None for _, unzipped, _ in layers) else sum(
+            unzipped for _, unzipped, _ in layers
+        )
+        unknown_parts = [part for part in parts if part[1] is None]
+        memory = properties.get("MemorySize", LAMBDA_DEFAULT_MEMORY_MB)
+        architectures = properties.get("Architectures") or [LAMBDA_DEFAULT_ARCHITECTURE]
+        functions.append({
+            "template": template_path,
+            "function": logical_id,
+            "runtime": "image" if image else properties.get("Runtime"),
+            "architecture": architectures[0] if isinstance(architectures, list) else architectures,
+            # A memory size of a parameter or a condition is not known before the deploy
+            "memory_mb": memory if isinstance(memory, int) else None,
+            "code_mb": None if image else _megabytes(code),
+            "layers": len(layers),
+            "layer_mb": _megabytes(layer_total),
+            "total_mb": None if code is None or layer_total is None else _megabytes(code + layer_total),
+            "zipped_mb": _megabytes(sum(zipped for _, _, zipped in unknown_parts if zipped is not None))
+            if any(zipped is not None for _, _, zipped in unknown_parts) else None,
+            "unknown_sizes": [name for name, _, _ in unknown_parts],
+        })
+    return functions
+
+
+def evaluate(function: dict[str, Any], budgets: dict[str, float | None]) -> list[tuple[str, float | None, str, float | None]]:
+    """Return the (check name, measured value, comparison, budget or None) of each check of a function."""
+    return [
+        ("code_mb", function["code_mb"], ">", budgets.get("max_code_mb")),
+        ("total_mb", function["total_mb"], ">", budgets.get("max_total_mb")),
+        ("layers", function["layers"], ">", budgets.get("max_layers")),
+        ("memory_mb", function["memory_mb"], "<", budgets.get("min_memory_mb")),
+        ("memory_mb", function["memory_mb"], ">", budgets.get("max_memory_mb")),
+    ]
+
+
+def exceeded(checks: list[tuple[str, float | None, str, float | None]]) -> list[str]:
+    failures = []
+    for name, value, comparison, budget in checks:
+        if value is None or budget is None:
+            continue
+        if (comparison == ">" and value > budget) or (comparison == "<" and value < budget):
+            failures.append(f"{name} {value} {comparison} {budget}")
+    return failures
+
+
+def unchecked_sizes(function: dict[str, Any], budgets: dict[str, float | None]) -> str | None:
+    """Return why the size budgets of a function are not checked, or None if they are."""
+    if not function["unknown_sizes"] or not any(budgets.get(budget) is not None for budget in SIZE_BUDGETS):
+        return None
+    zipped = "" if function["zipped_mb"] is None else f" (zipped {function['zipped_mb']} MB)"
+    return (
+        f"the unzipped size of {', '.join(function['unknown_sizes'])} is unknown{zipped}, "
+        f"so {' and '.join(SIZE_BUDGETS)} are not checked"
+    )
+
+
+def junit_report(results: list[tuple[dict[str, Any], list[str], str | None]]) -> str:
+    cases = []
+    for function, failures, unchecked in results:
+        summary = " ".join(f"{key}={function[key]}" for key in [
+            "runtime", "architecture", "memory_mb", "code_mb", "layers", "layer_mb", "total_mb", "zipped_mb",
+        ])
+        case = (
+            f'  <testcase classname="{escape(function["template"])}" name="{escape(function["function"])}" time="0">\n'
+        )
+        if failures:
+            case += f'    <failure message="{escape(", ".join(failures))}">{escape(summary)}</failure>\n'
+        elif unchecked:
+            case += f'    <skipped message="{escape(unchecked)}"/>\n'
+        case += f"    <system-out>{escape(summary)}</system-out>\n  </testcase>\n"
+        cases.append(case)
+    failure_count = sum(1 for _, failures, _ in results if failures)
+    skipped_count = sum(1 for _, failures, unchecked in results if unchecked and not failures)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<testsuite name="PackageBudget" tests="{len(results)}" failures="{failure_count}" skipped="{skipped_count}">\n'
+        + "".join(cases)
+        + "</testsuite>\n"
+    )
+
+
+def format_table(functions: list[dict[str, Any]]) -> str:
+    columns = ["function", "runtime", "architecture", "memory_mb", "code_mb", "layers", "layer_mb", "total_mb", "zipped_mb"]
+    rows = [columns] + [["-" if function[column] is None else str(function[column]) for column in columns] for function in functions]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
+
+
+def _optional_float(value: str | None) -> float | None:
+    return float(value) if value else None
+
+
+def main(environ: dict[str, str] | None = None, run: Callable[..., dict[str, Any]] = aws) -> int:
+    environ = dict(os.environ) if environ is None else environ
+    template_files = environ.get("PACKAGE_BUDGET_TEMPLATES", "packaged.yaml").split()
+    template_paths = [
+        os.path.join(directory, template_file)
+        for directory in input_directories(environ)
+        for template_file in template_files
+        if os.path.isfile(os.path.join(directory, template_file))
+    ]
+    if not template_paths:
+        print(f"No packaged template is found in the build artifacts. Expected: {', '.join(template_files)}")
+        return 1
+
+    budgets = {
+        key: _optional_float(environ.get(f"PACKAGE_BUDGET_{key.upper()}"))
+        for key in ["max_code_mb", "max_total_mb", "max_layers", "min_memory_mb", "max_memory_mb"]
+    }
+    build_dir = environ.get("PACKAGE_BUDGET_BUILD_DIR", ".aws-sam/build")
+    functions = [
+        function
+        for template_path in template_paths
+        for function in analyze_template(template_path, build_dir=build_dir, run=run)
+    ]
+    results = [
+        (function, exceeded(evaluate(function, budgets)), unchecked_sizes(function, budgets))
+        for function in functions
+    ]
+
+    report_path = environ.get("PACKAGE_BUDGET_REPORT", "package-budget-report.xml")
+    with open(report_path, "w") as file:
+        file.write(junit_report(results))
+
+    print(format_table(functions))
+    for function, _, unchecked in results:
+        if unchecked:
+            print(f"{function['function']}: {unchecked}. Include {build_dir} in the build artifacts to check them.")
+    failures = [f"{function['function']} {failure}" for function, function_failures, _ in results for failure in function_failures]
+    if failures:
+        print(f"The package budget failed: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Run a load test against a deployed stack and fail on its latency and error rate thresholds.
+
+The script runs in the PerfGate CodeBuild project. It is embedded in the buildspec at synth, so it uses
+only the standard library. The URL is read from the stack outputs (outputs.json) of the AppDeploymentValues
+input artifacts, and the settings from the PERF_GATE_* environment variables of the project.
+A JUnit XML report of the checks is written for the report group of the project.
+"""
+import glob
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from xml.sax.saxutils import escape
+
+# Name of the stack outputs file of the CloudFormation actions
+OUTPUTS_FILE_NAME = "outputs.json"
+
+
+def load_stack_outputs(directories: list[str]) -> dict[str, str]:
+    """Merge the stack outputs of the input artifact directories."""
+    outputs: dict[str, str] = {}
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, OUTPUTS_FILE_NAME))):
+            with open(path) as file:
+                outputs.update(json.load(file))
+    return outputs
+
+
+def input_directories(environ: dict[str, str]) -> list[str]:
+    # The primary input is CODEBUILD_SRC_DIR, and the other inputs are CODEBUILD_SRC_DIR_<artifact name>
+    return [environ.get("CODEBUILD_SRC_DIR", ".")] + [
+        value for key, value in sorted(environ.items()) if key.startswith("CODEBUILD_SRC_DIR_")
+    ]
+
+
+def request_once(url: str, timeout: float) -> tuple[float, bool]:
+    """Return the latency in milliseconds and whether the request succeeded."""
+    started_at = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            succeeded = 200 <= response.status < 400
+    except urllib.error.HTTPError as error:
+        # The redirects that are not followed are raised too. A 4xx response means the tested path does not work,
+        # so it is an error as well as a 5xx response.
+        succeeded = 300 <= error.code < 400
+    except (urllib.error.URLError, TimeoutError, OSError):
+        succeeded = False
+    return (time.perf_counter() - started_at) * 1000, succeeded
+
+
+def percentile(values: list[float], percent: float) -> float:
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def run_load_test(
+    url: str,
+    requests: int,
+    concurrency: int,
+    timeout: float = 30.0,
+    request: Callable[[str, float], tuple[float, bool]] = request_once,
+) -> dict[str, Any]:
+    """Send the requests and return the latency percentiles and the error rate.
+
+    The first request is sent alone, so its latency is that of a cold start after the deploy.
+    """
+    first_latency, first_succeeded = request(url, timeout)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [(first_latency, first_succeeded)] + list(
+            executor.map(lambda _: request(url, timeout), range(requests - 1))
+        )
+    latencies = [latency for latency, _ in results]
+    return {
+        "requests": len(results),
+        "first_ms": round(first_latency, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "error_rate": round(sum(1 for _, succeeded in results if not succeeded) / len(results), 4),
+    }
+
+
+def evaluate(result: dict[str, Any], thresholds: dict[str, float | None]) -> list[tuple[str, float, float | None]]:
+    """Return the (check name, measured value, threshold or None) of each check of the result."""
+    return [(name, result[name], thresholds.get(name)) for name in ["p95_ms", "p99_ms", "error_rate", "first_ms"]]
+
+
+def junit_report(url: str, checks: list[tuple[str, float, float | None]]) -> str:
+    failures = [check for check in checks if check[2] is not None and check[1] > check[2]]
+    cases = []
+    for name, value, threshold in checks:
+        limit = "not checked" if threshold is None else f"threshold {threshold}"
+        case = f'  <testcase classname="PerfGate" name="{name}" time="0">\n'
+        if threshold is not None and value > threshold:
+            case += f'    <failure message="{name} {value} exceeds {threshold}">{escape(url)}</failure>\n'
+        case += f"    <system-out>{name} {value} ({limit})</system-out>\n  </testcase>\n"
+        cases.append(case)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<testsuite name="PerfGate" tests="{len(checks)}" failures="{len(failures)}">\n'
+        + "".join(cases)
+        + "</testsuite>\n"
+    )
+
+
+def _optional_float(value: str | None) -> float | None:
+    return float(value) if value else None
+
+
+def main(environ: dict[str, str] | None = None) -> int:
+    environ = dict(os.environ) if environ is None else environ
+    outputs = load_stack_outputs(input_directories(environ))
+    url_output = environ["PERF_GATE_URL_OUTPUT"]
+    if url_output not in outputs:
+        print(
+            f"The stack output '{url_output}' to load test is missing. Found: {', '.join(sorted(outputs)) or 'none'}. "
+            "Add the output with the base URL to the template, set urlOutput of the perfGateSettings context "
+            "to one of the outputs, or disable the gate with the perfGate context set to false."
+        )
+        return 1
+    url = outputs[url_output].rstrip("/") + "/" + environ.get("PERF_GATE_PATH", "").lstrip("/")
+
+    result = run_load_test(
+        url,
+        requests=int(environ.get("PERF_GATE_REQUESTS", "200")),
+        concurrency=int(environ.get("PERF_GATE_CONCURRENCY", "10")),
+    )
+    checks = evaluate(result, {
+        "p95_ms": _optional_float(environ.get("PERF_GATE_P95_MS")),
+        "p99_ms": _optional_float(environ.get("PERF_GATE_P99_MS")),
+        "error_rate": _optional_float(environ.get("PERF_GATE_MAX_ERROR_RATE")),
+        "first_ms": _optional_float(environ.get("PERF_GATE_FIRST_REQUEST_MS")),
+    })
+    report_path = environ.get("PERF_GATE_REPORT", "perf-gate-report.xml")
+    with open(report_path, "w") as file:
+        file.write(junit_report(url, checks))
+
+    print(json.dumps({"url": url, **result}))
+    failures = [f"{name} {value} > {threshold}" for name, value, threshold in checks if threshold is not None and value > threshold]
+    if failures:
+        print(f"The performance gate failed: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Print the test files of a shard, balanced by the test durations of the earlier runs.
+
+The script runs in the Test CodeBuild project. It is embedded in the buildspec at synth, so it uses only the
+standard library and the AWS CLI of the build image. The test files matching TEST_SHARD_FILES_GLOB are
+weighted by the durations of their test cases in the latest reports of the TEST_REPORT_GROUP_ARN report group,
+and assigned to TEST_SHARD_COUNT shards, longest first, each to the shard with the least total so far.
+Files without history weigh the mean of the others, so the first runs split the files by count.
+
+Every shard plans independently, so the reports of the current pipeline execution (TEST_PIPELINE_EXECUTION_ID)
+are left out, and the shards of an execution see the same history.
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Callable
+
+# Pipeline executions of history to read, as multiples of the shard count of reports
+HISTORY_RUNS = 3
+# Statuses of the reports whose test cases are complete
+COMPLETE_REPORT_STATUSES = ["SUCCEEDED", "FAILED"]
+
+
+def aws(*args: str) -> dict[str, Any]:
+    result = subprocess.run(["aws", *args, "--output", "json"], check=True, capture_output=True, text=True)
+    return json.loads(result.stdout or "{}")
+
+
+def discover_files(pattern: str) -> list[str]:
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def file_of(prefix: str, files: list[str]) -> str | None:
+    """Return the test file of a test case prefix.
+
+    The prefix is the JUnit classname, a dotted module path (tests.unit.test_app.TestClass) for pytest,
+    or the file path itself for runners configured to report it.
+    """
+    if prefix in files:
+        return prefix
+    matches = []
+    for path in files:
+        module = os.path.splitext(path)[0].replace(os.sep, ".").replace("/", ".")
+        if prefix == module or prefix.startswith(module + "."):
+            matches.append((len(module), path))
+    return max(matches)[1] if matches else None
+
+
+def load_durations(
+    report_group_arn: str,
+    shard_count: int,
+    execution_id: str,
+    files: list[str],
+    run: Callable[..., dict[str, Any]] = aws,
+) -> dict[str, float]:
+    """Return the seconds of the test cases of each file in the latest complete reports of other executions."""
+    report_arns = run(
+        "codebuild", "list-reports-for-report-group",
+        "--report-group-arn", report_group_arn,
+        "--sort-order", "DESCENDING",
+        "--max-results", str(min(shard_count * HISTORY_RUNS, 100)),
+    ).get("reports", [])
+    if not report_arns:
+        return {}
+    reports = [
+        report for report in run("codebuild", "batch-get-reports", "--report-arns", *report_arns).get("reports", [])
+        if report.get("status") in COMPLETE_REPORT_STATUSES
+    ]
+    # The builds of the reports tell the reports of the current execution apart
+    build_ids = sorted({report["executionId"] for report in reports if report.get("executionId")})
+    current_builds = set()
+    if build_ids and execution_id:
+        for build in run("codebuild", "batch-get-builds", "--ids", *build_ids).get("builds", []):
+            variables = {
+                variable.get("name"): variable.get("value")
+                for variable in build.get("environment", {}).get("environmentVariables", [])
+            }
+            if variables.get("TEST_PIPELINE_EXECUTION_ID") == execution_id:
+                current_builds.add(build["arn"])
+
+    durations: dict[str, float] = {}
+    seen_cases: set[tuple[str, str]] = set()
+    # The newest duration of a test case wins
+    for report in sorted(reports, key=lambda report: str(report.get("created", "")), reverse=True):
+        if report.get("executionId") in current_builds:
+            continue
+        for test_case in run("codebuild", "describe-test-cases", "--report-arn", report["arn"]).get("testCases", []):
+            case = (test_case.get("prefix", ""), test_case.get("name", ""))
+            path = file_of(case[0], files)
+            if case in seen_cases or path is None:
+                continue
+            seen_cases.add(case)
+            durations[path] = durations.get(path, 0.0) + test_case.get("durationInNanoSeconds", 0) / 1e9
+    return durations
+
+
+def assign(files: list[str], durations: dict[str, float], shard_count: int) -> list[list[str]]:
+    """Assign the files to the shards, longest first, each to the shard with the least total so far."""
+    default_weight = sum(durations.values()) / len(durations) if durations else 1.0
+    weights = {path: durations.get(path, default_weight) for path in files}
+    shards: list[list[str]] = [[] for _ in range(shard_count)]
+    totals = [0.0] * shard_count
+    for path in sorted(files, key=lambda path: (-weights[path], path)):
+        shard = totals.index(min(totals))
+        shards[shard].append(path)
+        totals[shard] += weights[path]
+    return [sorted(shard) for shard in shards]
+
+
+def main(environ: dict[str, str] | None = None, run: Callable[..., dict[str, Any]] = aws) -> int:
+    environ = dict(os.environ) if environ is None else environ
+    shard_index = int(environ["TEST_SHARD_INDEX"])
+    shard_count = int(environ["TEST_SHARD_COUNT"])
+    files = discover_files(environ["TEST_SHARD_FILES_GLOB"])
+
+    try:
+        durations = load_durations(
+            environ["TEST_REPORT_GROUP_ARN"],
+            shard_count,
+            environ.get("TEST_PIPELINE_EXECUTION_ID", ""),
+            files,
+            run=run,
+        )
+    except (subprocess.CalledProcessError, OSError, ValueError, KeyError) as error:
+        # The tests still run when the history cannot be read, split by file count
+        print(f"The test history is unavailable, the files are split by count: {error}", file=sys.stderr)
+        durations = {}
+
+    shards = assign(files, durations, shard_count)
+    print(
+        f"Shard {shard_index + 1}/{shard_count}: {len(shards[shard_index])} of {len(files)} files, "
+        f"{len(durations)} with history",
+        file=sys.stderr,
+    )
+    print(" ".join(shards[shard_index]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
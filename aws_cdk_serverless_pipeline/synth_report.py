@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from aws_cdk import Stack, cx_api
+
+
+# Environment variable of the path to write the synth report of an app.py run to
+SYNTH_REPORT_ENV = "CDK_SYNTH_REPORT"
+
+# IAM resource types and the properties holding their policy documents
+IAM_POLICY_PROPERTIES = {
+    "AWS::IAM::Role": ["AssumeRolePolicyDocument", "Policies"],
+    "AWS::IAM::Policy": ["PolicyDocument"],
+    "AWS::IAM::ManagedPolicy": ["PolicyDocument"],
+    "AWS::S3::BucketPolicy": ["PolicyDocument"],
+}
+
+
+def _json_bytes(value: Any) -> int:
+    # CloudFormation counts policy sizes without whitespace
+    return len(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def iam_policy_bytes(template: dict[str, Any]) -> int:
+    """Return the total size of the IAM policy documents in a synthesized template."""
+    total = 0
+    for resource in template.get("Resources", {}).values():
+        for property_name in IAM_POLICY_PROPERTIES.get(resource.get("Type"), []):
+            policy = resource.get("Properties", {}).get(property_name)
+            if policy is not None:
+                total += _json_bytes(policy)
+    return total
+
+
+def stack_report(stack: Stack, template: dict[str, Any]) -> dict[str, Any]:
+    """Return the construct count, resource count, IAM role count, template bytes and IAM policy bytes of a stack."""
+    resources = template.get("Resources", {})
+    return {
+        "stack_name": stack.stack_name,
+        "construct_count": len(stack.node.find_all()),
+        "resource_count": len(resources),
+        "iam_role_count": sum(1 for resource in resources.values() if resource.get("Type") == "AWS::IAM::Role"),
+        "template_bytes": _json_bytes(template),
+        "iam_policy_bytes": iam_policy_bytes(template),
+    }
+
+
+def assembly_report(
+    stacks: list[Stack],
+    assembly: cx_api.CloudAssembly,
+    timings: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """Return the report of the stacks of a synthesized cloud assembly.
+
+    timings holds the construction seconds of each stack name and the "synth" seconds of the assembly.
+    """
+    timings = timings or {}
+    stack_reports = []
+    for stack in stacks:
+        report = stack_report(stack, assembly.get_stack_by_name(stack.stack_name).template)
+        if stack.stack_name in timings:
+            report["construct_seconds"] = round(timings[stack.stack_name], 4)
+        stack_reports.append(report)
+
+    report: dict[str, Any] = {
+        "stack_count": len(stack_reports),
+        "construct_count": sum(report["construct_count"] for report in stack_reports),
+        "resource_count": sum(report["resource_count"] for report in stack_reports),
+        "iam_role_count": sum(report["iam_role_count"] for report in stack_reports),
+        "template_bytes": sum(report["template_bytes"] for report in stack_reports),
+        "iam_policy_bytes": sum(report["iam_policy_bytes"] for report in stack_reports),
+        "stacks": stack_reports,
+    }
+    if "synth" in timings:
+        report["synth_seconds"] = round(timings["synth"], 4)
+    return report
+
+
+def write_report(report: dict[str, Any], path: str) -> None:
+    Path(path).write_text(json.dumps(report, indent=2) + "\n")
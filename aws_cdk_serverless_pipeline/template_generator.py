@@ -0,0 +1,181 @@
+"""Generate the CloudFormation templates of cfn_template/ from AwsCdkServerlessPipelineStack.
+
+The variants are listed in a manifest (cfn_template/variants.yaml) with the same keys as the pipelines of
+an app.py manifest, plus the "templateFile" to write. The variants are synthesized in a process pool with the
+context and feature flags of cdk.json, like cdk synth, and a variant is skipped when the hash of its context,
+the package sources, cdk.json and the CDK version is unchanged since its template was written.
+
+Usage:
+    python -m aws_cdk_serverless_pipeline.template_generator [--check] [--force] [--jobs N] [--variants PATH]
+
+With --check, nothing is written and the exit status is 1 if a template differs from the stack.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+from aws_cdk_serverless_pipeline.context import get_manifest_stack_options, load_manifest
+
+
+PACKAGE_DIR = Path(__file__).parent
+DEFAULT_VARIANTS_PATH = str(PACKAGE_DIR.parent / "cfn_template" / "variants.yaml")
+# The app configuration whose context (the feature flags) cdk synth passes to the app
+CDK_JSON_PATH = PACKAGE_DIR.parent / "cdk.json"
+# File next to the variants recording the input and output hashes of each generated template
+CACHE_FILE_NAME = ".template_cache.json"
+
+
+def normalize_template(template: dict[str, Any]) -> str:
+    """Return the template as sorted JSON without the construct path metadata, which is not deployed behavior."""
+    template = {
+        **template,
+        "Resources": {
+            logical_id: {key: value for key, value in resource.items() if key != "Metadata"}
+            for logical_id, resource in template.get("Resources", {}).items()
+        },
+    }
+    return json.dumps(template, indent=2, sort_keys=True) + "\n"
+
+
+def cdk_context() -> dict[str, Any]:
+    """Return the context of cdk.json, which holds the feature flags of the app."""
+    return json.loads(CDK_JSON_PATH.read_text()).get("context", {})
+
+
+def source_hash() -> str:
+    """Return the hash of the package sources, cdk.json and the CDK version, which every template depends on."""
+    digest = hashlib.sha256(version("aws-cdk-lib").encode("utf-8"))
+    digest.update(CDK_JSON_PATH.read_bytes())
+    for path in sorted(PACKAGE_DIR.rglob("*")):
+        if path.is_file() and "__pycache__" not in path.parts:
+            digest.update(str(path.relative_to(PACKAGE_DIR)).encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def variant_hash(stack_options: dict[str, Any], sources: str) -> str:
+    variant = json.dumps(stack_options, sort_keys=True)
+    return hashlib.sha256(f"{sources}\n{variant}".encode("utf-8")).hexdigest()
+
+
+def _output_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def synth_variant(stack_options: dict[str, Any]) -> str:
+    """Synthesize a variant in a worker process and return its normalized template."""
+    # The workers import aws_cdk, so the parent process starts no jsii runtime
+    import aws_cdk as cdk
+
+    from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack
+
+    # The feature flags change the synthesized policies, so the templates are those of cdk synth only with them
+    app = cdk.App(context=cdk_context())
+    stack = AwsCdkServerlessPipelineStack(
+        app,
+        "AwsCdkServerlessPipelineStack",
+        # The templates are deployed with the CloudFormation CLI, so they must not require a bootstrapped account
+        synthesizer=cdk.DefaultStackSynthesizer(generate_bootstrap_version_rule=False),
+        **stack_options,
+    )
+    return normalize_template(app.synth().get_stack_by_name(stack.stack_name).template)
+
+
+def generate(
+    variants_path: str = DEFAULT_VARIANTS_PATH,
+    check: bool = False,
+    force: bool = False,
+    jobs: int | None = None,
+) -> dict[str, list[str]]:
+    """Generate the templates of the variants and return the template files by result.
+
+    The results are "generated" (written, or differing from the stack with check), "unchanged" (synthesized
+    with the same template) and "skipped" (the input hash and the file are unchanged).
+    """
+    variants = load_manifest(variants_path)
+    template_files = [variant.get("templateFile") for variant in variants]
+    if not all(template_files) or len(set(template_files)) != len(template_files):
+        raise ValueError("Every variant must have a unique 'templateFile'.")
+    # Validate every variant up front without the CDK runtime
+    stack_options_list = get_manifest_stack_options(variants)
+
+    output_dir = Path(variants_path).parent
+    cache_path = output_dir / CACHE_FILE_NAME
+    cache: dict[str, dict[str, str]] = json.loads(cache_path.read_text()) if cache_path.exists() else {}
+    sources = source_hash()
+
+    results: dict[str, list[str]] = {"generated": [], "unchanged": [], "skipped": []}
+    pending: dict[str, tuple[dict[str, Any], str]] = {}
+    for template_file, stack_options in zip(template_files, stack_options_list):
+        input_hash = variant_hash(stack_options, sources)
+        template_path = output_dir / template_file
+        cached = cache.get(template_file, {})
+        if (
+            not force
+            and template_path.exists()
+            and cached.get("input") == input_hash
+            and cached.get("output") == _output_hash(template_path.read_text())
+        ):
+            results["skipped"].append(template_file)
+        else:
+            pending[template_file] = (stack_options, input_hash)
+
+    if pending:
+        # Spawned workers do not inherit a jsii runtime that the caller may have started
+        with ProcessPoolExecutor(
+            max_workers=min(jobs or os.cpu_count() or 1, len(pending)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            templates = dict(zip(pending, executor.map(synth_variant, [options for options, _ in pending.values()])))
+
+        for template_file, template in templates.items():
+            template_path = output_dir / template_file
+            if template_path.exists() and template_path.read_text() == template:
+                results["unchanged"].append(template_file)
+            else:
+                results["generated"].append(template_file)
+                if not check:
+                    template_path.write_text(template)
+            cache[template_file] = {"input": pending[template_file][1], "output": _output_hash(template)}
+
+    if not check:
+        cache = {template_file: cache[template_file] for template_file in template_files if template_file in cache}
+        cache_path.write_text(json.dumps(cache, indent=2, sort_keys=True) + "\n")
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", default=DEFAULT_VARIANTS_PATH, help="The manifest of the variants.")
+    parser.add_argument("--check", action="store_true", help="Exit with 1 if a template differs from the stack.")
+    parser.add_argument("--force", action="store_true", help="Synthesize every variant regardless of the hashes.")
+    parser.add_argument("--jobs", type=int, help="Worker processes. (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = generate(args.variants, check=args.check, force=args.force, jobs=args.jobs)
+    except ValueError as error:
+        parser.error(str(error))
+
+    for result, template_files in results.items():
+        for template_file in template_files:
+            label = "drifted" if args.check and result == "generated" else result
+            print(f"{label}: {template_file}", file=sys.stderr)
+    if args.check and results["generated"]:
+        print(
+            "The templates differ from the stack. Run python -m aws_cdk_serverless_pipeline.template_generator to update them.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
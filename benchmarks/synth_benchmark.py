@@ -0,0 +1,146 @@
+"""Benchmark the construction and synthesis of AwsCdkServerlessPipelineStack.
+
+The fleets of N pipelines are synthesized both as N stacks and as one ServerlessPipelineFleetStack
+sharing an artifact bucket and pooled roles, so their resource and IAM role counts can be compared.
+
+Usage:
+    python -m benchmarks.synth_benchmark [--repeat 3] [--fleet-sizes 1 10 50] [--output bench.json]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from importlib.metadata import version
+from typing import Any
+
+import aws_cdk as cdk
+
+from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import (
+    AwsCdkServerlessPipelineStack,
+    ServerlessPipelineFleetStack,
+)
+from aws_cdk_serverless_pipeline.synth_report import assembly_report
+
+
+ENVIRONMENTS = ["dev", "stg", "prd"]
+SOURCE_TYPES = ["github", "codecommit"]
+
+
+def synth_stacks(stack_options_list: list[dict[str, Any]], shared: bool = False) -> dict[str, Any]:
+    """Construct and synthesize the stacks in one app and return their report with timings.
+
+    With shared, the pipelines are synthesized in one ServerlessPipelineFleetStack instead of a stack each.
+    """
+    app = cdk.App()
+    stacks: list[cdk.Stack] = []
+    timings: dict[str, float] = {}
+    if shared:
+        started_at = time.perf_counter()
+        stacks.append(ServerlessPipelineFleetStack(
+            app,
+            "BenchFleetStack",
+            pipelines=[
+                # The fleet stack uses the parameter values as literals
+                {**stack_options, "parameter_defaults": {"RepositoryName": stack_options["application_name"], "BranchName": "main"}}
+                for stack_options in stack_options_list
+            ],
+        ))
+        timings["BenchFleetStack"] = time.perf_counter() - started_at
+    else:
+        for stack_options in stack_options_list:
+            stack_name = f"{stack_options['application_name']}Stack"
+            started_at = time.perf_counter()
+            stacks.append(AwsCdkServerlessPipelineStack(app, stack_name, stack_name=stack_name, **stack_options))
+            timings[stack_name] = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    cloud_assembly = app.synth()
+    timings["synth"] = time.perf_counter() - started_at
+
+    report = assembly_report(stacks, cloud_assembly, timings)
+    report["construct_seconds"] = round(sum(timings[stack.stack_name] for stack in stacks), 4)
+    return report
+
+
+def benchmark_matrix(repeat: int) -> list[dict[str, Any]]:
+    """Benchmark a single stack of each environment and source type."""
+    results = []
+    for environment in ENVIRONMENTS:
+        for source_type in SOURCE_TYPES:
+            reports = [
+                synth_stacks([{
+                    "application_name": "BenchApp",
+                    "environment": environment,
+                    "source_type": source_type,
+                }])
+                for _ in range(repeat)
+            ]
+            stack = reports[-1]["stacks"][0]
+            results.append({
+                "environment": environment,
+                "source_type": source_type,
+                "construct_seconds": round(statistics.median(report["construct_seconds"] for report in reports), 4),
+                "synth_seconds": round(statistics.median(report["synth_seconds"] for report in reports), 4),
+                "construct_count": stack["construct_count"],
+                "resource_count": stack["resource_count"],
+                "template_bytes": stack["template_bytes"],
+                "iam_policy_bytes": stack["iam_policy_bytes"],
+            })
+    return results
+
+
+def benchmark_fleet(fleet_sizes: list[int]) -> list[dict[str, Any]]:
+    """Benchmark fleets of N pipelines synthesized in one app, cycling through the environments and source types.
+
+    Each fleet is synthesized as a stack per pipeline and as one stack of pipelines sharing their resources.
+    """
+    results = []
+    for fleet_size, shared in [(fleet_size, shared) for fleet_size in fleet_sizes for shared in [False, True]]:
+        report = synth_stacks([
+            {
+                "application_name": f"BenchApp{index}",
+                "environment": ENVIRONMENTS[index % len(ENVIRONMENTS)],
+                "source_type": SOURCE_TYPES[index % len(SOURCE_TYPES)],
+            }
+            for index in range(fleet_size)
+        ], shared=shared)
+        results.append({
+            "pipeline_count": fleet_size,
+            "shared": shared,
+            "stack_count": report["stack_count"],
+            "construct_seconds": report["construct_seconds"],
+            "synth_seconds": report["synth_seconds"],
+            "seconds_per_stack": round((report["construct_seconds"] + report["synth_seconds"]) / fleet_size, 4),
+            "construct_count": report["construct_count"],
+            "resource_count": report["resource_count"],
+            "iam_role_count": report["iam_role_count"],
+            "template_bytes": report["template_bytes"],
+            "iam_policy_bytes": report["iam_policy_bytes"],
+        })
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each matrix entry. The median is reported.")
+    parser.add_argument("--fleet-sizes", type=int, nargs="*", default=[1, 10, 50], help="Stack counts of the fleets.")
+    parser.add_argument("--output", help="The path to write the JSON report to. (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "cdk_version": version("aws-cdk-lib"),
+        "matrix": benchmark_matrix(args.repeat),
+        "fleet": benchmark_fleet(args.fleet_sizes),
+    }
+    output = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
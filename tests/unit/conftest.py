@@ -0,0 +1,59 @@
+import json
+from typing import TYPE_CHECKING, Any, Callable
+
+import pytest
+
+# The context tests share this conftest, so aws_cdk is imported only when a template is synthesized
+if TYPE_CHECKING:
+    import aws_cdk.assertions as assertions
+
+
+ENVIRONMENTS = ["dev", "stg", "prd"]
+SOURCE_TYPES = ["github", "codecommit"]
+MATRIX = [(environment, source_type) for environment in ENVIRONMENTS for source_type in SOURCE_TYPES]
+
+# Templates synthesized in this session keyed by their stack options
+_templates: dict[str, "assertions.Template"] = {}
+
+
+def synth_template(**stack_options: Any) -> "assertions.Template":
+    """Return the template of the stack, synthesizing it only once per session for the same stack options."""
+    key = json.dumps(stack_options, sort_keys=True)
+    if key not in _templates:
+        import aws_cdk as core
+        import aws_cdk.assertions as assertions
+
+        from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack
+
+        app = core.App()
+        # The env is given as a dict of the account and region, so it is a part of the key
+        env = stack_options.pop("env", None)
+        stack = AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            env=core.Environment(**env) if env else None,
+            **stack_options,
+        )
+        _templates[key] = assertions.Template.from_stack(stack)
+    return _templates[key]
+
+
+@pytest.fixture(scope="session")
+def template_cache() -> Callable[..., "assertions.Template"]:
+    return synth_template
+
+
+@pytest.fixture(scope="session", params=MATRIX, ids=[f"{environment}-{source_type}" for environment, source_type in MATRIX])
+def matrix_case(request: pytest.FixtureRequest) -> tuple[str, str]:
+    """The environment and source type of each entry of the environment x sourceType matrix."""
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def matrix_template(matrix_case: tuple[str, str]) -> "assertions.Template":
+    environment, source_type = matrix_case
+    return synth_template(
+        application_name="TestApp",
+        environment=environment,
+        source_type=source_type,
+    )
@@ -1,31 +1,45 @@
+import base64
+import json
+import re
+from pathlib import Path
+
+import pytest
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
-from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack
+from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import (
+    BUILD_COMPUTE_TYPES,
+    BUILD_ENVIRONMENT_TYPES,
+    BUILD_FLEET_COMPUTE_TYPES,
+    BUILD_FLEET_OVERFLOW_BEHAVIORS,
+    BUILD_IMAGES,
+    BUILD_LAMBDA_COMPUTE_TYPES,
+    BUILD_LAMBDA_IMAGES,
+    PACKAGE_BUDGET_SCRIPT_PATH,
+    PERF_GATE_SCRIPT_PATH,
+    PIPELINE_EXECUTION_MODES,
+    TEST_SHARD_SCRIPT_PATH,
+    AwsCdkServerlessPipelineStack,
+    ServerlessPipelineFleetStack,
+)
+from aws_cdk_serverless_pipeline.context import (
+    ALLOWED_BUILD_ARCHITECTURES,
+    ALLOWED_BUILD_COMPUTE_SIZES,
+    ALLOWED_BUILD_FLEET_OVERFLOWS,
+    ALLOWED_BUILD_LAMBDA_MEMORIES,
+    ALLOWED_BUILD_LAMBDA_RUNTIMES,
+    ALLOWED_EXECUTION_MODES,
+    get_stack_options,
+)
 
 
-def test_application_bucket_created():
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
-        application_name="TestApp",
-        environment="dev",
-        source_type="codecommit"
-    )
-    template = assertions.Template.from_stack(stack)
+def test_application_bucket_created(matrix_template):
+    template = matrix_template
     template.resource_count_is("AWS::S3::Bucket", 2)  # ApplicationBucket and ArtifactBucketStore
 
 
-def test_artifact_bucket_created():
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
-        application_name="TestApp",
-        environment="dev",
-        source_type="codecommit"
-    )
-    template = assertions.Template.from_stack(stack)
+def test_artifact_bucket_created(matrix_template):
+    template = matrix_template
 
     template.resource_count_is("AWS::S3::Bucket", 2)  # ApplicationBucket and ArtifactBucketStore
     template.has_resource_properties("AWS::S3::Bucket", {
@@ -35,16 +49,8 @@ def test_artifact_bucket_created():
     })
 
 
-def test_codebuild_role_created():
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
-        application_name="TestApp",
-        environment="dev",
-        source_type="codecommit"
-    )
-    template = assertions.Template.from_stack(stack)
+def test_codebuild_role_created(matrix_template):
+    template = matrix_template
 
     template.has_resource_properties("AWS::IAM::Role", {
         "AssumeRolePolicyDocument": {
@@ -62,19 +68,15 @@ def test_codebuild_role_created():
     })
 
 
-def test_codebuild_project_created():
+def test_codebuild_project_created(template_cache):
     application_name = "TestApp"
     environment = "dev"
 
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
+    template = template_cache(
         application_name=application_name,
         environment=environment,
         source_type="codecommit"
     )
-    template = assertions.Template.from_stack(stack)
 
     template.has_resource_properties("AWS::CodeBuild::Project", {
         "Name": f"{application_name}Build",
@@ -107,16 +109,8 @@ def test_codebuild_project_created():
     })
 
 
-def test_codepipeline_role_created():
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
-        application_name="TestApp",
-        environment="dev",
-        source_type="codecommit"
-    )
-    template = assertions.Template.from_stack(stack)
+def test_codepipeline_role_created(matrix_template):
+    template = matrix_template
 
     template.has_resource_properties("AWS::IAM::Role", {
         "AssumeRolePolicyDocument": {
@@ -134,16 +128,8 @@ def test_codepipeline_role_created():
     })
 
 
-def test_cfn_deploy_role_created():
-    app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
-        app,
-        "AwsCdkServerlessPipelineStack",
-        application_name="TestApp",
-        environment="dev",
-        source_type="codecommit"
-    )
-    template = assertions.Template.from_stack(stack)
+def test_cfn_deploy_role_created(matrix_template):
+    template = matrix_template
 
     template.has_resource_properties("AWS::IAM::Role", {
         "AssumeRolePolicyDocument": {
@@ -161,44 +147,1549 @@ def test_cfn_deploy_role_created():
     })
 
 
-def test_pipeline_created():
+def test_pipeline_created(matrix_case, matrix_template):
     application_name = "TestApp"
-    environment = "dev"
+    environment, _ = matrix_case
+
+    template = matrix_template
+
+    stages = [
+        assertions.Match.object_like({"Name": "Source"}),
+        assertions.Match.object_like({"Name": "Build"}),
+        assertions.Match.object_like({"Name": "CfnDeploy"})
+    ]
+    if environment in ["stg", "prd"]:
+        stages.insert(2, assertions.Match.object_like({"Name": "Approval"}))
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Name": f"{application_name}Pipeline",
+        "PipelineType": "V2",
+        "Stages": stages
+    })
+
+
+def test_cloudformation_outputs_created(matrix_template):
+    template = matrix_template
+
+    template.has_output("S3ApplicationBucket", {})
+    template.has_output("CodeBuildRoleArn", {})
+    template.has_output("S3PipelineBucket", {})
+    template.has_output("CodePipelineRoleArn", {})
+    template.has_output("CFNDeployRoleArn", {})
+
+
+@pytest.mark.parametrize("build_privileged, modes", [
+    (False, ["LOCAL_SOURCE_CACHE", "LOCAL_CUSTOM_CACHE"]),
+    (True, ["LOCAL_SOURCE_CACHE", "LOCAL_CUSTOM_CACHE", "LOCAL_DOCKER_LAYER_CACHE"]),
+])
+def test_codebuild_local_cache(template_cache, build_privileged, modes):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_cache_mode="local",
+        build_privileged=build_privileged,
+    )
+
+    # Privileged mode is an opt-in of its own, and only it caches the docker layers
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Cache": {
+            "Type": "LOCAL",
+            "Modes": modes
+        },
+        "Environment": assertions.Match.object_like({
+            "PrivilegedMode": build_privileged
+        })
+    })
+
+
+def test_codebuild_s3_cache_in_application_bucket(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_cache_mode="s3",
+    )
+
+    template.resource_count_is("AWS::S3::Bucket", 2)  # ApplicationBucket and ArtifactBucketStore
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Cache": {
+            "Type": "S3",
+            "Location": {
+                "Fn::Join": ["/", [
+                    {"Ref": assertions.Match.string_like_regexp("ApplicationBucket")},
+                    "codebuild-cache"
+                ]]
+            }
+        }
+    })
+    # The cache grants the project role access to the bucket, so the role policy has no statement of its own for it
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({
+                    "Action": assertions.Match.array_with(["s3:GetObject*", "s3:PutObject"]),
+                    "Resource": assertions.Match.array_with([
+                        {"Fn::Join": ["", [
+                            {"Fn::GetAtt": [assertions.Match.string_like_regexp("ApplicationBucket"), "Arn"]},
+                            "/*"
+                        ]]}
+                    ])
+                })
+            ])
+        }
+    })
+    iam_policies = json.dumps([template.find_resources("AWS::IAM::Role"), template.find_resources("AWS::IAM::Policy")])
+    assert "codebuild-cache" not in iam_policies
+
+
+def test_codebuild_s3_cache_in_dedicated_bucket(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_cache_mode="s3",
+        build_cache_dedicated_bucket=True,
+    )
+
+    template.resource_count_is("AWS::S3::Bucket", 3)  # ApplicationBucket, ArtifactBucketStore and BuildCacheBucket
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Cache": {
+            "Type": "S3",
+            "Location": {
+                "Fn::Join": ["/", [
+                    {"Ref": assertions.Match.string_like_regexp("BuildCacheBucket")},
+                    "codebuild-cache"
+                ]]
+            }
+        }
+    })
+    template.has_output("S3BuildCacheBucket", {})
+
+
+def test_codebuild_arm_compute_profile(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="prd",
+        source_type="codecommit",
+        build_compute_size="large",
+        build_architecture="arm64",
+        build_timeout_minutes=30,
+    )
+
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Environment": assertions.Match.object_like({
+            "ComputeType": "BUILD_GENERAL1_LARGE",
+            "Image": "aws/codebuild/amazonlinux2-aarch64-standard:3.0",
+            "Type": "ARM_CONTAINER"
+        }),
+        "TimeoutInMinutes": 30
+    })
+
+
+def test_codebuild_reserved_capacity_fleet(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_fleet_capacity=2,
+        build_fleet_overflow="on-demand",
+    )
+
+    template.has_resource_properties("AWS::CodeBuild::Fleet", {
+        "Name": "TestAppBuildFleet",
+        "BaseCapacity": 2,
+        "ComputeType": "BUILD_GENERAL1_SMALL",
+        "EnvironmentType": "LINUX_CONTAINER",
+        "FleetOverflowBehavior": "ON_DEMAND"
+    })
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Environment": assertions.Match.object_like({
+            "Fleet": {
+                "FleetArn": {"Fn::GetAtt": [assertions.Match.string_like_regexp("BuildFleet"), "Arn"]}
+            }
+        })
+    })
+    template.has_output("CodeBuildFleetArn", {})
+
 
+def test_codebuild_lambda_compute(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_compute_mode="lambda",
+        build_lambda_memory=4096,
+        build_architecture="arm64",
+    )
+
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Environment": assertions.Match.object_like({
+            "ComputeType": "BUILD_LAMBDA_4GB",
+            "Image": "aws/codebuild/amazonlinux-aarch64-lambda-standard:python3.12",
+            "Type": "ARM_LAMBDA_CONTAINER"
+        }),
+        "TimeoutInMinutes": assertions.Match.absent()
+    })
+
+
+def test_codebuild_lambda_compute_rejects_local_cache():
     app = core.App()
-    stack = AwsCdkServerlessPipelineStack(
+    with pytest.raises(ValueError, match="is not supported by the lambda build_compute_mode"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            build_compute_mode="lambda",
+            build_cache_mode="local",
+        )
+
+
+def test_codebuild_arm_compute_rejects_unsupported_size():
+    app = core.App()
+    with pytest.raises(ValueError, match="Invalid build_compute_size 'medium' for the arm64 architecture"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="stg",
+            source_type="codecommit",
+            build_compute_size="medium",
+            build_architecture="arm64",
+        )
+
+
+def test_lookup_tables_cover_allowed_values():
+    # The options are validated against the allowed values of the context, and the stack looks up their CDK values
+    assert list(BUILD_COMPUTE_TYPES) == ALLOWED_BUILD_COMPUTE_SIZES
+    assert list(BUILD_FLEET_COMPUTE_TYPES) == ALLOWED_BUILD_COMPUTE_SIZES
+    assert list(BUILD_FLEET_OVERFLOW_BEHAVIORS) == ALLOWED_BUILD_FLEET_OVERFLOWS
+    assert list(BUILD_ENVIRONMENT_TYPES) == ALLOWED_BUILD_ARCHITECTURES
+    assert list(BUILD_IMAGES) == ALLOWED_BUILD_ARCHITECTURES
+    assert list(BUILD_LAMBDA_COMPUTE_TYPES) == ALLOWED_BUILD_LAMBDA_MEMORIES
+    assert list(BUILD_LAMBDA_IMAGES) == ALLOWED_BUILD_LAMBDA_RUNTIMES
+    assert all(list(images) == ALLOWED_BUILD_ARCHITECTURES for images in BUILD_LAMBDA_IMAGES.values())
+    assert list(PIPELINE_EXECUTION_MODES) == ALLOWED_EXECUTION_MODES
+
+
+@pytest.mark.parametrize("stack_options, message", [
+    ({"build_timeout_minutes": 3}, "Invalid build_timeout_minutes '3'"),
+    ({"application_name": "testApp"}, "must be in PascalCase format"),
+    ({"deploy_stacks": [{"name": "Api", "template_file": "api.yaml", "depends_on": "Db"}]}, "Invalid depends_on of the deploy stack 'Api'"),
+])
+def test_stack_options_are_validated_by_the_context_rules(stack_options, message):
+    # The stack and the context share validate_pipeline_options
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            **{"application_name": "TestApp", "environment": "dev", "source_type": "codecommit", **stack_options},
+        )
+
+
+def test_parallel_build_targets(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_targets=[
+            {"name": "Orders", "path": "services/orders", "buildspec": "services/orders/buildspec.yml"},
+            {"name": "Users", "path": "services/users", "buildspec": "services/users/buildspec.yml"},
+        ],
+    )
+
+    template.resource_count_is("AWS::CodeBuild::Project", 2)
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Name": "TestAppBuildOrders",
+        "Source": {
+            "BuildSpec": "services/orders/buildspec.yml",
+            "Type": "CODEPIPELINE"
+        }
+    })
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "Build",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Name": "CodeBuildOrders",
+                        "OutputArtifacts": [{"Name": "CompiledCFNTemplateOrders"}],
+                        "RunOrder": 1
+                    }),
+                    assertions.Match.object_like({
+                        "Name": "CodeBuildUsers",
+                        "OutputArtifacts": [{"Name": "CompiledCFNTemplateUsers"}],
+                        "RunOrder": 1
+                    })
+                ]
+            }),
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "Actions": assertions.Match.array_with([
+                    assertions.Match.object_like({
+                        "Name": "CreateReplaceChangeSetOrders",
+                        "Configuration": assertions.Match.object_like({"StackName": "TestAppOrdersBetaStack"}),
+                        "InputArtifacts": [{"Name": "CompiledCFNTemplateOrders"}],
+                        "RunOrder": 1
+                    }),
+                    assertions.Match.object_like({
+                        "Name": "CreateReplaceChangeSetUsers",
+                        "Configuration": assertions.Match.object_like({"StackName": "TestAppUsersBetaStack"}),
+                        "InputArtifacts": [{"Name": "CompiledCFNTemplateUsers"}],
+                        "RunOrder": 1
+                    })
+                ])
+            })
+        ])
+    })
+
+
+def test_batch_build_targets(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_targets=[
+            {"name": "Orders", "path": "services/orders", "buildspec": "services/orders/buildspec.yml"},
+            {"name": "Users", "path": "services/users", "buildspec": "services/users/buildspec.yml"},
+        ],
+        build_fan_out="batch",
+    )
+
+    template.resource_count_is("AWS::CodeBuild::Project", 1)
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Name": "TestAppBuild",
+        "BuildBatchConfig": assertions.Match.object_like({
+            "ServiceRole": assertions.Match.any_value()
+        }),
+        "Source": {
+            "BuildSpec": assertions.Match.string_like_regexp("\"identifier\": \"Orders\""),
+            "Type": "CODEPIPELINE"
+        }
+    })
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "Build",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Name": "CodeBuild",
+                        "Configuration": assertions.Match.object_like({
+                            "BatchEnabled": "true",
+                            "CombineArtifacts": "true"
+                        })
+                    })
+                ]
+            })
+        ])
+    })
+
+
+def test_pipeline_trigger_filters(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="github",
+        trigger_filters={
+            "branches_includes": ["main", "release/*"],
+            "file_paths_excludes": ["docs/**", "**/*.md"],
+            "tags_includes": ["v*"],
+        },
+    )
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Triggers": [
+            {
+                "GitConfiguration": {
+                    "Push": [
+                        {
+                            "Branches": {"Includes": ["main", "release/*"]},
+                            "FilePaths": {"Excludes": ["docs/**", "**/*.md"]}
+                        },
+                        {
+                            "Tags": {"Includes": ["v*"]}
+                        }
+                    ],
+                    "SourceActionName": "GitHubSource"
+                },
+                "ProviderType": "CodeStarSourceConnection"
+            }
+        ]
+    })
+
+
+def test_pipeline_trigger_filters_default_to_source_branch(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="github",
+        trigger_filters={"file_paths_includes": ["src/**"]},
+    )
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Triggers": [
+            assertions.Match.object_like({
+                "GitConfiguration": assertions.Match.object_like({
+                    "Push": [
+                        {
+                            "Branches": {"Includes": [{"Ref": "BranchName"}]},
+                            "FilePaths": {"Includes": ["src/**"]}
+                        }
+                    ]
+                })
+            })
+        ]
+    })
+
+
+def test_pipeline_trigger_tag_filters_keep_source_branch(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="github",
+        trigger_filters={"tags_includes": ["v*"]},
+    )
+
+    # The pushes to the source branch still start the pipeline besides the tags
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Triggers": [
+            assertions.Match.object_like({
+                "GitConfiguration": assertions.Match.object_like({
+                    "Push": [
+                        {"Branches": {"Includes": [{"Ref": "BranchName"}]}},
+                        {"Tags": {"Includes": ["v*"]}}
+                    ]
+                })
+            })
+        ]
+    })
+
+
+def test_pipeline_trigger_filters_reject_codecommit():
+    app = core.App()
+    with pytest.raises(ValueError, match="trigger_filters is supported only by the github source type"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            trigger_filters={"branches_includes": ["main"]},
+        )
+
+
+def test_pipeline_execution_mode(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        execution_mode="SUPERSEDED",
+    )
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "ExecutionMode": "SUPERSEDED"
+    })
+
+
+def test_parameter_defaults(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        parameter_defaults={"RepositoryName": "test-repo", "BranchName": "main"},
+    )
+
+    template.has_parameter("RepositoryName", {"Type": "String", "Default": "test-repo"})
+    template.has_parameter("BranchName", {"Type": "String", "Default": "main"})
+    template.has_parameter("TemplateFileName", {"Type": "String", "Default": "packaged.yaml"})
+
+
+@pytest.mark.parametrize("environment, action_names", [
+    ("dev", ["CreateUpdateStack", "RecordTemplateHash"]),
+    ("stg", ["CreateReplaceChangeSet", "ExecuteChangeSet"]),
+    ("prd", ["CreateReplaceChangeSet", "ExecuteChangeSet"]),
+])
+def test_cfn_deploy_actions_per_environment(template_cache, environment, action_names):
+    template = template_cache(**get_stack_options({
+        "applicationName": "TestApp",
+        "environment": environment,
+        "sourceType": "codecommit",
+    }.get))
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "Actions": [
+                    assertions.Match.object_like({"Name": action_name})
+                    for action_name in action_names
+                ]
+            })
+        ])
+    })
+
+
+def test_cfn_direct_deploy(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deploy_mode="direct",
+    )
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Name": "CreateUpdateStack",
+                        "ActionTypeId": assertions.Match.object_like({"Provider": "CloudFormation"}),
+                        "Configuration": assertions.Match.object_like({
+                            "ActionMode": "CREATE_UPDATE",
+                            "StackName": "TestAppBetaStack",
+                            "Capabilities": "CAPABILITY_IAM",
+                            "OutputFileName": "outputs.json",
+                        }),
+                        "OutputArtifacts": [{"Name": "AppDeploymentValues"}],
+                        "RunOrder": 1,
+                    })
+                ]
+            })
+        ])
+    })
+
+
+def test_cfn_direct_deploy_rejects_prd():
+    app = core.App()
+    with pytest.raises(ValueError, match="The deploy_mode 'direct' is supported only by the dev environment, not 'prd'"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="prd",
+            source_type="codecommit",
+            deploy_mode="direct",
+        )
+
+
+def test_promotion_environments(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deploy_mode="direct",
+        promotion_environments=["dev", "stg", "prd"],
+    )
+
+    # The build runs once without the ENV variable
+    template.resource_count_is("AWS::CodeBuild::Project", 1)
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Environment": assertions.Match.object_like({
+            "EnvironmentVariables": [
+                assertions.Match.object_like({"Name": "APP_S3_BUCKET"})
+            ]
+        })
+    })
+
+    def deploy_stage(stage_suffix, action_name, action_mode):
+        return assertions.Match.object_like({
+            "Name": f"CfnDeploy{stage_suffix}",
+            "Actions": assertions.Match.array_with([
+                assertions.Match.object_like({
+                    "Name": action_name,
+                    "InputArtifacts": [{"Name": "CompiledCFNTemplate"}],
+                    "Configuration": assertions.Match.object_like({
+                        "ActionMode": action_mode,
+                        "StackName": f"TestApp{stage_suffix}Stack",
+                        "ParameterOverrides": f'{{"Environment":"{stage_suffix.lower()}"}}',
+                    }),
+                })
+            ])
+        })
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": [
+            assertions.Match.object_like({"Name": "Source"}),
+            assertions.Match.object_like({"Name": "Build"}),
+            deploy_stage("Dev", "CreateUpdateStack", "CREATE_UPDATE"),
+            assertions.Match.object_like({"Name": "ApprovalStg"}),
+            deploy_stage("Stg", "CreateReplaceChangeSet", "CHANGE_SET_REPLACE"),
+            assertions.Match.object_like({"Name": "ApprovalPrd"}),
+            deploy_stage("Prd", "CreateReplaceChangeSet", "CHANGE_SET_REPLACE"),
+        ]
+    })
+
+
+def test_promotion_environments_reject_unordered():
+    app = core.App()
+    with pytest.raises(ValueError, match="two or more unique environments in the order dev, stg, prd"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            promotion_environments=["stg", "dev"],
+        )
+
+
+DEPLOYMENT_TARGETS = [
+    {"region": "us-east-1", "wave": 1},
+    {"region": "eu-west-1", "wave": 1},
+    {"account": "222222222222", "region": "ap-northeast-1", "wave": 2,
+     "role_arn": "arn:aws:iam::222222222222:role/DeployRole"},
+]
+
+
+def test_deployment_target_waves(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="prd",
+        source_type="codecommit",
+        deployment_targets=DEPLOYMENT_TARGETS,
+        env={"account": "111111111111", "region": "ap-northeast-1"},
+    )
+
+    def change_set_actions(label, region, run_order):
+        return [
+            assertions.Match.object_like({
+                "Name": f"{action_name}-{label}",
+                "Region": region,
+                "RunOrder": run_order + offset,
+            })
+            for offset, action_name in enumerate(["CreateReplaceChangeSet", "ExecuteChangeSet"])
+        ]
+
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": [
+            assertions.Match.object_like({"Name": "Source"}),
+            assertions.Match.object_like({"Name": "Build"}),
+            assertions.Match.object_like({"Name": "Approval"}),
+            assertions.Match.object_like({
+                "Name": "CfnDeployWave1",
+                "Actions": [
+                    *change_set_actions("us-east-1", "us-east-1", 1),
+                    *change_set_actions("eu-west-1", "eu-west-1", 1),
+                ]
+            }),
+            assertions.Match.object_like({
+                "Name": "CfnDeployWave2",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Name": "CreateReplaceChangeSet-222222222222-ap-northeast-1",
+                        "Region": "ap-northeast-1",
+                        "RoleArn": "arn:aws:iam::222222222222:role/DeployRole",
+                        "Configuration": assertions.Match.object_like({
+                            "RoleArn": "arn:aws:iam::222222222222:role/DeployRole",
+                        }),
+                    }),
+                    assertions.Match.object_like({
+                        "Name": "ExecuteChangeSet-222222222222-ap-northeast-1",
+                        "RoleArn": "arn:aws:iam::222222222222:role/DeployRole",
+                    }),
+                ]
+            }),
+        ]
+    })
+
+    # The cross-account target reads the artifacts encrypted with a customer managed key
+    template.resource_count_is("AWS::KMS::Key", 1)
+    template.has_output("S3PipelineBucketKeyArn", {})
+    template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": [
+            assertions.Match.object_like({
+                "PolicyName": "DeployAccess",
+                "PolicyDocument": assertions.Match.object_like({
+                    "Statement": [
+                        assertions.Match.object_like({
+                            "Resource": assertions.Match.array_with([
+                                "arn:aws:cloudformation:us-east-1:111111111111:stack/TestApp*",
+                                "arn:aws:cloudformation:eu-west-1:111111111111:stack/TestApp*",
+                            ])
+                        })
+                    ]
+                })
+            })
+        ]
+    })
+
+
+def test_deployment_targets_grant_custom_stack_names_per_region(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="prd",
+        source_type="codecommit",
+        deployment_targets=DEPLOYMENT_TARGETS,
+        deploy_stacks=[{"name": "Api", "template_file": "api.yaml", "stack_name": "SharedApi"}],
+        env={"account": "111111111111", "region": "ap-northeast-1"},
+    )
+
+    [deploy_role] = [
+        role for role in template.find_resources("AWS::IAM::Role").values()
+        if role["Properties"].get("Policies", [{}])[0].get("PolicyName") == "DeployAccess"
+    ]
+    resources = deploy_role["Properties"]["Policies"][0]["PolicyDocument"]["Statement"][0]["Resource"]
+    # The custom stack name is deployed in the region of each target of the pipeline account, not the pipeline region
+    assert [resource for resource in resources if "SharedApi" in resource] == [
+        "arn:aws:cloudformation:us-east-1:111111111111:stack/SharedApi*",
+        "arn:aws:cloudformation:eu-west-1:111111111111:stack/SharedApi*",
+    ]
+
+
+def test_deployment_targets_create_replication_buckets():
+    app = core.App()
+    AwsCdkServerlessPipelineStack(
         app,
         "AwsCdkServerlessPipelineStack",
-        application_name=application_name,
-        environment=environment,
-        source_type="codecommit"
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deployment_targets=DEPLOYMENT_TARGETS[:2],
+        env=core.Environment(account="111111111111", region="ap-northeast-1"),
     )
-    template = assertions.Template.from_stack(stack)
 
+    support_stack_names = sorted(
+        stack.stack_name for stack in app.synth().stacks if stack.stack_name != "AwsCdkServerlessPipelineStack"
+    )
+    assert support_stack_names == [
+        "AwsCdkServerlessPipelineStack-support-eu-west-1",
+        "AwsCdkServerlessPipelineStack-support-us-east-1",
+    ]
+
+
+@pytest.mark.parametrize("deployment_targets, env, message", [
+    (DEPLOYMENT_TARGETS[:1], None, "requires the account and region of the stack env"),
+    ([{**DEPLOYMENT_TARGETS[2], "role_arn": None}], core.Environment(account="111111111111", region="ap-northeast-1"),
+     "account '222222222222' requires role_arn"),
+    ([DEPLOYMENT_TARGETS[0], DEPLOYMENT_TARGETS[0]], core.Environment(account="111111111111", region="ap-northeast-1"),
+     "'us-east-1' is duplicated"),
+])
+def test_deployment_targets_invalid(deployment_targets, env, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            deployment_targets=deployment_targets,
+            env=env,
+        )
+
+
+def test_deploy_stacks_follow_dependencies(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deploy_stacks=[
+            {"name": "Network", "template_file": "network.yaml"},
+            {"name": "Database", "template_file": "database.yaml", "depends_on": ["Network"]},
+            {"name": "Queue", "template_file": "queue.yaml"},
+            {"name": "Api", "template_file": "api.yaml", "stack_name": "TestAppApi", "depends_on": ["Database", "Queue"]},
+        ],
+    )
+
+    def change_set_actions(name, stack_name, template_file, layer):
+        return [
+            assertions.Match.object_like({
+                "Name": f"CreateReplaceChangeSet{name}",
+                "Configuration": assertions.Match.object_like({
+                    "StackName": stack_name,
+                    "TemplatePath": f"CompiledCFNTemplate::{template_file}",
+                }),
+                "RunOrder": layer * 2 + 1,
+            }),
+            assertions.Match.object_like({
+                "Name": f"ExecuteChangeSet{name}",
+                "Configuration": assertions.Match.object_like({"StackName": stack_name}),
+                "RunOrder": layer * 2 + 2,
+            }),
+        ]
+
+    # Network and Queue are independent, Database waits for Network, and Api for Database and Queue
     template.has_resource_properties("AWS::CodePipeline::Pipeline", {
-        "Name": f"{application_name}Pipeline",
-        "PipelineType": "V2",
         "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "Actions": [
+                    *change_set_actions("Network", "TestAppNetworkBetaStack", "network.yaml", 0),
+                    *change_set_actions("Database", "TestAppDatabaseBetaStack", "database.yaml", 1),
+                    *change_set_actions("Queue", "TestAppQueueBetaStack", "queue.yaml", 0),
+                    *change_set_actions("Api", "TestAppApi", "api.yaml", 2),
+                ]
+            })
+        ])
+    })
+
+
+@pytest.mark.parametrize("deploy_stacks, message", [
+    ([{"name": "Api", "template_file": "api.yaml", "depends_on": ["Db"]}], "depends on unknown stacks: Db"),
+    (
+        [
+            {"name": "Api", "template_file": "api.yaml", "depends_on": ["Worker"]},
+            {"name": "Worker", "template_file": "worker.yaml", "depends_on": ["Api"]},
+            {"name": "Network", "template_file": "network.yaml"},
+        ],
+        "dependency cycle: Api, Worker",
+    ),
+])
+def test_deploy_stacks_invalid(deploy_stacks, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            deploy_stacks=deploy_stacks,
+        )
+
+
+def test_deploy_skip_unchanged(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deploy_skip_unchanged=True,
+    )
+
+    template.has_resource_properties("AWS::SSM::Parameter", {
+        "Name": "/TestAppPipeline/DeployedTemplateHash",
+        "Value": "none",
+    })
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": [
             assertions.Match.object_like({"Name": "Source"}),
-            assertions.Match.object_like({"Name": "Build"}),
-            assertions.Match.object_like({"Name": "CfnDeploy"})
+            assertions.Match.object_like({
+                "Name": "Build",
+                "Actions": [
+                    assertions.Match.object_like({"Name": "CodeBuild", "RunOrder": 1}),
+                    assertions.Match.object_like({
+                        "Name": "TemplateHash",
+                        "ActionTypeId": assertions.Match.object_like({"Provider": "Commands"}),
+                        "InputArtifacts": [{"Name": "CompiledCFNTemplate"}],
+                        "Namespace": "TemplateHash",
+                        "OutputVariables": ["TEMPLATE_HASH", "TEMPLATE_CHANGED"],
+                        "RunOrder": 2,
+                    }),
+                ]
+            }),
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "BeforeEntry": {
+                    "Conditions": [
+                        {
+                            "Result": "SKIP",
+                            "Rules": [
+                                assertions.Match.object_like({
+                                    "Name": "TemplateChanged",
+                                    "RuleTypeId": assertions.Match.object_like({"Provider": "VariableCheck"}),
+                                    "Configuration": {
+                                        "Variable": "#{TemplateHash.TEMPLATE_CHANGED}",
+                                        "Value": "true",
+                                        "Operator": "EQ",
+                                    },
+                                })
+                            ]
+                        }
+                    ]
+                },
+                "Actions": [
+                    assertions.Match.object_like({"Name": "CreateReplaceChangeSet", "RunOrder": 1}),
+                    assertions.Match.object_like({"Name": "ExecuteChangeSet", "RunOrder": 2}),
+                    assertions.Match.object_like({"Name": "RecordTemplateHash", "RunOrder": 3}),
+                ]
+            }),
+        ]
+    })
+    template.has_output("DeployedTemplateHashParameter", {})
+
+
+def test_deploy_skip_unchanged_rejects_promotion():
+    app = core.App()
+    with pytest.raises(ValueError, match="deploy_skip_unchanged cannot be combined with promotion_environments"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            promotion_environments=["dev", "stg"],
+            deploy_skip_unchanged=True,
+        )
+
+
+def test_build_reuse(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_reuse=True,
+        build_reuse_retention_days=7,
+    )
+
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {
+            "Rules": [
+                {"ExpirationInDays": 7, "Prefix": "build-reuse/", "Status": "Enabled"}
+            ]
+        }
+    })
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Environment": assertions.Match.object_like({
+            "EnvironmentVariables": assertions.Match.array_with([
+                assertions.Match.object_like({"Name": "BUILD_CONFIG_HASH", "Value": assertions.Match.string_like_regexp("^[0-9a-f]{16}$")}),
+                assertions.Match.object_like({"Name": "BUILD_REUSE_URI"}),
+            ])
+        })
+    })
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "Name": "Source",
+                "Actions": [assertions.Match.object_like({"Namespace": "Source_CodeCommitSource_NS"})]
+            }),
+            assertions.Match.object_like({
+                "Name": "Build",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Configuration": assertions.Match.object_like({
+                            "EnvironmentVariables": '[{"name":"SOURCE_COMMIT_ID","type":"PLAINTEXT","value":"#{Source_CodeCommitSource_NS.CommitId}"}]'
+                        })
+                    })
+                ]
+            }),
         ])
     })
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyName": "CodeBuildPolicy",
+        "PolicyDocument": {
+            "Statement": assertions.Match.array_with([
+                assertions.Match.object_like({
+                    "Action": "s3:ListBucket",
+                    "Condition": {"StringLike": {"s3:prefix": ["build-reuse/*"]}},
+                })
+            ])
+        }
+    })
+
+    # The outputs are restored and stored around the phase commands of buildspec.yml, which needs no edit for it
+    [project] = [
+        project for project in template.find_resources("AWS::CodeBuild::Project").values()
+        if project["Properties"]["Name"] == "TestAppBuild"
+    ]
+    build_spec = json.loads(project["Properties"]["Source"]["BuildSpec"])
+    assert build_spec["phases"]["pre_build"]["commands"][-2:] == [
+        "python3 .build-reuse/build_reuse.py restore",
+        "export BUILD_REUSE_RESTORED=$(cat .build-reuse/restored)",
+    ]
+    assert build_spec["phases"]["build"]["commands"] == ["python3 .build-reuse/build_reuse.py build buildspec.yml"]
+    assert build_spec["phases"]["post_build"]["commands"] == [
+        "python3 .build-reuse/build_reuse.py post_build buildspec.yml"
+    ]
+    assert build_spec["artifacts"] == {"base-directory": ".build-reuse/output", "files": ["**/*"]}
 
 
-def test_cloudformation_outputs_created():
+def test_build_reuse_of_parallel_build_targets(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_reuse=True,
+        build_targets=[{"name": "Api", "path": "api", "buildspec": "api/buildspec.yml"}],
+    )
+
+    [project] = template.find_resources("AWS::CodeBuild::Project").values()
+    assert json.loads(project["Properties"]["Source"]["BuildSpec"])["phases"]["build"]["commands"] == [
+        "python3 .build-reuse/build_reuse.py build api/buildspec.yml"
+    ]
+    # Each build target stores its outputs in a directory of its own
+    assert {"Name": "BUILD_REUSE_TARGET", "Type": "PLAINTEXT", "Value": "Api"} in (
+        project["Properties"]["Environment"]["EnvironmentVariables"]
+    )
+
+
+@pytest.mark.parametrize("stack_options, message", [
+    (
+        {"build_targets": [{"name": "Api", "path": "api", "buildspec": "api/buildspec.yml"}], "build_fan_out": "batch"},
+        "build_reuse cannot be combined with the batch build_fan_out",
+    ),
+    ({"build_compute_mode": "lambda", "build_lambda_runtime": "nodejs20"}, "build_reuse requires a python build_lambda_runtime"),
+])
+def test_build_reuse_invalid(stack_options, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            build_reuse=True,
+            **stack_options,
+        )
+
+
+def test_pipeline_monitoring(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="stg",
+        source_type="codecommit",
+        pipeline_monitoring=True,
+    )
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "TestAppPipelineMetrics",
+        "Handler": "index.handler",
+        "Environment": {"Variables": {"METRICS_NAMESPACE": "ServerlessPipeline"}},
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": {
+            "source": ["aws.codepipeline"],
+            "detail-type": [
+                "CodePipeline Pipeline Execution State Change",
+                "CodePipeline Stage Execution State Change",
+                "CodePipeline Action Execution State Change",
+            ],
+            "detail": {"pipeline": ["TestAppPipeline"], "state": ["SUCCEEDED", "FAILED"]},
+        },
+    })
+    template.has_resource_properties("AWS::CloudWatch::Dashboard", {
+        "DashboardName": "TestAppPipelineDashboard",
+    })
+
+    # The Build and CfnDeploy stages are alarmed, the Source and Approval stages are not
+    template.resource_count_is("AWS::CloudWatch::Alarm", 2)
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "ComparisonOperator": "GreaterThanUpperThreshold",
+        "ThresholdMetricId": "band",
+        "Metrics": [
+            assertions.Match.object_like({
+                "Id": "duration",
+                "MetricStat": assertions.Match.object_like({
+                    "Metric": {
+                        "Namespace": "ServerlessPipeline",
+                        "MetricName": "StageDuration",
+                        "Dimensions": [
+                            {"Name": "PipelineName", "Value": "TestAppPipeline"},
+                            {"Name": "StageName", "Value": "Build"},
+                        ],
+                    },
+                    "Stat": "p95",
+                }),
+            }),
+            assertions.Match.object_like({"Id": "band", "Expression": "ANOMALY_DETECTION_BAND(duration, 2)"}),
+        ],
+    })
+    template.has_output("PipelineDashboardName", {})
+    template.has_output("PipelineMetricsFunctionArn", {})
+
+
+def test_perf_gate(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="stg",
+        source_type="codecommit",
+        perf_gate=True,
+        perf_gate_settings={"url_output": "HelloWorldApi", "p95_ms": 500},
+    )
+
+    template.has_resource_properties("AWS::CodeBuild::ReportGroup", {
+        "Name": "TestAppPerfGate",
+        "Type": "TEST",
+    })
+    template.has_resource_properties("AWS::CodeBuild::Project", {
+        "Name": "TestAppPerfGate",
+        "Environment": assertions.Match.object_like({
+            "ComputeType": "BUILD_GENERAL1_SMALL",
+            "EnvironmentVariables": assertions.Match.array_with([
+                {"Name": "PERF_GATE_URL_OUTPUT", "Type": "PLAINTEXT", "Value": "HelloWorldApi"},
+                {"Name": "PERF_GATE_P95_MS", "Type": "PLAINTEXT", "Value": "500"},
+                {"Name": "PERF_GATE_P99_MS", "Type": "PLAINTEXT", "Value": "2000"},
+            ]),
+        }),
+    })
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Stages": [
+            assertions.Match.object_like({"Name": "Source"}),
+            assertions.Match.object_like({"Name": "Build"}),
+            assertions.Match.object_like({"Name": "Approval"}),
+            assertions.Match.object_like({
+                "Name": "CfnDeploy",
+                "Actions": [
+                    assertions.Match.object_like({"Name": "CreateReplaceChangeSet"}),
+                    assertions.Match.object_like({
+                        "Name": "ExecuteChangeSet",
+                        "Configuration": assertions.Match.object_like({"OutputFileName": "outputs.json"}),
+                        "OutputArtifacts": [{"Name": "AppDeploymentValues"}],
+                    }),
+                ]
+            }),
+            assertions.Match.object_like({
+                "Name": "PerfGate",
+                "Actions": [
+                    assertions.Match.object_like({
+                        "Name": "LoadTest",
+                        "ActionTypeId": assertions.Match.object_like({"Provider": "CodeBuild"}),
+                        "InputArtifacts": [{"Name": "AppDeploymentValues"}],
+                    }),
+                ]
+            }),
+        ]
+    })
+    template.has_output("PerfGateReportGroupArn", {})
+
+    # The buildspec embeds the load test runner of this package
+    project = next(
+        resource for resource in template.find_resources("AWS::CodeBuild::Project").values()
+        if resource["Properties"]["Name"] == "TestAppPerfGate"
+    )
+    build_spec = "".join(part for part in project["Properties"]["Source"]["BuildSpec"]["Fn::Join"][1] if isinstance(part, str))
+    encoded_script = re.search(r"echo ([A-Za-z0-9+/=]+) \| base64 -d > perf_gate.py", build_spec).group(1)
+    assert base64.b64decode(encoded_script).decode("utf-8") == Path(PERF_GATE_SCRIPT_PATH).read_text()
+    assert '"file-format": "JUNITXML"' in build_spec
+
+
+def test_perf_gate_follows_each_promotion_stage(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        promotion_environments=["stg", "prd"],
+        perf_gate=True,
+    )
+
+    pipeline = next(iter(template.find_resources("AWS::CodePipeline::Pipeline").values()))
+    stages = pipeline["Properties"]["Stages"]
+    assert [stage["Name"] for stage in stages] == [
+        "Source", "Build", "ApprovalStg", "CfnDeployStg", "PerfGateStg", "ApprovalPrd", "CfnDeployPrd", "PerfGatePrd",
+    ]
+    assert stages[4]["Actions"][0]["InputArtifacts"] == [{"Name": "AppDeploymentValuesStg"}]
+
+
+def test_perf_gate_follows_selected_promotion_stages(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        promotion_environments=["dev", "stg", "prd"],
+        perf_gate=True,
+        perf_gate_environments=["stg", "prd"],
+    )
+
+    pipeline = next(iter(template.find_resources("AWS::CodePipeline::Pipeline").values()))
+    assert [stage["Name"] for stage in pipeline["Properties"]["Stages"]] == [
+        "Source", "Build", "CfnDeployDev",
+        "ApprovalStg", "CfnDeployStg", "PerfGateStg", "ApprovalPrd", "CfnDeployPrd", "PerfGatePrd",
+    ]
+
+
+def test_perf_gate_is_skipped_with_unchanged_deploy(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        deploy_mode="direct",
+        deploy_skip_unchanged=True,
+        perf_gate=True,
+    )
+
+    pipeline = next(iter(template.find_resources("AWS::CodePipeline::Pipeline").values()))
+    stages = {stage["Name"]: stage for stage in pipeline["Properties"]["Stages"]}
+    assert stages["PerfGate"]["BeforeEntry"] == stages["CfnDeploy"]["BeforeEntry"]
+    assert stages["PerfGate"]["Actions"][0]["InputArtifacts"] == [{"Name": "AppDeploymentValues"}]
+
+
+@pytest.mark.parametrize("stack_options, message", [
+    ({"perf_gate_settings": {"threshold": 1}}, "Invalid perf_gate_settings keys 'threshold'"),
+    (
+        {"deploy_stacks": [{"name": f"Stack{index}", "template_file": f"stack{index}.yaml"} for index in range(6)]},
+        "perf_gate supports up to 5 deployed stacks, not 6",
+    ),
+    ({"perf_gate_environments": ["prd"]}, "perf_gate_environments must be a subset of promotion_environments"),
+])
+def test_perf_gate_invalid(stack_options, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="stg",
+            source_type="codecommit",
+            perf_gate=True,
+            **stack_options,
+        )
+
+
+def test_bucket_lifecycle_rules(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        build_reuse=True,
+        artifact_bucket_lifecycle={"noncurrent_expiration_days": 30, "abort_multipart_days": 7, "intelligent_tiering_days": 0},
+        application_bucket_lifecycle={"abort_multipart_days": 3, "intelligent_tiering_days": 30},
+    )
+
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "VersioningConfiguration": {"Status": "Enabled"},
+        "LifecycleConfiguration": {
+            "Rules": [
+                {
+                    "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 7},
+                    "NoncurrentVersionExpiration": {"NoncurrentDays": 30},
+                    "Status": "Enabled",
+                    "Transitions": [{"StorageClass": "INTELLIGENT_TIERING", "TransitionInDays": 0}],
+                }
+            ]
+        },
+    })
+    # The build reuse rule is kept next to the configured rule
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {
+            "Rules": [
+                {
+                    "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 3},
+                    "Status": "Enabled",
+                    "Transitions": [{"StorageClass": "INTELLIGENT_TIERING", "TransitionInDays": 30}],
+                },
+                {"ExpirationInDays": 14, "Prefix": "build-reuse/", "Status": "Enabled"},
+            ]
+        },
+    })
+
+
+def test_artifact_bucket_kms_uses_bucket_key(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        artifact_bucket_kms=True,
+    )
+
+    template.resource_count_is("AWS::KMS::Key", 1)
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "BucketEncryption": {
+            "ServerSideEncryptionConfiguration": [
+                {
+                    "BucketKeyEnabled": True,
+                    "ServerSideEncryptionByDefault": {
+                        "KMSMasterKeyID": {"Fn::GetAtt": [assertions.Match.string_like_regexp("ArtifactBucketKey"), "Arn"]},
+                        "SSEAlgorithm": "aws:kms",
+                    },
+                }
+            ]
+        },
+        "VersioningConfiguration": {"Status": "Enabled"},
+    })
+
+
+@pytest.mark.parametrize("stack_options, message", [
+    ({"artifact_bucket_lifecycle": {"noncurrent_days": 30}}, "Invalid artifact_bucket_lifecycle keys 'noncurrent_days'"),
+    ({"application_bucket_lifecycle": {"expiration_days": 30}}, "Invalid application_bucket_lifecycle keys 'expiration_days'"),
+    ({"artifact_bucket_lifecycle": {"abort_multipart_days": 0}}, "Invalid artifact_bucket_lifecycle abort_multipart_days '0'"),
+])
+def test_bucket_lifecycle_invalid(stack_options, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            **stack_options,
+        )
+
+
+def test_test_shards(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        test_shards=3,
+    )
+    template_json = template.to_json()
+
+    pipeline = list(template.find_resources("AWS::CodePipeline::Pipeline").values())[0]
+    stages = pipeline["Properties"]["Stages"]
+    assert [stage["Name"] for stage in stages][:2] == ["Source", "Build"]
+    build_actions = stages[1]["Actions"]
+    assert [action["Name"] for action in build_actions] == ["CodeBuild", "TestShard1", "TestShard2", "TestShard3"]
+    test_actions = build_actions[1:]
+    # One project runs every shard, and the shards test in parallel with the build
+    assert len({json.dumps(action["Configuration"]["ProjectName"]) for action in test_actions}) == 1
+    assert {action["RunOrder"] for action in build_actions} == {1}
+    assert json.loads(test_actions[2]["Configuration"]["EnvironmentVariables"]) == [
+        {"name": "TEST_SHARD_INDEX", "type": "PLAINTEXT", "value": "2"},
+        {"name": "TEST_SHARD_COUNT", "type": "PLAINTEXT", "value": "3"},
+        {"name": "TEST_PIPELINE_EXECUTION_ID", "type": "PLAINTEXT", "value": "#{codepipeline.PipelineExecutionId}"},
+    ]
+
+    template.has_resource_properties("AWS::CodeBuild::ReportGroup", {
+        "Name": "TestAppTest",
+        "Type": "TEST",
+    })
+    test_project = [
+        resource for resource in template.find_resources("AWS::CodeBuild::Project").values()
+        if resource["Properties"].get("Name") == "TestAppTest"
+    ][0]
+    # The buildspec embeds the shard planner of this package, and reports to the report group
+    build_spec = "".join(part for part in test_project["Properties"]["Source"]["BuildSpec"]["Fn::Join"][1] if isinstance(part, str))
+    encoded_script = re.search(r"echo ([A-Za-z0-9+/=]+) \| base64 -d > test_shards.py", build_spec).group(1)
+    assert base64.b64decode(encoded_script).decode("utf-8") == Path(TEST_SHARD_SCRIPT_PATH).read_text()
+    assert "python -m pytest --junitxml=test-report.xml $TEST_SHARD_FILES" in build_spec
+    assert '"file-format": "JUNITXML"' in build_spec
+    template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": [
+            {
+                "PolicyName": "TestAccess",
+                "PolicyDocument": {
+                    "Statement": assertions.Match.array_with([
+                        assertions.Match.object_like({
+                            "Action": assertions.Match.array_with(["codebuild:DescribeTestCases"]),
+                            "Resource": {"Fn::GetAtt": [assertions.Match.string_like_regexp("^TestReportGroup"), "Arn"]},
+                        }),
+                    ]),
+                },
+            }
+        ],
+    })
+    assert "TestReportGroupArn" in template_json["Outputs"]
+
+
+@pytest.mark.parametrize("stack_options, message", [
+    ({"test_shards": 51}, "Invalid test_shards '51'"),
+    (
+        {"test_shards": 49, "package_budget": True, "deploy_skip_unchanged": True},
+        "The Build stage has 52 actions with test_shards 49",
+    ),
+    ({"test_shards": 2, "build_compute_mode": "lambda"}, "test_shards is not supported by the lambda build_compute_mode"),
+    ({"test_shards": 2, "test_shard_settings": {"timeout": "10"}}, "Invalid test_shard_settings keys 'timeout'"),
+])
+def test_test_shards_invalid(stack_options, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            **stack_options,
+        )
+
+
+def test_package_budget(template_cache):
+    template = template_cache(
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit",
+        package_budget=True,
+        package_budget_settings={"max_code_mb": 20, "min_memory_mb": 512},
+    )
+
+    pipeline = list(template.find_resources("AWS::CodePipeline::Pipeline").values())[0]
+    build_stage = next(stage for stage in pipeline["Properties"]["Stages"] if stage["Name"] == "Build")
+    # The budget checks the build artifacts after the build
+    assert [(action["Name"], action["RunOrder"]) for action in build_stage["Actions"]] == [
+        ("CodeBuild", 1),
+        ("PackageBudget", 2),
+    ]
+    package_budget_action = build_stage["Actions"][1]
+    assert [artifact["Name"] for artifact in package_budget_action["InputArtifacts"]] == ["CompiledCFNTemplate"]
+    # The analyzer reads the packaged template of the TemplateFileName parameter
+    assert package_budget_action["Configuration"]["EnvironmentVariables"] == {"Fn::Join": ["", [
+        '[{"name":"PACKAGE_BUDGET_TEMPLATES","type":"PLAINTEXT","value":"',
+        {"Ref": "TemplateFileName"},
+        '"}]',
+    ]]}
+
+    project = next(
+        resource for resource in template.find_resources("AWS::CodeBuild::Project").values()
+        if resource["Properties"]["Name"] == "TestAppPackageBudget"
+    )
+    assert {
+        variable["Name"]: variable["Value"] for variable in project["Properties"]["Environment"]["EnvironmentVariables"]
+    } == {
+        "PACKAGE_BUDGET_BUILD_DIR": ".aws-sam/build",
+        "PACKAGE_BUDGET_MAX_CODE_MB": "20",
+        "PACKAGE_BUDGET_MAX_TOTAL_MB": "250",
+        "PACKAGE_BUDGET_MAX_LAYERS": "5",
+        "PACKAGE_BUDGET_MIN_MEMORY_MB": "512",
+    }
+    # The buildspec embeds the analyzer of this package
+    build_spec = "".join(part for part in project["Properties"]["Source"]["BuildSpec"]["Fn::Join"][1] if isinstance(part, str))
+    encoded_script = re.search(r"echo ([A-Za-z0-9+/=]+) \| base64 -d > package_budget.py", build_spec).group(1)
+    assert base64.b64decode(encoded_script).decode("utf-8") == Path(PACKAGE_BUDGET_SCRIPT_PATH).read_text()
+    assert "pip3 install --quiet PyYAML" in build_spec
+    assert '"file-format": "JUNITXML"' in build_spec
+
+    template.has_resource_properties("AWS::CodeBuild::ReportGroup", {
+        "Name": "TestAppPackageBudget",
+        "Type": "TEST",
+    })
+    template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": [
+            {
+                "PolicyName": "PackageBudgetAccess",
+                "PolicyDocument": {
+                    "Statement": assertions.Match.array_with([
+                        assertions.Match.object_like({
+                            "Action": "s3:GetObject",
+                            "Resource": {"Fn::Join": ["", [
+                                {"Fn::GetAtt": [assertions.Match.string_like_regexp("^ApplicationBucket"), "Arn"]},
+                                "/*",
+                            ]]},
+                        }),
+                    ]),
+                },
+            }
+        ],
+    })
+    template.has_output("PackageBudgetReportGroupArn", {})
+
+
+def test_package_budget_reads_every_build_target():
     app = core.App()
     stack = AwsCdkServerlessPipelineStack(
         app,
         "AwsCdkServerlessPipelineStack",
         application_name="TestApp",
         environment="dev",
-        source_type="codecommit"
+        source_type="codecommit",
+        build_targets=[
+            {"name": "Api", "path": "services/api", "buildspec": "services/api/buildspec.yml"},
+            {"name": "Worker", "path": "services/worker", "buildspec": "services/worker/buildspec.yml"},
+        ],
+        package_budget=True,
     )
     template = assertions.Template.from_stack(stack)
 
-    template.has_output("S3ApplicationBucket", {})
-    template.has_output("CodeBuildRoleArn", {})
-    template.has_output("S3PipelineBucket", {})
-    template.has_output("CodePipelineRoleArn", {})
-    template.has_output("CFNDeployRoleArn", {})
+    pipeline = list(template.find_resources("AWS::CodePipeline::Pipeline").values())[0]
+    build_stage = next(stage for stage in pipeline["Properties"]["Stages"] if stage["Name"] == "Build")
+    package_budget_action = next(action for action in build_stage["Actions"] if action["Name"] == "PackageBudget")
+    assert [artifact["Name"] for artifact in package_budget_action["InputArtifacts"]] == [
+        "CompiledCFNTemplateApi",
+        "CompiledCFNTemplateWorker",
+    ]
+
+
+def test_package_budget_invalid_settings():
+    app = core.App()
+    with pytest.raises(ValueError, match="Invalid package_budget_settings keys 'max_zip_mb'"):
+        AwsCdkServerlessPipelineStack(
+            app,
+            "AwsCdkServerlessPipelineStack",
+            application_name="TestApp",
+            environment="dev",
+            source_type="codecommit",
+            package_budget=True,
+            package_budget_settings={"max_zip_mb": 10},
+        )
+
+
+def _fleet_pipelines(count: int) -> list[dict]:
+    return [
+        {
+            "application_name": f"TestApp{index}",
+            "environment": ["dev", "stg", "prd"][index % 3],
+            "source_type": ["github", "codecommit"][index % 2],
+            "parameter_defaults": {"RepositoryName": f"test-app-{index}", "BranchName": "main"},
+        }
+        for index in range(count)
+    ]
+
+
+def _role_policy_bytes(template_json: dict) -> dict[str, int]:
+    # The inline policies of a role and the policies attached to it share the IAM quota of the role
+    policy_bytes: dict[str, int] = {}
+    for logical_id, resource in template_json["Resources"].items():
+        if resource["Type"] == "AWS::IAM::Role":
+            policy_bytes[logical_id] = policy_bytes.get(logical_id, 0) + sum(
+                len(json.dumps(policy["PolicyDocument"], separators=(",", ":")))
+                for policy in resource["Properties"].get("Policies", [])
+            )
+        elif resource["Type"] == "AWS::IAM::Policy":
+            for role in resource["Properties"]["Roles"]:
+                policy_bytes[role["Ref"]] = policy_bytes.get(role["Ref"], 0) + len(
+                    json.dumps(resource["Properties"]["PolicyDocument"], separators=(",", ":"))
+                )
+    return policy_bytes
+
+
+def test_fleet_stack_shares_artifact_bucket_and_roles():
+    app = core.App()
+    stack = ServerlessPipelineFleetStack(app, "FleetStack", pipelines=_fleet_pipelines(7))
+    template = assertions.Template.from_stack(stack)
+    template_json = template.to_json()
+
+    template.resource_count_is("AWS::CodePipeline::Pipeline", 7)
+    template.resource_count_is("AWS::S3::Bucket", 8)  # ArtifactBucketStore and an ApplicationBucket per pipeline
+    template.has_resource_properties("AWS::CodePipeline::Pipeline", {
+        "Name": "TestApp6Pipeline",
+        "ArtifactStore": {"Location": {"Ref": assertions.Match.string_like_regexp("^SharedResourcesArtifactBucketStore")}},
+        # The sixth and seventh pipelines share the roles of the second role set
+        "RoleArn": {"Fn::GetAtt": [assertions.Match.string_like_regexp("^SharedResourcesRoleSet2CodePipelineRole"), "Arn"]},
+    })
+    roles = template.find_resources("AWS::IAM::Role")
+    assert all(logical_id.startswith("SharedResourcesRoleSet") for logical_id in roles)
+    assert len([logical_id for logical_id in roles if "CodePipelineRole" in logical_id]) == 2
+    assert max(_role_policy_bytes(template_json).values()) < 10240
+    # The parameter values are literals, and the pipelines have no outputs
+    assert [name for name in template_json.get("Parameters", {}) if name != "BootstrapVersion"] == []
+    assert "Outputs" not in template_json
+    # The shared source action role has the statements of each CodeCommit pipeline of its role set
+    template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "PolicyName": "SourceAccess",
+                "PolicyDocument": {
+                    "Statement": assertions.Match.array_with([
+                        assertions.Match.object_like({
+                            "Resource": {"Fn::Join": ["", assertions.Match.array_with([":test-app-3"])]},
+                        }),
+                    ]),
+                },
+            }),
+        ]),
+    })
+
+
+def test_fleet_stack_without_shared_resources():
+    app = core.App()
+    stack = ServerlessPipelineFleetStack(app, "FleetStack", pipelines=_fleet_pipelines(2), share_resources=False)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::S3::Bucket", 4)
+    assert not [logical_id for logical_id in template.find_resources("AWS::IAM::Role") if logical_id.startswith("Shared")]
+
+
+@pytest.mark.parametrize("fleet_options, pipeline_options, message", [
+    ({"pipelines_per_role_set": 0}, {}, "Unsupported pipelines_per_role_set: 0"),
+    ({}, {"artifact_bucket_kms": True}, "are set by the shared_resources"),
+    ({}, {"parameter_defaults": {"RepositoryName": "test-app"}}, "parameter_values requires: BranchName"),
+    (
+        {},
+        {"deployment_targets": [{"account": "222222222222", "region": "us-east-1", "role_arn": "arn:aws:iam::222222222222:role/Deploy"}]},
+        "require shared_resources with artifact_bucket_kms",
+    ),
+])
+def test_fleet_stack_invalid(fleet_options, pipeline_options, message):
+    app = core.App()
+    with pytest.raises(ValueError, match=message):
+        ServerlessPipelineFleetStack(
+            app,
+            "FleetStack",
+            env=core.Environment(account="111111111111", region="us-east-1"),
+            pipelines=[{**_fleet_pipelines(1)[0], **pipeline_options}],
+            **fleet_options,
+        )
@@ -0,0 +1,178 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+
+SCRIPT_PATH = Path(__file__).parents[2] / "aws_cdk_serverless_pipeline" / "scripts" / "build_reuse.py"
+
+ENVIRON = {
+    "BUILD_REUSE_URI": "s3://app-bucket/build-reuse/0123456789abcdef",
+    "SOURCE_COMMIT_ID": "f00dbabe",
+    "CODEBUILD_BUILD_SUCCEEDING": "1",
+    "BUILD_REUSE_RESTORED": "false",
+}
+REUSE_URI = "s3://app-bucket/build-reuse/0123456789abcdef/f00dbabe"
+
+BUILDSPEC = """\
+version: 0.2
+env:
+  variables:
+    GREETING: hello world
+phases:
+  build:
+    commands:
+      - mkdir -p out/nested
+      - echo "$GREETING $ENV" > out/packaged.yaml
+      - |
+        if [ -n "$GREETING" ]; then
+          echo layer > out/nested/layer.txt
+        fi
+      - export PACKAGED_BY=sam
+      - cd out
+  post_build:
+    commands:
+      - echo "$PACKAGED_BY" > nested/post_build.txt
+      - echo ignored > ../ignored.txt
+artifacts:
+  base-directory: out
+  files:
+    - packaged.yaml
+    - nested/**/*
+"""
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("build_reuse", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeS3:
+    """Answer the aws s3 commands of the script, with the stored objects of the reuse URI."""
+
+    def __init__(self, stored_keys=(), succeed=True):
+        self.stored_keys = set(stored_keys)
+        self.succeed = succeed
+        self.calls = []
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        if args[0] == "ls":
+            return args[1].removeprefix(f"{REUSE_URI}/") in self.stored_keys
+        return self.succeed
+
+
+@pytest.mark.parametrize("environ, uri", [
+    (ENVIRON, REUSE_URI),
+    ({**ENVIRON, "BUILD_REUSE_TARGET": "Api"}, f"{REUSE_URI}/Api"),
+    ({**ENVIRON, "SOURCE_COMMIT_ID": ""}, None),
+])
+def test_reuse_uri(environ, uri):
+    assert load_script().reuse_uri(environ) == uri
+
+
+def test_restore(tmp_path, monkeypatch, capsys):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+    fake_s3 = FakeS3(stored_keys=[".complete"])
+
+    assert build_reuse.main(["restore"], ENVIRON, run=fake_s3) == 0
+
+    assert fake_s3.calls[1] == ("cp", "--recursive", f"{REUSE_URI}/", ".build-reuse/output", "--exclude", ".complete")
+    assert (tmp_path / ".build-reuse" / "restored").read_text() == "true"
+    assert f"Reused the build outputs of {REUSE_URI}." in capsys.readouterr().out
+    # The buildspec exports the flag, so the restored outputs are not built or stored again
+    environ = {**ENVIRON, "BUILD_REUSE_RESTORED": "true"}
+    assert build_reuse.main(["build", "buildspec.yml"], environ) == 0
+    assert build_reuse.main(["post_build", "buildspec.yml"], environ, run=fake_s3) == 0
+    assert len(fake_s3.calls) == 2
+
+
+@pytest.mark.parametrize("fake_s3", [FakeS3(), FakeS3(stored_keys=[".complete"], succeed=False)])
+def test_restore_falls_back_to_build(tmp_path, monkeypatch, fake_s3):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+
+    # Outputs without the complete marker, or a failed download, are not reused
+    assert build_reuse.main(["restore"], ENVIRON, run=fake_s3) == 0
+    assert (tmp_path / ".build-reuse" / "restored").read_text() == "false"
+    assert os.path.isdir(".build-reuse/output")
+
+
+def test_build_and_store(tmp_path, monkeypatch):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "buildspec.yml").write_text(BUILDSPEC)
+    fake_s3 = FakeS3()
+    environ = {**os.environ, **ENVIRON, "ENV": "dev"}
+
+    assert build_reuse.main(["restore"], ENVIRON, run=fake_s3) == 0
+    assert build_reuse.main(["build", "buildspec.yml"], environ) == 0
+    # The exported variables and the working directory of the build carry over to post_build
+    assert build_reuse.main(["post_build", "buildspec.yml"], environ, run=fake_s3) == 0
+
+    output_dir = tmp_path / ".build-reuse" / "output"
+    assert (output_dir / "packaged.yaml").read_text() == "hello world dev\n"
+    assert (output_dir / "nested" / "layer.txt").read_text() == "layer\n"
+    assert (output_dir / "nested" / "post_build.txt").read_text() == "sam\n"
+    assert not (output_dir / "ignored.txt").exists()
+    # The complete marker is stored after the outputs
+    assert fake_s3.calls[-2:] == [
+        ("cp", "--recursive", ".build-reuse/output", f"{REUSE_URI}/"),
+        ("cp", ".build-reuse/.complete", f"{REUSE_URI}/.complete"),
+    ]
+
+
+@pytest.mark.parametrize("failing_phase, post_build_runs", [("pre_build", False), ("build", True)])
+def test_failed_build(tmp_path, monkeypatch, failing_phase, post_build_runs):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "buildspec.yml").write_text(
+        f"phases:\n  {failing_phase}:\n    commands:\n      - exit 3\n      - touch skipped.txt\n"
+        "  post_build:\n    commands:\n      - touch post_build.txt\n"
+        "artifacts:\n  files: [out.txt]\n"
+    )
+    fake_s3 = FakeS3()
+
+    assert build_reuse.main(["restore"], ENVIRON, run=fake_s3) == 0
+    assert build_reuse.main(["build", "buildspec.yml"], dict(os.environ)) == 3
+    assert not (tmp_path / "skipped.txt").exists()
+    # Like CodeBuild, post_build runs after a failed build phase, but not after a failed pre_build phase
+    environ = {**os.environ, **ENVIRON, "CODEBUILD_BUILD_SUCCEEDING": "0"}
+    assert build_reuse.main(["post_build", "buildspec.yml"], environ, run=fake_s3) == 0
+    assert (tmp_path / "post_build.txt").exists() == post_build_runs
+    # The outputs of a failed build are not stored
+    assert len(fake_s3.calls) == 1
+
+
+@pytest.mark.parametrize("buildspec, message", [
+    ("env:\n  parameter-store:\n    TOKEN: /token\nphases:\n  build:\n    finally:\n      - 'true'\nartifacts:\n  files: [out.txt]\n",
+     "The keys env.parameter-store, phases.build.finally of buildspec.yml are not supported with buildReuse."),
+    ("phases:\n  install:\n    runtime-versions:\n      python: 3.12\n    on-failure: CONTINUE\nartifacts:\n  files: [out.txt]\n",
+     "The keys phases.install.runtime-versions, phases.install.on-failure of buildspec.yml are not supported"),
+    ("phases:\n  build:\n    commands: ['true']\nartifacts:\n  files: [out.txt]\n  name: app\n"
+     "cache:\n  paths: ['.aws-sam/**/*']\nreports:\n  unit: {files: [report.xml]}\nsecondary-artifacts: {}\n",
+     "The keys cache, reports, secondary-artifacts, artifacts.name of buildspec.yml are not supported"),
+    ("phases:\n  build:\n    commands:\n      - 'true'\n", "buildspec.yml has no artifacts files to reuse."),
+])
+def test_unsupported_buildspec(tmp_path, monkeypatch, capsys, buildspec, message):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "buildspec.yml").write_text(buildspec)
+
+    assert build_reuse.main(["build", "buildspec.yml"], dict(os.environ)) == 1
+    assert message in capsys.readouterr().out
+
+
+def test_missing_artifacts(tmp_path, monkeypatch, capsys):
+    build_reuse = load_script()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "buildspec.yml").write_text("phases:\n  build:\n    commands:\n      - 'true'\nartifacts:\n  files: [out.txt]\n")
+
+    assert build_reuse.main(["restore"], ENVIRON, run=FakeS3()) == 0
+    assert build_reuse.main(["build", "buildspec.yml"], dict(os.environ)) == 0
+    assert build_reuse.main(["post_build", "buildspec.yml"], {**os.environ, **ENVIRON}) == 1
+    assert "No artifact files of buildspec.yml are found. Expected: out.txt" in capsys.readouterr().out
@@ -0,0 +1,335 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from aws_cdk_serverless_pipeline.context import (
+    get_manifest_stack_options,
+    get_stack_options,
+    load_manifest,
+    read_context,
+)
+
+
+REQUIRED_CONTEXT = {
+    "applicationName": "TestApp",
+    "environment": "dev",
+    "sourceType": "codecommit",
+}
+
+
+@pytest.mark.parametrize("module", ["aws_cdk_serverless_pipeline.context", "tests.unit.conftest"])
+def test_context_tests_do_not_import_aws_cdk(module):
+    # The conftest is shared with these tests, so it must not import aws_cdk either
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print('aws_cdk' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+def test_missing_contexts():
+    with pytest.raises(ValueError, match="required but missing: applicationName, environment, sourceType"):
+        get_stack_options({}.get)
+
+
+@pytest.mark.parametrize("key, value, message", [
+    ("applicationName", "testApp", "must be in PascalCase format"),
+    ("environment", "qa", "Invalid environment 'qa'"),
+    ("sourceType", "bitbucket", "Invalid sourceType 'bitbucket'"),
+    ("buildCacheMode", "efs", "Invalid buildCacheMode 'efs'"),
+    ("buildComputeSize", "huge", "Invalid buildComputeSize 'huge'"),
+    ("buildArchitecture", "riscv", "Invalid buildArchitecture 'riscv'"),
+    ("buildTimeoutMinutes", "3", "Invalid buildTimeoutMinutes '3'"),
+    ("buildFleetOverflow", "drop", "Invalid buildFleetOverflow 'drop'"),
+    ("buildLambdaMemory", "3072", "Invalid buildLambdaMemory '3072'"),
+    ("executionMode", "RANDOM", "Invalid executionMode 'RANDOM'"),
+    ("triggerFilters", {"branches": ["main"]}, "Invalid triggerFilters keys 'branches'"),
+    ("deployMode", "sync", "Invalid deployMode 'sync'"),
+    ("promotionEnvironments", "dev,qa", "Invalid promotionEnvironments 'qa'"),
+    ("promotionEnvironments", "prd,stg", "in the order dev, stg, prd"),
+    ("promotionParameterName", "Env-Name", "Invalid promotionParameterName 'Env-Name'"),
+    ("deploymentTargets", [{"region": "us-east-1", "stage": "beta"}], "Invalid deploymentTargets keys 'stage'"),
+    ("deploymentTargets", [{"region": "us-east-1", "wave": 0}], "Invalid deployment target wave '0'"),
+    ("buildReuseRetentionDays", "0", "Invalid buildReuseRetentionDays '0'"),
+    ("deployStacks", [{"name": "Api", "templateFile": "api.yaml", "dependsOn": ["Db"]}], "The deploy stack 'Api' depends on unknown stacks: Db"),
+    ("perfGateSettings", {"p90Ms": 100}, "Invalid perfGateSettings keys 'p90Ms'"),
+    ("perfGateSettings", '{"requests": 10.5}', "Invalid perfGateSettings requests '10.5'"),
+    ("perfGateSettings", {"maxErrorRate": 5}, "Invalid perfGateSettings maxErrorRate '5'"),
+    ("testShards", "51", "Invalid testShards '51'"),
+    ("testShards", "-1", "Invalid testShards '-1'"),
+    ("testShardSettings", {"timeout": "10"}, "Invalid testShardSettings keys 'timeout'"),
+    ("testShardSettings", '{"command": ""}', "Invalid testShardSettings command ''"),
+    ("packageBudgetSettings", {"maxZipMb": 10}, "Invalid packageBudgetSettings keys 'maxZipMb'"),
+    ("packageBudgetSettings", '{"maxLayers": 2.5}', "Invalid packageBudgetSettings maxLayers '2.5'"),
+    ("packageBudgetSettings", {"buildDir": ""}, "Invalid packageBudgetSettings buildDir ''"),
+    ("artifactBucketLifecycle", {"noncurrentDays": 30}, "Invalid artifactBucketLifecycle keys 'noncurrentDays'"),
+    ("artifactBucketLifecycle", '{"noncurrentExpirationDays": 0}', "Invalid artifactBucketLifecycle noncurrentExpirationDays '0'"),
+    ("applicationBucketLifecycle", {"expirationDays": 30}, "Invalid applicationBucketLifecycle keys 'expirationDays'"),
+])
+def test_invalid_context(key, value, message):
+    with pytest.raises(ValueError, match=message):
+        get_stack_options({**REQUIRED_CONTEXT, key: value}.get)
+
+
+@pytest.mark.parametrize("context, message", [
+    ({"buildComputeMode": "lambda", "buildCacheMode": "s3"}, "buildCacheMode 's3' is not supported by the lambda buildComputeMode"),
+    ({"buildComputeMode": "lambda", "buildTimeoutMinutes": "30"}, "buildTimeoutMinutes is not supported by the lambda buildComputeMode"),
+    ({"buildComputeMode": "lambda", "buildPrivileged": "true"}, "buildPrivileged is not supported by the lambda buildComputeMode"),
+    (
+        {"buildReuse": "true", "buildFanOut": "batch", "buildTargets": [{"name": "Api", "path": "api", "buildspec": "api.yml"}]},
+        "buildReuse cannot be combined with the batch buildFanOut",
+    ),
+    (
+        {"buildReuse": "true", "buildComputeMode": "lambda", "buildLambdaRuntime": "nodejs20"},
+        "requires a python buildLambdaRuntime with lambda compute, not 'nodejs20'",
+    ),
+    ({"buildComputeMode": "lambda", "buildFleetCapacity": "1"}, "buildFleetCapacity is not supported by the lambda buildComputeMode"),
+    ({"buildComputeMode": "lambda", "testShards": "2"}, "testShards is not supported by the lambda buildComputeMode"),
+    ({"buildArchitecture": "arm64", "buildComputeSize": "medium"}, "Invalid buildComputeSize 'medium' for the arm64"),
+    ({"environment": "stg", "buildArchitecture": "arm64"}, "Invalid buildComputeSize 'medium' for the arm64"),
+    (
+        {"buildArchitecture": "arm64", "buildComputeSize": "2xlarge", "buildFleetCapacity": "1"},
+        "Invalid buildComputeSize '2xlarge' for the arm64 architecture. Allowed values are: small, medium, large, xlarge",
+    ),
+    ({"deploymentTargets": [{"account": "12345", "region": "us-east-1"}]}, "Invalid deployment target account '12345'"),
+    (
+        {"buildTargets": [{"name": "api", "path": "api", "buildspec": "api/buildspec.yml"}]},
+        "The build target name 'api' is invalid",
+    ),
+    ({"deployStacks": [{"name": "Api", "template_file": "api.yaml"}]}, "Invalid deployStacks keys 'template_file'"),
+    (
+        {"deployStacks": [{"name": "Api", "templateFile": "api.yaml"}, {"name": "Api", "templateFile": "db.yaml"}]},
+        "The deploy stack name 'Api' is duplicated",
+    ),
+    (
+        {"deployStacks": [
+            {"name": "Network", "templateFile": "network.yaml"},
+            {"name": "Api", "templateFile": "api.yaml", "dependsOn": ["Network", "Db"]},
+            {"name": "Db", "templateFile": "db.yaml", "dependsOn": ["Api"]},
+        ]},
+        "The deploy stacks have a dependency cycle: Api, Db",
+    ),
+])
+def test_invalid_context_combinations(context, message):
+    # These contexts are rejected before the jsii runtime starts
+    with pytest.raises(ValueError, match=message):
+        get_stack_options({**REQUIRED_CONTEXT, **context}.get)
+
+
+@pytest.mark.parametrize("context", [
+    {"buildArchitecture": "arm64", "buildComputeSize": "large"},
+    {"buildArchitecture": "arm64", "buildComputeSize": "xlarge", "buildFleetCapacity": "1"},
+    {"buildArchitecture": "arm64", "buildComputeMode": "lambda"},
+])
+def test_arm64_build_compute_sizes(context):
+    assert get_stack_options({**REQUIRED_CONTEXT, **context}.get)["build_architecture"] == "arm64"
+
+
+@pytest.mark.parametrize("environment, compute_size, execution_mode, deploy_mode, deploy_skip_unchanged, perf_gate", [
+    ("dev", "small", "SUPERSEDED", "direct", True, False),
+    ("stg", "medium", "QUEUED", "changeset", False, True),
+    ("prd", "medium", "QUEUED", "changeset", False, True),
+])
+def test_environment_defaults(environment, compute_size, execution_mode, deploy_mode, deploy_skip_unchanged, perf_gate):
+    stack_options = get_stack_options({**REQUIRED_CONTEXT, "environment": environment}.get)
+
+    assert stack_options["build_compute_size"] == compute_size
+    assert stack_options["build_architecture"] == "x86_64"
+    assert stack_options["build_timeout_minutes"] == 60
+    assert stack_options["execution_mode"] == execution_mode
+    assert stack_options["deploy_mode"] == deploy_mode
+    assert stack_options["deploy_skip_unchanged"] is deploy_skip_unchanged
+    assert stack_options["perf_gate"] is perf_gate
+
+
+def test_direct_deploy_is_dev_only():
+    with pytest.raises(ValueError, match="supported only by the dev environment, not 'stg'"):
+        get_stack_options({**REQUIRED_CONTEXT, "environment": "stg", "deployMode": "direct"}.get)
+
+
+def test_context_overrides():
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "sourceType": "github",
+        "buildArchitecture": "arm64",
+        "buildCacheDedicatedBucket": "true",
+        "buildTargets": '[{"name": "Api", "path": "api", "buildspec": "api/buildspec.yml"}]',
+        "triggerFilters": '{"filePathsExcludes": ["docs/**"]}',
+    }.get)
+
+    assert stack_options["build_architecture"] == "arm64"
+    assert stack_options["build_cache_dedicated_bucket"] is True
+    assert stack_options["build_targets"] == [{"name": "Api", "path": "api", "buildspec": "api/buildspec.yml"}]
+    assert stack_options["trigger_filters"] == {"file_paths_excludes": ["docs/**"]}
+
+
+def test_promotion_environments():
+    stack_options = get_stack_options({**REQUIRED_CONTEXT, "promotionEnvironments": "dev, stg, prd"}.get)
+
+    assert stack_options["promotion_environments"] == ["dev", "stg", "prd"]
+    assert stack_options["promotion_parameter_name"] == "Environment"
+    # The dev default of deploySkipUnchanged is not applied to a promotion pipeline
+    assert stack_options["deploy_skip_unchanged"] is False
+
+    with pytest.raises(ValueError, match="deploySkipUnchanged cannot be combined with promotionEnvironments"):
+        get_stack_options(
+            {**REQUIRED_CONTEXT, "promotionEnvironments": "dev,stg", "deploySkipUnchanged": "true"}.get
+        )
+
+
+def test_deployment_targets():
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "deploymentTargets": '[{"account": "222222222222", "region": "us-east-1", "wave": "2", "roleArn": "arn"}]',
+    }.get)
+
+    assert stack_options["deployment_targets"] == [
+        {"account": "222222222222", "region": "us-east-1", "wave": 2, "role_arn": "arn"}
+    ]
+    # The stg and prd default of perfGate is not applied to deployment targets
+    assert stack_options["perf_gate"] is False
+
+
+@pytest.mark.parametrize("context, perf_gate, perf_gate_environments", [
+    ({"promotionEnvironments": "dev,stg,prd"}, True, ["stg", "prd"]),
+    ({"environment": "prd", "promotionEnvironments": "dev,stg"}, True, ["stg"]),
+    ({"environment": "stg", "promotionEnvironments": "dev,stg", "perfGate": "false"}, False, None),
+    ({"promotionEnvironments": "dev,stg", "perfGate": "true"}, True, None),
+    ({"environment": "stg"}, True, None),
+])
+def test_perf_gate_defaults_of_promotion_stages(context, perf_gate, perf_gate_environments):
+    # The default of each deploy stage follows its own environment, not that of the pipeline
+    stack_options = get_stack_options({**REQUIRED_CONTEXT, **context}.get)
+
+    assert stack_options["perf_gate"] is perf_gate
+    assert stack_options["perf_gate_environments"] == perf_gate_environments
+
+
+def test_perf_gate_settings():
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "perfGate": "true",
+        "perfGateSettings": '{"urlOutput": "HelloWorldApi", "p95Ms": 500, "maxErrorRate": 0.05}',
+    }.get)
+
+    assert stack_options["perf_gate"] is True
+    assert stack_options["perf_gate_settings"] == {"url_output": "HelloWorldApi", "p95_ms": 500, "max_error_rate": 0.05}
+
+    with pytest.raises(ValueError, match="perfGate cannot be combined with deploymentTargets"):
+        get_stack_options({**REQUIRED_CONTEXT, "perfGate": "true", "deploymentTargets": [{"region": "us-east-1"}]}.get)
+
+
+def test_test_shards():
+    stack_options = get_stack_options(REQUIRED_CONTEXT.get)
+
+    assert stack_options["test_shards"] == 0
+    assert stack_options["test_shard_settings"] == {}
+
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "testShards": "4",
+        "testShardSettings": '{"files": "test/**/*.test.js", "reportFiles": "junit.xml"}',
+    }.get)
+
+    assert stack_options["test_shards"] == 4
+    assert stack_options["test_shard_settings"] == {"files": "test/**/*.test.js", "report_files": "junit.xml"}
+
+
+def test_package_budget():
+    stack_options = get_stack_options(REQUIRED_CONTEXT.get)
+
+    assert stack_options["package_budget"] is False
+    assert stack_options["package_budget_settings"] == {}
+
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "packageBudget": "true",
+        "packageBudgetSettings": '{"maxCodeMb": 20.5, "minMemoryMb": 512, "buildDir": "build"}',
+    }.get)
+
+    assert stack_options["package_budget"] is True
+    assert stack_options["package_budget_settings"] == {"max_code_mb": 20.5, "min_memory_mb": 512, "build_dir": "build"}
+
+
+def test_bucket_lifecycles():
+    stack_options = get_stack_options(REQUIRED_CONTEXT.get)
+
+    assert stack_options["artifact_bucket_kms"] is False
+    assert stack_options["artifact_bucket_lifecycle"] == {"noncurrent_expiration_days": 30, "abort_multipart_days": 7}
+    assert stack_options["application_bucket_lifecycle"] == {"abort_multipart_days": 7}
+
+    stack_options = get_stack_options({
+        **REQUIRED_CONTEXT,
+        "artifactBucketKms": "true",
+        "artifactBucketLifecycle": '{"noncurrentExpirationDays": null, "intelligentTieringDays": 0, "expirationDays": 90}',
+    }.get)
+
+    assert stack_options["artifact_bucket_kms"] is True
+    assert stack_options["artifact_bucket_lifecycle"] == {
+        "abort_multipart_days": 7,
+        "intelligent_tiering_days": 0,
+        "expiration_days": 90,
+    }
+
+
+def test_lambda_compute_has_no_default_timeout():
+    stack_options = get_stack_options({**REQUIRED_CONTEXT, "buildComputeMode": "lambda"}.get)
+
+    assert stack_options["build_timeout_minutes"] is None
+
+
+def test_read_context_precedence(tmp_path):
+    cdk_json = tmp_path / "cdk.json"
+    cdk_json.write_text(json.dumps({"context": {"applicationName": "FromCdkJson", "environment": "dev"}}))
+
+    context = read_context(
+        argv=["-c", "applicationName=FromArgv", "--context=sourceType=github"],
+        cdk_json_path=str(cdk_json),
+        environ={"CDK_CONTEXT_JSON": json.dumps({"applicationName": "FromEnv", "environment": "stg"})},
+    )
+
+    assert context["applicationName"] == "FromArgv"
+    assert context["environment"] == "stg"
+    assert context["sourceType"] == "github"
+
+
+def test_load_manifest(tmp_path):
+    manifest = tmp_path / "pipelines.yaml"
+    manifest.write_text(
+        "pipelines:\n"
+        "  - applicationName: TestApp\n"
+        "    environment: dev\n"
+        "    sourceType: codecommit\n"
+    )
+
+    assert load_manifest(str(manifest)) == [REQUIRED_CONTEXT]
+
+
+def test_manifest_stack_options():
+    stack_options_list = get_manifest_stack_options([
+        {**REQUIRED_CONTEXT, "parameters": {"RepositoryName": "test-repo"}},
+        {**REQUIRED_CONTEXT, "environment": "prd", "stackName": "TestAppPrdStack"},
+    ])
+
+    assert [stack_options["stack_name"] for stack_options in stack_options_list] == ["TestAppStack", "TestAppPrdStack"]
+    assert stack_options_list[0]["parameter_defaults"] == {"RepositoryName": "test-repo"}
+
+
+def test_manifest_reports_every_error():
+    with pytest.raises(ValueError) as error:
+        get_manifest_stack_options([
+            {**REQUIRED_CONTEXT, "environment": "qa"},
+            REQUIRED_CONTEXT,
+            REQUIRED_CONTEXT,
+            {**REQUIRED_CONTEXT, "applicationName": "Other", "parameters": {"Unknown": "value"}},
+        ])
+
+    message = str(error.value)
+    assert "pipelines[0] (TestApp): Invalid environment 'qa'" in message
+    assert "pipelines[2] (TestApp): The stack name 'TestAppStack' is duplicated" in message
+    assert "pipelines[3] (Other): Invalid parameters: Unknown" in message
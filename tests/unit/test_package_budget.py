@@ -0,0 +1,248 @@
+import importlib.util
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+SCRIPT_PATH = Path(__file__).parents[2] / "aws_cdk_serverless_pipeline" / "scripts" / "package_budget.py"
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "package_budget" / "packaged.yaml"
+
+MB = 1024 * 1024
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("package_budget", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeAws:
+    """Answer the AWS CLI calls of the analyzer with the zipped sizes of the packages and the layer versions."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.calls = []
+
+    def __call__(self, service, command, *args):
+        self.calls.append(command)
+        if command == "head-object":
+            key = args[args.index("--key") + 1]
+            if key not in self.sizes:
+                raise subprocess.CalledProcessError(254, ["aws", service, command])
+            return {"ContentLength": self.sizes[key]}
+        if command == "get-layer-version-by-arn":
+            return {"Content": {"CodeSize": self.sizes[args[args.index("--arn") + 1]]}}
+        raise AssertionError(f"Unexpected call {command}")
+
+
+ZIPPED_SIZES = {
+    "3f1c2a9e0b7d4e5f": 2 * MB,
+    "9a8b7c6d5e4f3a2b": 1 * MB,
+    "1b2c3d4e5f6a7b8c": 10 * MB,
+    "arn:aws:lambda:us-east-1:123456789012:layer:Observability:7": 5 * MB,
+}
+
+
+def write_build_output(build_dir: Path, sizes: dict[str, int]) -> None:
+    for logical_id, size in sizes.items():
+        (build_dir / logical_id).mkdir(parents=True)
+        with open(build_dir / logical_id / "package.bin", "wb") as file:
+            file.truncate(size)
+
+
+def test_load_template():
+    package_budget = load_script()
+
+    template = package_budget.load_template(str(FIXTURE_PATH))
+
+    assert template["Globals"]["Function"]["Architectures"] == ["arm64"]
+    api_function = template["Resources"]["ApiFunction"]["Properties"]
+    assert api_function["Layers"] == [
+        {"Ref": "DependenciesLayer"},
+        "arn:aws:lambda:us-east-1:123456789012:layer:Observability:7",
+    ]
+    assert api_function["Description"].endswith("be wrapped on a continuation line")
+    worker_function = template["Resources"]["WorkerFunction"]["Properties"]
+    assert worker_function["MemorySize"] == {"Ref": "FunctionMemory"}
+    assert worker_function["Layers"] == [{"Ref": "DependenciesLayer"}]
+    assert worker_function["Environment"]["Variables"]["CONFIG"] == "first: line\nsecond: line\n"
+    assert template["Resources"]["InlineFunction"]["Properties"]["Role"] == {"Fn::GetAtt": ["InlineFunctionRole", "Arn"]}
+    assert template["Outputs"]["ApiUrl"]["Value"]["Fn::Sub"].startswith("https://")
+
+
+def test_load_template_with_short_form_tags(tmp_path):
+    package_budget = load_script()
+    template_path = tmp_path / "packaged.yaml"
+    template_path.write_text(
+        "Resources:\n"
+        "  Function:\n"
+        "    Type: AWS::Serverless::Function\n"
+        "    Properties:\n"
+        "      Role: !GetAtt FunctionRole.Arn\n"
+        "      Layers:\n"
+        "        - !Sub arn:aws:lambda:${AWS::Region}:123456789012:layer:Shared:1\n"
+        "      MemorySize: !If [IsProduction, 1024, 256]\n"
+    )
+
+    properties = package_budget.load_template(str(template_path))["Resources"]["Function"]["Properties"]
+
+    assert properties == {
+        "Role": {"Fn::GetAtt": ["FunctionRole", "Arn"]},
+        "Layers": [{"Fn::Sub": "arn:aws:lambda:${AWS::Region}:123456789012:layer:Shared:1"}],
+        "MemorySize": {"Fn::If": ["IsProduction", 1024, 256]},
+    }
+
+
+def test_analyze_template_with_zipped_sizes(tmp_path):
+    package_budget = load_script()
+    shutil.copy(FIXTURE_PATH, tmp_path / "packaged.yaml")
+
+    functions = {
+        function["function"]: function
+        for function in package_budget.analyze_template(str(tmp_path / "packaged.yaml"), run=FakeAws(ZIPPED_SIZES))
+    }
+
+    assert list(functions) == ["ApiFunction", "WorkerFunction", "ImageFunction", "InlineFunction"]
+    # Without the build output, the unzipped sizes are unknown and the zipped sizes are for information
+    assert functions["ApiFunction"] == {
+        "template": str(tmp_path / "packaged.yaml"),
+        "function": "ApiFunction",
+        "runtime": "python3.12",
+        "architecture": "arm64",
+        "memory_mb": 256,
+        "code_mb": None,
+        "layers": 2,
+        "layer_mb": None,
+        "total_mb": None,
+        "zipped_mb": 17.0,
+        "unknown_sizes": [
+            "ApiFunction",
+            "DependenciesLayer",
+            "arn:aws:lambda:us-east-1:123456789012:layer:Observability:7",
+        ],
+    }
+    # The memory size of a parameter is not known before the deploy
+    assert functions["WorkerFunction"]["memory_mb"] is None
+    assert functions["WorkerFunction"]["architecture"] == "x86_64"
+    assert functions["ImageFunction"]["runtime"] == "image"
+    assert functions["ImageFunction"]["unknown_sizes"] == []
+    # Inline code has no package
+    assert functions["InlineFunction"]["zipped_mb"] is None
+    assert functions["InlineFunction"]["unknown_sizes"] == ["InlineFunction"]
+    assert functions["InlineFunction"]["memory_mb"] == 128
+
+
+def test_analyze_template_with_build_output(tmp_path):
+    package_budget = load_script()
+    shutil.copy(FIXTURE_PATH, tmp_path / "packaged.yaml")
+    write_build_output(tmp_path / ".aws-sam" / "build", {"ApiFunction": 30 * MB, "DependenciesLayer": 120 * MB})
+    fake_aws = FakeAws(ZIPPED_SIZES)
+
+    functions = {
+        function["function"]: function
+        for function in package_budget.analyze_template(str(tmp_path / "packaged.yaml"), run=fake_aws)
+    }
+
+    # The unzipped sizes of the build output are used when the artifacts include it
+    assert functions["ApiFunction"]["code_mb"] == 30.0
+    # The layer of another template has only a zipped size, so the total is unknown
+    assert functions["ApiFunction"]["layer_mb"] is None
+    assert functions["ApiFunction"]["total_mb"] is None
+    assert functions["ApiFunction"]["zipped_mb"] == 5.0
+    assert functions["WorkerFunction"]["code_mb"] is None
+    assert functions["WorkerFunction"]["layer_mb"] == 120.0
+    assert fake_aws.calls.count("head-object") == 1
+
+
+def test_analyze_json_template(tmp_path):
+    package_budget = load_script()
+    template_path = tmp_path / "packaged.json"
+    template_path.write_text(json.dumps({
+        "Resources": {
+            "Function": {
+                "Type": "AWS::Lambda::Function",
+                "Properties": {
+                    "Runtime": "python3.12",
+                    "MemorySize": 1024,
+                    "Code": {"S3Bucket": "sam-app-bucket", "S3Key": "3f1c2a9e0b7d4e5f"},
+                },
+            },
+        },
+    }))
+    write_build_output(tmp_path / ".aws-sam" / "build", {"Function": 4 * MB})
+
+    [function] = package_budget.analyze_template(str(template_path), run=FakeAws(ZIPPED_SIZES))
+
+    assert (function["runtime"], function["memory_mb"], function["code_mb"], function["total_mb"]) == (
+        "python3.12", 1024, 4.0, 4.0,
+    )
+
+
+def test_evaluate_budgets():
+    package_budget = load_script()
+    function = {"code_mb": 60.5, "total_mb": 80.0, "layers": 2, "memory_mb": 128, "unknown_sizes": [], "zipped_mb": None}
+
+    failures = package_budget.exceeded(package_budget.evaluate(function, {
+        "max_code_mb": 50, "max_total_mb": 250, "max_layers": 5, "min_memory_mb": 512, "max_memory_mb": None,
+    }))
+
+    assert failures == ["code_mb 60.5 > 50", "memory_mb 128 < 512"]
+    assert package_budget.unchecked_sizes(function, {"max_code_mb": 50}) is None
+    # The unzipped sizes that are not known are not checked against the budgets, and the reason is reported
+    function = {**function, "code_mb": None, "total_mb": None, "unknown_sizes": ["Function"], "zipped_mb": 12.0}
+    assert package_budget.exceeded(package_budget.evaluate(function, {"max_code_mb": 50})) == []
+    assert package_budget.unchecked_sizes(function, {"max_code_mb": 50}) == (
+        "the unzipped size of Function is unknown (zipped 12.0 MB), so max_code_mb and max_total_mb are not checked"
+    )
+    assert package_budget.unchecked_sizes(function, {"max_code_mb": None, "max_total_mb": None}) is None
+
+
+# ApiFunction has a layer of another template and InlineFunction inline code, so their sizes are not checked
+@pytest.mark.parametrize("budgets, status, failures, skipped", [
+    ({}, 0, 0, 2),
+    ({"PACKAGE_BUDGET_MAX_TOTAL_MB": "100", "PACKAGE_BUDGET_MIN_MEMORY_MB": "256"}, 1, 2, 1),
+])
+def test_main(tmp_path, monkeypatch, capsys, budgets, status, failures, skipped):
+    package_budget = load_script()
+    shutil.copy(FIXTURE_PATH, tmp_path / "packaged.yaml")
+    write_build_output(tmp_path / ".aws-sam" / "build", {
+        "ApiFunction": 30 * MB,
+        "WorkerFunction": 1 * MB,
+        "DependenciesLayer": 120 * MB,
+    })
+    monkeypatch.chdir(tmp_path)
+
+    assert package_budget.main({
+        "CODEBUILD_SRC_DIR": str(tmp_path),
+        "PACKAGE_BUDGET_TEMPLATES": "packaged.yaml",
+        "PACKAGE_BUDGET_MAX_CODE_MB": "50",
+        **budgets,
+    }, run=FakeAws(ZIPPED_SIZES)) == status
+
+    output = capsys.readouterr().out
+    assert output.splitlines()[0].split() == [
+        "function", "runtime", "architecture", "memory_mb", "code_mb", "layers", "layer_mb", "total_mb", "zipped_mb",
+    ]
+    assert (
+        "ApiFunction: the unzipped size of arn:aws:lambda:us-east-1:123456789012:layer:Observability:7 is unknown "
+        "(zipped 5.0 MB), so max_code_mb and max_total_mb are not checked. "
+        "Include .aws-sam/build in the build artifacts to check them."
+    ) in output
+    report = (tmp_path / "package-budget-report.xml").read_text()
+    assert f'<testsuite name="PackageBudget" tests="4" failures="{failures}" skipped="{skipped}">' in report
+    if failures:
+        # WorkerFunction has 1 + 120 MB, and InlineFunction the default memory
+        assert '<failure message="total_mb 121.0 &gt; 100.0">' in report
+        assert "The package budget failed: WorkerFunction total_mb 121.0 > 100.0, InlineFunction memory_mb 128 < 256.0" in output
+
+
+def test_main_without_template(tmp_path, monkeypatch, capsys):
+    package_budget = load_script()
+    monkeypatch.chdir(tmp_path)
+
+    assert package_budget.main({"CODEBUILD_SRC_DIR": str(tmp_path), "PACKAGE_BUDGET_TEMPLATES": "packaged.yaml"}) == 1
+    assert "No packaged template is found in the build artifacts. Expected: packaged.yaml" in capsys.readouterr().out
@@ -0,0 +1,122 @@
+import importlib.util
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import pytest
+
+
+SCRIPT_PATH = Path(__file__).parents[2] / "aws_cdk_serverless_pipeline" / "scripts" / "perf_gate.py"
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("perf_gate", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeRequest:
+    """Return the latencies in order, failing the requests whose latency is None."""
+
+    def __init__(self, latencies):
+        self.latencies = list(latencies)
+        self.lock = threading.Lock()
+
+    def __call__(self, url, timeout):
+        with self.lock:
+            latency = self.latencies.pop(0)
+        return (latency or 5000.0), latency is not None
+
+
+def test_run_load_test():
+    perf_gate = load_script()
+    latencies = [900.0] + [float(latency) for latency in range(1, 99)] + [None]
+
+    result = perf_gate.run_load_test("https://example.com/", requests=100, concurrency=4, request=FakeRequest(latencies))
+
+    assert result["requests"] == 100
+    assert result["first_ms"] == 900.0
+    assert result["error_rate"] == 0.01
+    assert result["p50_ms"] == 50.5
+
+
+def test_junit_report_fails_exceeded_thresholds():
+    perf_gate = load_script()
+    result = {"p95_ms": 1200.0, "p99_ms": 1500.0, "error_rate": 0.0, "first_ms": 3000.0}
+
+    checks = perf_gate.evaluate(result, {"p95_ms": 1000, "p99_ms": 2000, "error_rate": 0.01, "first_ms": None})
+    report = perf_gate.junit_report("https://example.com/?a=1&b=2", checks)
+
+    assert '<testsuite name="PerfGate" tests="4" failures="1">' in report
+    assert '<failure message="p95_ms 1200.0 exceeds 1000">https://example.com/?a=1&amp;b=2</failure>' in report
+    assert "first_ms 3000.0 (not checked)" in report
+
+
+@pytest.fixture
+def api_url():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response({"/broken": 500, "/missing": 404, "/moved": 304}.get(self.path, 200))
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("path, succeeded", [
+    ("/hello", True),
+    ("/moved", True),
+    ("/missing", False),
+    ("/broken", False),
+])
+def test_request_once(api_url, path, succeeded):
+    perf_gate = load_script()
+
+    # Only 2xx and 3xx responses succeed, a 4xx response means the tested path does not work
+    assert perf_gate.request_once(f"{api_url}{path}", timeout=5)[1] is succeeded
+
+
+@pytest.mark.parametrize("path, max_error_rate, exit_code", [
+    ("/hello", "0.01", 0),
+    ("/broken", "0.01", 1),
+    ("/missing", "0.01", 1),
+    ("/broken", "", 0),
+])
+def test_main(tmp_path, api_url, path, max_error_rate, exit_code):
+    perf_gate = load_script()
+    # The stack outputs of a second deployed stack are an extra input artifact
+    extra_input = tmp_path / "extra"
+    extra_input.mkdir()
+    (extra_input / "outputs.json").write_text(json.dumps({"ApiUrl": f"{api_url}/"}))
+
+    assert perf_gate.main({
+        "CODEBUILD_SRC_DIR": str(tmp_path),
+        "CODEBUILD_SRC_DIR_AppDeploymentValuesApi": str(extra_input),
+        "PERF_GATE_URL_OUTPUT": "ApiUrl",
+        "PERF_GATE_PATH": path,
+        "PERF_GATE_REQUESTS": "20",
+        "PERF_GATE_CONCURRENCY": "4",
+        "PERF_GATE_P95_MS": "5000",
+        "PERF_GATE_MAX_ERROR_RATE": max_error_rate,
+        "PERF_GATE_REPORT": str(tmp_path / "report.xml"),
+    }) == exit_code
+    assert (tmp_path / "report.xml").exists()
+
+
+def test_main_requires_url_output(tmp_path, capsys):
+    perf_gate = load_script()
+    (tmp_path / "outputs.json").write_text(json.dumps({"HelloWorldApi": "https://example.com/"}))
+
+    assert perf_gate.main({"CODEBUILD_SRC_DIR": str(tmp_path), "PERF_GATE_URL_OUTPUT": "ApiUrl"}) == 1
+    output = capsys.readouterr().out
+    assert "The stack output 'ApiUrl' to load test is missing. Found: HelloWorldApi." in output
+    assert "set urlOutput of the perfGateSettings context" in output
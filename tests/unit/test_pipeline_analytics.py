@@ -0,0 +1,132 @@
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from aws_cdk_serverless_pipeline.pipeline_analytics import (
+    analyze,
+    critical_path,
+    iter_json_items,
+    main,
+    parse_time,
+    percentile,
+)
+
+
+FIXTURES = Path(__file__).parent / "fixtures" / "pipeline_analytics"
+
+
+def fixture_report(chunk_size=1 << 16):
+    report = analyze(
+        [("TestAppPipeline", str(FIXTURES / "executions.json"))],
+        [("TestAppPipeline", str(FIXTURES / "actions.jsonl"))],
+        [str(FIXTURES / "builds.json")],
+        chunk_size=chunk_size,
+    )
+    return report["pipelines"][0]
+
+
+def test_pipeline_analytics_does_not_import_aws_cdk():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, aws_cdk_serverless_pipeline.pipeline_analytics; print('aws_cdk' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+@pytest.mark.parametrize("text", [
+    '{"builds": [{"id": 1}, {"id": 2}], "buildsNotFound": []}',
+    '{"builds": [{"id": 1}], "nextToken": "next"}\n{"builds": [{"id": 2}]}',
+    '{"id": 1}\n{"id": 2}\n',
+    '[{"id": 1}, {"id": 2}]',
+    '{"nextToken": "next", "builds": [{"id": 1}, {"id": 2}]}',
+])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_json_items(text, chunk_size):
+    assert list(iter_json_items(io.StringIO(text), chunk_size)) == [{"id": 1}, {"id": 2}]
+
+
+def test_iter_json_items_rejects_truncated_file():
+    with pytest.raises(ValueError):
+        list(iter_json_items(io.StringIO('{"builds": [{"id": 1}, {"id"'), 4))
+
+
+def test_parse_time():
+    assert parse_time("2026-01-05T10:00:00Z") == parse_time(1767607200.0)
+    assert parse_time("2026-01-05T19:00:00+09:00") == parse_time("2026-01-05T10:00:00.000000+00:00")
+
+
+def test_percentile():
+    assert percentile([], 50) is None
+    assert percentile([10.0], 95) == 10.0
+    assert percentile([40.0, 10.0, 20.0, 30.0], 50) == 25.0
+    assert percentile([10.0, 20.0, 30.0], 95) == 29.0
+
+
+def test_critical_path():
+    times = parse_time
+    actions = [
+        {"stage": "Test", "action": "Unit", "start": times(0), "end": times(60)},
+        {"stage": "Test", "action": "Lint", "start": times(0), "end": times(10)},
+        {"stage": "Test", "action": "Integration", "start": times(61), "end": times(200)},
+        {"stage": "Build", "action": "Build", "start": times(-100), "end": times(-5)},
+    ]
+
+    assert [action["action"] for action in critical_path(actions)] == ["Build", "Unit", "Integration"]
+
+
+@pytest.mark.parametrize("chunk_size", [16, 1 << 16])
+def test_pipeline_report(chunk_size):
+    report = fixture_report(chunk_size)
+
+    assert report["execution_count"] == 3
+    assert report["statuses"] == {"Failed": 1, "Succeeded": 2}
+    assert report["execution_duration"] == {"count": 3, "p50": 600.0, "p95": 708.0}
+    assert report["queue_time"] == {"count": 3, "p50": 5.0, "p95": 54.5}
+    assert list(report["stages"]) == ["Source", "Build", "CfnDeploy"]
+    assert report["stages"]["Build"] == {"count": 3, "p50": 300.0, "p95": 408.0}
+    assert [(item["action"], item["share"]) for item in report["critical_path"]] == [
+        ("Source", 1.0),
+        ("Build", 1.0),
+        ("CreateReplaceChangeSet", 0.667),
+        ("ExecuteChangeSet", 0.667),
+    ]
+    # The builds of other pipelines in the same file are ignored
+    assert list(report["slowest_build_phases"])[:3] == ["BUILD", "QUEUED", "INSTALL"]
+    assert report["slowest_build_phases"]["QUEUED"] == {"count": 3, "p50": 40.0, "p95": 85.0}
+
+
+def test_pipeline_recommendations():
+    recommendations = fixture_report()["recommendations"]
+
+    assert [item["context"] for item in recommendations] == [
+        "deploySkipUnchanged",
+        "buildComputeSize",
+        "deployMode",
+        "buildCacheMode",
+        "buildFleetCapacity",
+    ]
+    assert recommendations[0]["p50_seconds"] == 240.0
+
+
+def test_main(tmp_path, capsys):
+    output = tmp_path / "analytics.json"
+
+    assert main([
+        "--executions", f"TestAppPipeline={FIXTURES / 'executions.json'}",
+        "--actions", f"TestAppPipeline={FIXTURES / 'actions.jsonl'}",
+        "--output", str(output),
+    ]) == 0
+    report = json.loads(output.read_text())
+    assert report["pipelines"][0]["pipeline_name"] == "TestAppPipeline"
+    assert report["pipelines"][0]["slowest_build_phases"] == {}
+
+    with pytest.raises(SystemExit):
+        main(["--executions", str(FIXTURES / "executions.json")])
+    assert "--executions must be PIPELINE_NAME=PATH" in capsys.readouterr().err
@@ -0,0 +1,115 @@
+import importlib.util
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+
+FUNCTION_PATH = Path(__file__).parents[2] / "aws_cdk_serverless_pipeline" / "functions" / "pipeline_metrics" / "index.py"
+
+STARTED_AT = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def load_function():
+    spec = importlib.util.spec_from_file_location("pipeline_metrics_index", FUNCTION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeCodePipelineClient:
+    """Return the action executions of an execution in two pages, like ListActionExecutions does for long executions."""
+
+    def __init__(self, status="SUCCEEDED"):
+        self.status = status
+        self.action_executions = [
+            self.action("Source", "CodeCommitSource", 30, 10),
+            self.action("Build", "CodeBuild", 45, 300),
+            self.action("CfnDeploy", "CreateReplaceChangeSet", 350, 40),
+            self.action("CfnDeploy", "ExecuteChangeSet", 390, 120),
+            self.action("Build", "CodeBuild", 0, 900, execution_id="other"),
+        ]
+
+    @staticmethod
+    def action(stage_name, action_name, start_seconds, duration_seconds, execution_id="execution-1"):
+        return {
+            "pipelineExecutionId": execution_id,
+            "stageName": stage_name,
+            "actionName": action_name,
+            "startTime": STARTED_AT + timedelta(seconds=start_seconds),
+            "lastUpdateTime": STARTED_AT + timedelta(seconds=start_seconds + duration_seconds),
+        }
+
+    def list_action_executions(self, pipelineName, filter, nextToken=None):
+        action_executions = [
+            action for action in self.action_executions
+            if action["pipelineExecutionId"] == filter["pipelineExecutionId"]
+        ]
+        if nextToken is None:
+            return {"actionExecutionDetails": action_executions[:2], "nextToken": "page-2"}
+        return {"actionExecutionDetails": action_executions[2:]}
+
+    def get_pipeline_execution(self, pipelineName, pipelineExecutionId):
+        # GetPipelineExecution has no start and end times
+        return {
+            "pipelineExecution": {
+                "pipelineName": pipelineName,
+                "pipelineExecutionId": pipelineExecutionId,
+                "status": self.status,
+            }
+        }
+
+
+def event(detail_type, state="SUCCEEDED", **detail):
+    return {
+        "detail-type": detail_type,
+        "time": (STARTED_AT + timedelta(seconds=520)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "detail": {"pipeline": "TestAppPipeline", "execution-id": "execution-1", "state": state, **detail},
+    }
+
+
+def test_pipeline_metrics(capsys):
+    function = load_function()
+
+    record = function.handler(event(function.PIPELINE_EVENT), None, client=FakeCodePipelineClient())
+
+    assert record["PipelineName"] == "TestAppPipeline"
+    # From the Source start to the finished event, with 5 + 5 + 10 seconds between the actions
+    assert record["PipelineDuration"] == 490
+    assert record["QueueTime"] == 20
+    assert record["PipelineSucceeded"] == 1.0
+    assert record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["PipelineName"]]
+    assert json.loads(capsys.readouterr().out) == record
+
+
+def test_stage_and_action_metrics():
+    function = load_function()
+    client = FakeCodePipelineClient()
+
+    stage_record = function.handler(event(function.STAGE_EVENT, stage="CfnDeploy"), None, client=client)
+    action_record = function.handler(
+        event(function.ACTION_EVENT, state="FAILED", stage="Build", action="CodeBuild"), None, client=client
+    )
+
+    assert stage_record["StageName"] == "CfnDeploy"
+    assert stage_record["StageDuration"] == 160
+    assert action_record["ActionName"] == "CodeBuild"
+    assert action_record["ActionDuration"] == 300
+
+
+def test_pipeline_metrics_of_failed_execution():
+    function = load_function()
+
+    record = function.handler(
+        event(function.PIPELINE_EVENT, state="FAILED"), None, client=FakeCodePipelineClient(status="FAILED")
+    )
+
+    assert record["PipelineSucceeded"] == 0.0
+
+
+@pytest.mark.parametrize("state", ["STARTED", "SUPERSEDED", "STOPPED"])
+def test_unfinished_states_are_ignored(state):
+    function = load_function()
+
+    assert function.handler(event(function.PIPELINE_EVENT, state=state), None, client=None) is None
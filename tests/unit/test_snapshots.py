@@ -0,0 +1,25 @@
+import os
+from pathlib import Path
+
+from aws_cdk_serverless_pipeline.template_generator import normalize_template
+
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+# Set UPDATE_SNAPSHOTS=1 to rewrite the snapshots after an intended template change
+UPDATE_SNAPSHOTS = os.environ.get("UPDATE_SNAPSHOTS") == "1"
+
+
+def test_template_snapshot(matrix_case, matrix_template):
+    environment, source_type = matrix_case
+    snapshot_path = SNAPSHOT_DIR / f"{environment}_{source_type}.json"
+    actual = normalize_template(matrix_template.to_json())
+
+    if UPDATE_SNAPSHOTS:
+        SNAPSHOT_DIR.mkdir(exist_ok=True)
+        snapshot_path.write_text(actual)
+
+    assert snapshot_path.exists(), f"{snapshot_path.name} is missing. Run the tests with UPDATE_SNAPSHOTS=1 to create it."
+    assert actual == snapshot_path.read_text(), (
+        f"The template differs from {snapshot_path.name}. "
+        "Run the tests with UPDATE_SNAPSHOTS=1 if the change is intended."
+    )
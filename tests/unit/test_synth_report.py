@@ -0,0 +1,46 @@
+import aws_cdk as core
+
+from aws_cdk_serverless_pipeline.aws_cdk_serverless_pipeline_stack import AwsCdkServerlessPipelineStack
+from aws_cdk_serverless_pipeline.synth_report import assembly_report, iam_policy_bytes
+
+
+def test_iam_policy_bytes():
+    template = {
+        "Resources": {
+            "Role": {
+                "Type": "AWS::IAM::Role",
+                "Properties": {"AssumeRolePolicyDocument": {"Version": "2012-10-17"}},
+            },
+            "Bucket": {
+                "Type": "AWS::S3::Bucket",
+                "Properties": {"BucketName": "bucket"},
+            },
+        }
+    }
+
+    assert iam_policy_bytes(template) == len('{"Version":"2012-10-17"}')
+
+
+def test_assembly_report():
+    app = core.App()
+    stack = AwsCdkServerlessPipelineStack(
+        app,
+        "AwsCdkServerlessPipelineStack",
+        stack_name="TestAppStack",
+        application_name="TestApp",
+        environment="dev",
+        source_type="codecommit"
+    )
+    cloud_assembly = app.synth()
+
+    report = assembly_report([stack], cloud_assembly, {"TestAppStack": 0.5, "synth": 1.0})
+
+    template = cloud_assembly.get_stack_by_name("TestAppStack").template
+    assert report["stack_count"] == 1
+    assert report["synth_seconds"] == 1.0
+    assert report["stacks"][0]["stack_name"] == "TestAppStack"
+    assert report["stacks"][0]["construct_seconds"] == 0.5
+    assert report["stacks"][0]["resource_count"] == len(template["Resources"])
+    assert report["iam_role_count"] == len([resource for resource in template["Resources"].values() if resource["Type"] == "AWS::IAM::Role"])
+    assert report["stacks"][0]["construct_count"] > report["stacks"][0]["resource_count"]
+    assert 0 < report["iam_policy_bytes"] < report["template_bytes"]
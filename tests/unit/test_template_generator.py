@@ -0,0 +1,77 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from aws_cdk_serverless_pipeline.template_generator import CACHE_FILE_NAME, generate, main
+
+
+def test_template_generator_does_not_import_aws_cdk():
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, aws_cdk_serverless_pipeline.template_generator; print('aws_cdk' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+def test_cfn_templates_are_up_to_date():
+    # The variants whose hashes are unchanged are skipped, so this synthesizes only after a change
+    results = generate(check=True)
+
+    assert results["generated"] == [], "Run python -m aws_cdk_serverless_pipeline.template_generator to update them."
+
+
+def test_generate_skips_unchanged_variants(tmp_path, capsys):
+    variants_path = tmp_path / "variants.json"
+    variants_path.write_text(json.dumps({"pipelines": [{
+        "templateFile": "codecommit_dev.json",
+        "applicationName": "TestApp",
+        "environment": "dev",
+        "sourceType": "codecommit",
+    }]}))
+
+    assert generate(str(variants_path), jobs=1)["generated"] == ["codecommit_dev.json"]
+    template = json.loads((tmp_path / "codecommit_dev.json").read_text())
+    assert "RepositoryName" in template["Parameters"]
+    assert "Environment" not in template["Parameters"]
+    assert "Rules" not in template
+    assert list(json.loads((tmp_path / CACHE_FILE_NAME).read_text())) == ["codecommit_dev.json"]
+
+    assert generate(str(variants_path), jobs=1)["skipped"] == ["codecommit_dev.json"]
+
+    # A template edited by hand is synthesized again and reported as drifted
+    (tmp_path / "codecommit_dev.json").write_text("{}\n")
+    assert main(["--variants", str(variants_path), "--check", "--jobs", "1"]) == 1
+    assert "drifted: codecommit_dev.json" in capsys.readouterr().err
+    assert (tmp_path / "codecommit_dev.json").read_text() == "{}\n"
+
+
+@pytest.mark.parametrize("variants, message", [
+    ([{"applicationName": "TestApp", "environment": "dev", "sourceType": "codecommit"}], "unique 'templateFile'"),
+    ([{"templateFile": "a.json", "applicationName": "TestApp", "environment": "qa", "sourceType": "codecommit"}],
+     "Invalid environment 'qa'"),
+])
+def test_generate_rejects_invalid_variants(tmp_path, variants, message):
+    variants_path = tmp_path / "variants.json"
+    variants_path.write_text(json.dumps({"pipelines": variants}))
+
+    with pytest.raises(ValueError, match=message):
+        generate(str(variants_path))
+
+
+def test_source_hash_includes_cdk_json(tmp_path, monkeypatch):
+    from aws_cdk_serverless_pipeline import template_generator
+
+    cdk_json_path = tmp_path / "cdk.json"
+    cdk_json_path.write_text(json.dumps({"context": {"@aws-cdk/aws-iam:minimizePolicies": True}}))
+    monkeypatch.setattr(template_generator, "CDK_JSON_PATH", cdk_json_path)
+    source_hash = template_generator.source_hash()
+    assert template_generator.cdk_context() == {"@aws-cdk/aws-iam:minimizePolicies": True}
+
+    # A feature flag change synthesizes every variant again
+    cdk_json_path.write_text(json.dumps({"context": {"@aws-cdk/aws-iam:minimizePolicies": False}}))
+    assert template_generator.source_hash() != source_hash
@@ -0,0 +1,130 @@
+import importlib.util
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+SCRIPT_PATH = Path(__file__).parents[2] / "aws_cdk_serverless_pipeline" / "scripts" / "test_shards.py"
+
+FILES = ["tests/test_a.py", "tests/test_b.py", "tests/unit/test_c.py", "tests/unit/test_d.py"]
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location("test_shards", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeCodeBuild:
+    """Answer the AWS CLI calls of the planner with a report of the current and of an earlier execution."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, service, command, *args):
+        self.calls.append(command)
+        if command == "list-reports-for-report-group":
+            return {"reports": ["report-current", "report-earlier", "report-running"]}
+        if command == "batch-get-reports":
+            return {"reports": [
+                {"arn": "report-current", "executionId": "build-current", "status": "SUCCEEDED", "created": "2026-10-17T10:00:00"},
+                {"arn": "report-earlier", "executionId": "build-earlier", "status": "FAILED", "created": "2026-10-16T10:00:00"},
+                {"arn": "report-running", "executionId": "build-running", "status": "INCOMPLETE", "created": "2026-10-17T11:00:00"},
+            ]}
+        if command == "batch-get-builds":
+            return {"builds": [
+                {"arn": "build-current", "environment": {"environmentVariables": [
+                    {"name": "TEST_PIPELINE_EXECUTION_ID", "value": "execution-2"},
+                ]}},
+                {"arn": "build-earlier", "environment": {"environmentVariables": [
+                    {"name": "TEST_PIPELINE_EXECUTION_ID", "value": "execution-1"},
+                ]}},
+            ]}
+        if command == "describe-test-cases":
+            report_arn = args[-1]
+            assert report_arn == "report-earlier", "The reports of the current execution are left out"
+            return {"testCases": [
+                {"prefix": "tests.test_a", "name": "test_slow", "durationInNanoSeconds": 9_000_000_000},
+                {"prefix": "tests.unit.test_c.TestC", "name": "test_one", "durationInNanoSeconds": 2_000_000_000},
+                {"prefix": "tests.unit.test_c.TestC", "name": "test_two", "durationInNanoSeconds": 1_000_000_000},
+                {"prefix": "tests.removed", "name": "test_gone", "durationInNanoSeconds": 5_000_000_000},
+            ]}
+        raise AssertionError(f"Unexpected call {command}")
+
+
+def test_file_of():
+    test_shards = load_script()
+
+    assert test_shards.file_of("tests.unit.test_c", FILES) == "tests/unit/test_c.py"
+    assert test_shards.file_of("tests.unit.test_c.TestC", FILES) == "tests/unit/test_c.py"
+    assert test_shards.file_of("tests/test_b.py", FILES) == "tests/test_b.py"
+    assert test_shards.file_of("tests.unit", FILES) is None
+
+
+def test_load_durations_skips_the_current_execution():
+    test_shards = load_script()
+
+    durations = test_shards.load_durations("arn:report-group", 2, "execution-2", FILES, run=FakeCodeBuild())
+
+    assert durations == {"tests/test_a.py": 9.0, "tests/unit/test_c.py": 3.0}
+
+
+def test_assign_balances_by_duration():
+    test_shards = load_script()
+
+    shards = test_shards.assign(FILES, {"tests/test_a.py": 9.0, "tests/unit/test_c.py": 3.0}, 2)
+
+    # The files without history weigh the mean of 6 seconds, so each shard totals 12 seconds
+    assert shards == [["tests/test_a.py", "tests/unit/test_c.py"], ["tests/test_b.py", "tests/unit/test_d.py"]]
+    # Without history, the files are split by count
+    assert [len(shard) for shard in test_shards.assign(FILES, {}, 3)] == [2, 1, 1]
+    assert test_shards.assign(FILES[:1], {}, 2) == [["tests/test_a.py"], []]
+
+
+@pytest.mark.parametrize("shard_index, expected", [
+    ("0", "tests/test_a.py tests/unit/test_c.py"),
+    ("1", "tests/test_b.py tests/unit/test_d.py"),
+])
+def test_main(tmp_path, monkeypatch, capsys, shard_index, expected):
+    test_shards = load_script()
+    for path in FILES:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    monkeypatch.chdir(tmp_path)
+
+    assert test_shards.main({
+        "TEST_SHARD_INDEX": shard_index,
+        "TEST_SHARD_COUNT": "2",
+        "TEST_SHARD_FILES_GLOB": "tests/**/test_*.py",
+        "TEST_REPORT_GROUP_ARN": "arn:report-group",
+        "TEST_PIPELINE_EXECUTION_ID": "execution-2",
+    }, run=FakeCodeBuild()) == 0
+
+    assert capsys.readouterr().out.strip() == expected
+
+
+def test_main_without_history(tmp_path, monkeypatch, capsys):
+    test_shards = load_script()
+    for path in FILES:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    monkeypatch.chdir(tmp_path)
+
+    def denied(*args):
+        raise subprocess.CalledProcessError(254, ["aws", *args])
+
+    outputs = []
+    for shard_index in ["0", "1"]:
+        assert test_shards.main({
+            "TEST_SHARD_INDEX": shard_index,
+            "TEST_SHARD_COUNT": "2",
+            "TEST_SHARD_FILES_GLOB": "tests/**/test_*.py",
+            "TEST_REPORT_GROUP_ARN": "arn:report-group",
+        }, run=denied) == 0
+        outputs.append(capsys.readouterr())
+
+    # Every file is in exactly one shard
+    assert sorted(" ".join(output.out.strip() for output in outputs).split()) == FILES
+    assert "split by count" in outputs[0].err